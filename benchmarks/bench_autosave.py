@@ -0,0 +1,65 @@
+'''editor saves - time the editor is stopped by a save: save_map on the main thread vs Autosaver (snapshot + background write),
+and what queueing a stroke for the journal costs
+run from the repo root: python benchmarks/bench_autosave.py [map width in tiles]
+'''
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.autosave import Autosaver
+from scripts.history import EditHistory
+from scripts.levelfile import save_map
+from bench_stream import generate
+
+REPEAT = 3
+
+def stalls(tilemap, path):
+    '''ms the caller is blocked: the whole save vs snapshot only (the write is left to the thread)
+    '''
+    blocking = []
+    for i in range(REPEAT):
+        start = time.perf_counter()
+        save_map(tilemap, path)
+        blocking.append(time.perf_counter() - start)
+    autosaver = Autosaver(tilemap, path, EditHistory(tilemap), folder=os.path.dirname(path))
+    background = []
+    for i in range(REPEAT):
+        start = time.perf_counter()
+        autosaver.save()
+        background.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    autosaver.close()
+    written = time.perf_counter() - start
+    return min(blocking) * 1000, min(background) * 1000, written * 1000
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    tilemap = generate(width)
+    folder = tempfile.mkdtemp()
+    print('map %d tiles wide, %d cells' % (width, sum(chunk.count for chunk in tilemap.chunks.values())))
+    for ext in ['.json', '.lvl']:
+        blocking, background, written = stalls(tilemap, os.path.join(folder, 'big' + ext))
+        print('  %-6s save_map %9.2f ms   Autosaver.save %7.2f ms   (thread done %d saves %8.1f ms later)' % (ext, blocking, background, REPEAT, written))
+
+    #JOURNAL - one stroke of 40 cells
+    history = EditHistory(tilemap)
+    for i in range(40):
+        history.touch_around((i, 10))
+        tilemap.set_tile((i, 10), 'stone', 0)
+        tilemap.autotile_around((i, 10))
+    history.end()
+    stroke = history.take_log()[0]
+    autosaver = Autosaver(tilemap, os.path.join(folder, 'big.json'), history, interval=1e9, folder=folder)
+    start = time.perf_counter()
+    for i in range(100):
+        history.log.append(stroke)
+        autosaver.update()
+    print('  journal queueing of a 40 cell stroke %7.3f ms' % ((time.perf_counter() - start) * 10))
+    autosaver.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+'''throughput of BatchEnv for growing batch sizes, random inputs
+run from the repo root: python benchmarks/bench_batch.py [map.json]
+'''
+import os
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from scripts.tilemap import Tilemap
+from scripts.batch import BatchEnv
+
+STEPS = 300
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else 'map.json'
+    tilemap = Tilemap(None)
+    tilemap.load(path)
+    rng = np.random.default_rng(0)
+    for n_envs in (1, 64, 1024, 4096):
+        env = BatchEnv(tilemap, n_envs, seed=0)
+        actions = rng.integers(0, 16, (STEPS, n_envs))
+        start = time.perf_counter()
+        episodes = 0
+        for step in range(STEPS):
+            obs, rewards, done, info = env.step(actions[step])
+            episodes += int(done.sum())
+        seconds = time.perf_counter() - start
+        print('%5d envs %12.0f env-steps/s %8.2f ms/step %6d episodes done' % (n_envs, n_envs * STEPS / seconds, seconds / STEPS * 1000, episodes))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+'''entity interactions - the simulation step with hundreds of enemies and projectiles around the player
+run from the repo root: python benchmarks/bench_collisions.py
+'''
+import os
+import sys
+import time
+import random
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import game
+from scripts.entities import Enemy
+from scripts.inputs import InputState
+
+COUNTS = [100, 500, 2000]
+STEPS = 300
+
+def populate(g, count, seed=0):
+    '''count enemies and count projectiles scattered over 1000x400 px around the player
+    projectiles stay out of the player's rows so the run doesn't end on a hit
+    '''
+    rng = random.Random(seed)
+    px, py = g.player.pos
+    for i in range(count):
+        g.enemies.append(Enemy(g, (px + rng.uniform(-500, 500), py + rng.uniform(-200, 200)), (8, 15)))
+        g.projectiles.add((px + rng.uniform(-500, 500), py + rng.choice((-1, 1)) * rng.uniform(40, 200)), rng.choice((-1.5, 1.5)))
+
+def main():
+    g = game.Game(headless=True, seed=0)
+    for count in COUNTS:
+        g.reset(0)
+        populate(g, count)
+        start = time.perf_counter()
+        for step in range(STEPS):
+            g.update(InputState(False, step % 120 < 60, False, step % 60 == 0)) #dashing back and forth through the crowd
+        print('%-24s %10.3f ms/step - %d enemies, %d projectiles' % ('Game.update', (time.perf_counter() - start) / STEPS * 1000, count, count))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+'''editor frame cost - full redraw every frame vs dirty rects, idle / moving the cursor / scrolling / painting
+run from the repo root with the game data in place: python benchmarks/bench_editor.py
+'''
+import os
+import sys
+import tempfile
+import timeit
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from editor import Editor
+from bench_stream import generate
+
+NUMBER = 300
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'big.json')
+    generate(2000).save(path)
+    editor = Editor(path)
+    img = editor.preview_image()
+    ts = editor.tilemap.tile_size
+    state = {'frame': 0}
+
+    def frame(render, scene):
+        i = state['frame'] = state['frame'] + 1
+        cursor = (100, 100)
+        if scene == 'cursor':
+            cursor = (i % 300, 100)
+        if scene == 'scroll':
+            editor.render_scroll = (i * 2, 300) #holding D
+        if scene == 'paint':
+            tile_pos = (i % 20, 20)
+            editor.tilemap.set_tile(tile_pos, 'stone', 0)
+            editor.tilemap.autotile_around(tile_pos)
+            editor.mark_cell(tile_pos)
+            cursor = (tile_pos[0] * ts - editor.render_scroll[0], tile_pos[1] * ts - editor.render_scroll[1])
+        render([(img, (5, 5)), (img, cursor)])
+
+    for scene in ['idle', 'cursor', 'scroll', 'paint']:
+        print(scene)
+        for label, render in [('full redraw', editor.render_full), ('dirty rects', editor.render_dirty)]:
+            editor.render_scroll = (0, 300)
+            editor.full_redraw = True
+            frame(render, scene)
+            seconds = min(timeit.repeat(lambda: frame(render, scene), number=NUMBER, repeat=3)) / NUMBER
+            print('  %-24s %10.3f ms/frame' % (label, seconds * 1000))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+'''editor undo - a copy of the whole map per stroke vs EditHistory diffs, time and memory on a large map
+run from the repo root: python benchmarks/bench_history.py [map width in tiles]
+'''
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.history import EditHistory
+from scripts.tilemap import TileChunk
+from bench_stream import generate
+
+STROKES = 50
+STROKE_CELLS = 40 #cells painted per stroke, each held for a few frames
+
+def paint(tilemap, history, stroke):
+    for i in range(STROKE_CELLS * 4):
+        pos = (stroke * 7 + i // 4, 10 + stroke % 5)
+        if history:
+            history.touch_around(pos)
+        tilemap.set_tile(pos, 'stone', 0)
+        tilemap.autotile_around(pos)
+
+def snapshot(tilemap):
+    '''the naive undo step - every chunk copied
+    '''
+    return {key: (bytes(chunk.types), bytes(chunk.variants), chunk.count) for key, chunk in tilemap.chunks.items()}
+
+def restore(tilemap, snapshot):
+    tilemap.chunks = {}
+    for key, (types, variants, count) in snapshot.items():
+        chunk = tilemap.chunks[key] = TileChunk()
+        chunk.types[:] = types
+        chunk.variants[:] = variants
+        chunk.count = count
+    tilemap.chunk_surfs = {}
+    tilemap.static_masks = {}
+    tilemap.solid_cache = None
+
+def record(tilemap, use_history):
+    '''paints the strokes keeping an undo step for each, returns the undo steps and the time taken
+    '''
+    history = EditHistory(tilemap) if use_history else None
+    snapshots = []
+    start = time.perf_counter()
+    for stroke in range(STROKES):
+        if not use_history:
+            snapshots.append(snapshot(tilemap))
+        paint(tilemap, history, stroke)
+        if use_history:
+            history.end()
+    return history or snapshots, time.perf_counter() - start
+
+def run(width, label, use_history):
+    tilemap = generate(width)
+    steps, seconds = record(tilemap, use_history)
+    start = time.perf_counter()
+    for stroke in range(STROKES):
+        if use_history:
+            steps.undo()
+        else:
+            restore(tilemap, steps.pop())
+    undo = time.perf_counter() - start
+
+    #MEMORY - what the undo steps keep, on a second run (tracemalloc slows everything down)
+    tilemap = generate(width)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    steps = record(tilemap, use_history)[0]
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print('  %-24s record %8.3f ms/stroke   undo %8.3f ms/stroke   kept %8.1f KB/stroke' % (label, seconds / STROKES * 1000, undo / STROKES * 1000, memory / STROKES / 1024))
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print('map %d tiles wide, %d strokes of %d cells' % (width, STROKES, STROKE_CELLS))
+    run(width, 'whole map copies', False)
+    run(width, 'EditHistory', True)
+
+if __name__ == '__main__':
+    main()
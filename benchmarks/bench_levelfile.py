@@ -0,0 +1,35 @@
+'''save/load time and file size - JSON vs the binary .lvl format, on generated maps
+run from the repo root: python benchmarks/bench_levelfile.py
+'''
+import os
+import sys
+import time
+import tempfile
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.tilemap import Tilemap
+from scripts.levelfile import load_map, save_map
+from bench_stream import generate
+
+WIDTHS = [500, 5000, 20000]
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    folder = tempfile.mkdtemp()
+    for width in WIDTHS:
+        tilemap = generate(width)
+        print('map %d tiles wide, %d cells' % (width, tilemap.tile_count()))
+        for ext in ('.json', '.lvl'):
+            path = os.path.join(folder, 'map' + ext)
+            save = timed(lambda: save_map(tilemap, path))
+            load = timed(lambda: load_map(Tilemap(None), path))
+            print('  %-5s save %9.2f ms  load %9.2f ms  %10.1f KB' % (ext, save, load, os.path.getsize(path) / 1024))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+'''frame time of the outline stage - full display mask rebuild (previous) vs static masks + dynamic areas (Outline)
+run from the repo root with the game data in place: python benchmarks/bench_outline.py
+'''
+import os
+import sys
+import timeit
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+
+from game import Game
+from scripts.inputs import scripted_inputs
+
+RESOLUTIONS = [(320, 240), (640, 480), (1280, 960)]
+WARMUP = [(60, {'right'}), (1, {'right', 'jump'}), (60, {'right'}), (1, {'left', 'dash'}), (60, {'left'})]
+NUMBER = 200
+
+def rebuild_outline(game):
+    '''the previous outline stage - reads back the whole display every frame
+    '''
+    display_mask = pygame.mask.from_surface(game.display)
+    display_silhouette = display_mask.to_surface(setcolor=(0, 0, 0, 180), unsetcolor=(0, 0, 0, 0))
+    for offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+        game.display_2.blit(display_silhouette, offset)
+
+def cached_outline(game, offset):
+    game.outline.build(game.display, game.tilemap, offset)
+    game.outline.render(game.display_2)
+
+def ms(func):
+    return timeit.timeit(func, number=NUMBER) / NUMBER * 1000
+
+def main():
+    for resolution in RESOLUTIONS:
+        game = Game(headless=True, seed=0, resolution=resolution)
+        game.simulate(scripted_inputs(WARMUP), render=True) #leaves the dynamic areas of the last frame in game.outline
+        offset = (int(game.scroll[0]), int(game.scroll[1]))
+
+        frame = ms(game.render)
+        previous = ms(lambda: rebuild_outline(game))
+        cached = ms(lambda: cached_outline(game, offset))
+        print('%4dx%-4d outline %6.3f ms -> %6.3f ms   frame %6.3f ms -> %6.3f ms' % (resolution[0], resolution[1], previous, cached, frame - cached + previous, frame))
+        pygame.quit()
+
+if __name__ == '__main__':
+    main()
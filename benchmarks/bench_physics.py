@@ -0,0 +1,80 @@
+'''tile collision for thousands of entities - the physics_rects_around loop vs the swept SolidGrid.move
+and a fast box against a one tile wall, to show tunneling
+run from the repo root: python benchmarks/bench_physics.py
+'''
+import os
+import sys
+import random
+import timeit
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+
+from scripts.tilemap import Tilemap
+from bench_stream import generate
+
+COUNTS = [1000, 5000]
+SIZE = (8, 15)
+
+def rects_move(tilemap, pos, size, movement):
+    '''the previous PhysicsEntity.update collision code - kept here only as the benchmark baseline
+    '''
+    collisions = {'up': False, 'down': False, 'right': False, 'left': False}
+    pos[0] += movement[0]
+    entity_rect = pygame.Rect(pos[0], pos[1], size[0], size[1])
+    for rect in tilemap.physics_rects_around(pos):
+        if entity_rect.colliderect(rect):
+            if movement[0] > 0:
+                entity_rect.right = rect.left
+                collisions['right'] = True
+            if movement[0] < 0:
+                entity_rect.left = rect.right
+                collisions['left'] = True
+            pos[0] = entity_rect.x
+    pos[1] += movement[1]
+    entity_rect = pygame.Rect(pos[0], pos[1], size[0], size[1])
+    for rect in tilemap.physics_rects_around(pos):
+        if entity_rect.colliderect(rect):
+            if movement[1] > 0:
+                entity_rect.bottom = rect.top
+                collisions['down'] = True
+            if movement[1] < 0:
+                entity_rect.top = rect.bottom
+                collisions['up'] = True
+            pos[1] = entity_rect.y
+    return collisions
+
+def main():
+    tilemap = generate(2000)
+    grid = tilemap.solid_grid()
+    rng = random.Random(0)
+    for count in COUNTS:
+        #entities walking and falling anywhere on the map, most of them end up standing on the ground
+        starts = [[rng.uniform(0, 2000 * 16), rng.uniform(0, 30 * 16)] for i in range(count)]
+        moves = [(rng.choice((-1, 0, 1)), rng.uniform(0, 5)) for i in range(count)]
+
+        def run_rects():
+            for pos, movement in zip([list(pos) for pos in starts], moves):
+                rects_move(tilemap, pos, SIZE, movement)
+
+        def run_sweep():
+            for pos, movement in zip(starts, moves):
+                grid.move(pos, SIZE, movement)
+
+        print('%d entities' % count)
+        for label, func in [('physics_rects_around', run_rects), ('SolidGrid.move', run_sweep)]:
+            seconds = min(timeit.repeat(func, number=5, repeat=3)) / 5
+            print('  %-24s %10.3f ms/step %8.2f us/entity' % (label, seconds * 1000, seconds / count * 1e6))
+
+    #TUNNELING - 40 px in one step across a one tile wall
+    wall = Tilemap(None)
+    for y in range(4):
+        wall.set_tile((10, y), 'stone', 0)
+    pos = [140.0, 20.0]
+    rects_move(wall, pos, SIZE, (40, 0))
+    print('fast box through a wall    rects: x %.0f   swept: x %.0f (wall at x 160)' % (pos[0], wall.solid_grid().move((140.0, 20.0), SIZE, (40, 0))[0]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+'''projectile update and render - the old [[x, y], direction, timer] lists vs ProjectilePool, at bullet-hell densities
+run from the repo root: python benchmarks/bench_projectiles.py
+'''
+import os
+import sys
+import random
+import timeit
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+
+from scripts.projectile import ProjectilePool
+from bench_stream import generate
+
+COUNTS = [100, 1000, 10000]
+STEPS = 20
+
+def spawn(tilemap, count, seed=0):
+    '''(pos, direction) above the ground of the generated map, the timers are spread so some expire
+    '''
+    rng = random.Random(seed)
+    width = 600 * tilemap.tile_size
+    return [((rng.uniform(0, width), rng.uniform(0, 48 * tilemap.tile_size)), rng.choice((-1.5, 1.5)), rng.randrange(360)) for i in range(count)]
+
+def list_update(tilemap, projectiles, player_rect):
+    #the previous per-projectile loop in Game.update, without the effects
+    for projectile in projectiles.copy():
+        projectile[0][0] += projectile[1]
+        projectile[2] += 1
+        if tilemap.solid_check(projectile[0]):
+            projectiles.remove(projectile)
+        elif projectile[2] > 360:
+            projectiles.remove(projectile)
+        elif player_rect.collidepoint(projectile[0]):
+            projectiles.remove(projectile)
+
+def list_render(surf, img, projectiles, offset):
+    return [surf.blit(img, (projectile[0][0] - img.get_width() / 2 - offset[0], projectile[0][1] - img.get_height() / 2 - offset[1])) for projectile in projectiles]
+
+def main():
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    surf = pygame.Surface((320, 240), pygame.SRCALPHA)
+    img = pygame.Surface((5, 2))
+    tilemap = generate(600)
+    grid = tilemap.solid_grid()
+    player_rect = pygame.Rect(100, 100, 8, 15)
+    offset = (200, 300)
+
+    for count in COUNTS:
+        print('%d projectiles' % count)
+        shots = spawn(tilemap, count)
+
+        def run_lists():
+            projectiles = [[list(pos), direction, timer] for pos, direction, timer in shots]
+            for step in range(STEPS):
+                list_update(tilemap, projectiles, player_rect)
+                list_render(surf, img, projectiles, offset)
+
+        def run_pool():
+            pool = ProjectilePool()
+            for pos, direction, timer in shots:
+                pool.add(pos, direction)
+                pool.timer[pool.count - 1] = timer
+            for step in range(STEPS):
+                pool.update(grid, player_rect)
+                pool.render(surf, img, offset)
+
+        for label, func in [('lists', run_lists), ('ProjectilePool', run_pool)]:
+            seconds = min(timeit.repeat(func, number=1, repeat=3))
+            print('  %-24s %10.3f ms/step' % (label, seconds / STEPS * 1000))
+
+if __name__ == '__main__':
+    main()
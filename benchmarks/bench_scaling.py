@@ -0,0 +1,67 @@
+'''how the tilemap scales with the level size - the stress corpus of scripts/levelgen.py (1x to 1000x a hand-made map)
+autotile, extract (level start), physics_rects_around and render of a 320x240 view, cold (chunks baked) and warm
+run from the repo root: python benchmarks/bench_scaling.py [scale ...]
+'''
+import os
+import sys
+import time
+import random
+import timeit
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+
+from scripts.levelgen import generate_level, level_size, CORPUS_SCALES, LARGE_DECOR_SIZES, SPAWNER_SIZES
+
+VIEW = (320, 240)
+VIEWS = 60 #camera positions rendered
+LOOKUPS = 20000
+
+class BenchGame:
+    '''flat colored images of the real sizes - Tilemap only needs the assets
+    '''
+    def __init__(self):
+        self.assets = {}
+        for name, count in [('grass', 9), ('stone', 9), ('decor', 4)]:
+            self.assets[name] = [pygame.Surface((16, 16)) for variant in range(count)]
+        self.assets['large_decor'] = [pygame.Surface(LARGE_DECOR_SIZES[variant]) for variant in range(3)]
+        self.assets['spawners'] = [pygame.Surface(SPAWNER_SIZES[variant]) for variant in range(2)]
+
+def run(scale, game):
+    width, height = level_size(scale)
+    start = time.perf_counter()
+    tilemap = generate_level(width, height, scale)
+    generate = time.perf_counter() - start
+    tilemap.game = game
+    tilemap.reset_tile_size()
+    px = (width * tilemap.tile_size, height * tilemap.tile_size)
+
+    autotile = min(timeit.repeat(tilemap.autotile, number=1, repeat=3))
+    extract = min(timeit.repeat(lambda: tilemap.extract([('large_decor', 2), ('spawners', 0), ('spawners', 1)], keep=True), number=1, repeat=3))
+
+    rng = random.Random(0)
+    positions = [(rng.uniform(0, px[0]), rng.uniform(0, px[1])) for i in range(LOOKUPS)]
+    physics = min(timeit.repeat(lambda: [tilemap.physics_rects_around(pos) for pos in positions], number=1, repeat=3)) / LOOKUPS
+
+    surf = pygame.Surface(VIEW)
+    offsets = [(rng.randrange(max(1, px[0] - VIEW[0])), rng.randrange(max(1, px[1] - VIEW[1]))) for i in range(VIEWS)]
+    start = time.perf_counter()
+    for offset in offsets:
+        tilemap.render(surf, offset)
+    cold = (time.perf_counter() - start) / VIEWS
+    warm = min(timeit.repeat(lambda: [tilemap.render(surf, offset) for offset in offsets], number=1, repeat=3)) / VIEWS
+
+    print('%6dx %4d x %-4d %8d %7d %9.1f %10.2f %9.2f %9.2f %9.3f %9.3f' % (scale, width, height, tilemap.tile_count(), len(tilemap.offgrid_tiles),
+        generate * 1000, autotile * 1000, extract * 1000, physics * 1e6, cold * 1000, warm * 1000))
+
+def main():
+    scales = [int(arg) for arg in sys.argv[1:]] or CORPUS_SCALES
+    game = BenchGame()
+    print('%7s %11s %8s %7s %9s %10s %9s %9s %9s %9s' % ('scale', 'tiles', 'cells', 'offgrid', 'gen ms', 'autotile', 'extract', 'phys us', 'cold ms', 'warm ms'))
+    for scale in scales:
+        run(scale, game)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''startup time - images loaded one file at a time vs sliced from the atlas (PNG sheets or raw cache)
+run from the repo root after building the atlas: python -m scripts.atlas && python benchmarks/bench_startup.py
+'''
+import os
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+
+import game
+from scripts import utils
+from scripts.atlas import Atlas
+
+REPEAT = 10
+
+def image_dirs():
+    dirs = []
+    for root, subdirs, files in os.walk(utils.BASE_IMG_PATH):
+        if any(name.endswith('.png') for name in files):
+            dirs.append(os.path.relpath(root, utils.BASE_IMG_PATH).replace(os.sep, '/'))
+    return dirs
+
+def load_files(dirs):
+    utils.atlas = None
+    for path in dirs:
+        prefix = '' if path == '.' else path + '/'
+        for name in sorted(os.listdir(utils.BASE_IMG_PATH + prefix)):
+            if name.endswith('.png'):
+                utils.load_image(prefix + name)
+
+def best(func):
+    times = []
+    for i in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+def startup(use_atlas):
+    utils.atlas = None
+    game.load_atlas = game_load_atlas if use_atlas else (lambda: False)
+    start = time.perf_counter()
+    game.Game(headless=True, seed=0)
+    return (time.perf_counter() - start) * 1000
+
+game_load_atlas = game.load_atlas
+
+def main():
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    dirs = image_dirs()
+    files = sum(len([name for name in os.listdir(os.path.join(utils.BASE_IMG_PATH, path)) if name.endswith('.png')]) for path in dirs)
+
+    print('%-28s %8.2f ms  (%d files)' % ('images, one file each', best(lambda: load_files(dirs)), files))
+    print('%-28s %8.2f ms  (%d files)' % ('atlas, PNG sheets', best(lambda: Atlas.load(use_raw=False)), len(dirs) + 1))
+    print('%-28s %8.2f ms  (2 files)' % ('atlas, raw cache', best(lambda: Atlas.load())))
+
+    before = min(startup(False) for i in range(REPEAT))
+    after = min(startup(True) for i in range(REPEAT))
+    print('%-28s %8.2f ms -> %.2f ms' % ('Game() startup', before, after))
+
+if __name__ == '__main__':
+    main()
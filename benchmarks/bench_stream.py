@@ -0,0 +1,68 @@
+'''level start and memory - whole JSON load vs streaming a .chunks file, on a generated wide map
+run from the repo root: python benchmarks/bench_stream.py [width in tiles]
+'''
+import os
+import sys
+import time
+import random
+import tempfile
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.tilemap import Tilemap
+from scripts.stream import LevelStream, save_chunked
+
+def generate(width, height=48, seed=0):
+    '''ground following a random walk, filled down to the bottom, a spawner at the start
+    '''
+    rng = random.Random(seed)
+    tilemap = Tilemap(None)
+    ground = height // 2
+    for x in range(width):
+        ground = max(4, min(height - 2, ground + rng.choice((-1, 0, 0, 1))))
+        for y in range(ground, height):
+            tilemap.set_tile((x, y), 'grass' if y == ground else 'stone', rng.randrange(9))
+        if rng.random() < 0.02:
+            tilemap.set_tile((x, ground - 1), 'decor', rng.randrange(4))
+    tilemap.set_tile((2, 2), 'spawners', 0)
+    return tilemap
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    tilemap = generate(width)
+    folder = tempfile.mkdtemp()
+    json_path = os.path.join(folder, 'big.json')
+    chunks_path = os.path.join(folder, 'big.chunks')
+    tilemap.save(json_path)
+    save_chunked(tilemap, chunks_path)
+    print('map %d tiles wide, %d cells - json %.1f MB, chunks %.1f MB' % (width, tilemap.tile_count(), os.path.getsize(json_path) / 2**20, os.path.getsize(chunks_path) / 2**20))
+
+    start = time.perf_counter()
+    Tilemap(None).load(json_path)
+    print('%-26s %10.2f ms' % ('json load', (time.perf_counter() - start) * 1000))
+
+    streamed = Tilemap(None)
+    start = time.perf_counter()
+    stream = LevelStream(streamed, chunks_path)
+    stream.update((40, 40))
+    print('%-26s %10.2f ms' % ('stream start', (time.perf_counter() - start) * 1000))
+
+    #WALK across the map at dash speed, timing the per-step stream work
+    worst = 0
+    most_chunks = 0
+    steps = 0
+    x = 40
+    start = time.perf_counter()
+    while x < width * tilemap.tile_size:
+        step_start = time.perf_counter()
+        stream.update((x, 24 * tilemap.tile_size))
+        worst = max(worst, time.perf_counter() - step_start)
+        most_chunks = max(most_chunks, len(streamed.chunks))
+        x += 8
+        steps += 1
+    print('%-26s %10.3f ms avg %8.3f ms worst - %d steps, at most %d of %d chunks in memory' % ('stream update', (time.perf_counter() - start) / steps * 1000, worst * 1000, steps, most_chunks, len(stream.index)))
+    stream.close()
+
+if __name__ == '__main__':
+    main()
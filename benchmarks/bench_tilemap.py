@@ -0,0 +1,153 @@
+'''micro-benchmark for Tilemap lookups and rendering on large generated maps
+compares the chunked integer storage against the old "x;y" string keyed dict
+run from the repo root: python benchmarks/bench_tilemap.py
+'''
+import os
+import sys
+import random
+import timeit
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+
+from scripts.tilemap import Tilemap, NEIGHBOR_OFFSETS, PHYSICS_TILES
+
+TILE_SIZE = 16
+
+class StringKeyTilemap:
+    '''the previous storage - kept here only as the benchmark baseline
+    '''
+    def __init__(self, game, map_data):
+        self.game = game
+        self.tile_size = map_data['tile_size']
+        self.tilemap = map_data['tilemap']
+        self.offgrid_tiles = map_data['offgrid']
+
+    def tiles_around(self, pos):
+        tiles = []
+        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        for offset in NEIGHBOR_OFFSETS:
+            check_loc = str(tile_loc[0] + offset[0]) + ';' + str(tile_loc[1] + offset[1])
+            if check_loc in self.tilemap:
+                tiles.append(self.tilemap[check_loc])
+        return tiles
+
+    def solid_check(self, pos):
+        tile_loc = str(int(pos[0] // self.tile_size)) + ';' + str(int(pos[1] // self.tile_size))
+        if tile_loc in self.tilemap:
+            if self.tilemap[tile_loc]['type'] in PHYSICS_TILES:
+                return self.tilemap[tile_loc]
+
+    def render(self, surf, offset=(0, 0)):
+        for x in range(offset[0] // self.tile_size - 1, (offset[0] + surf.get_width()) // self.tile_size + 1):
+            for y in range(offset[1] // self.tile_size - 1, (offset[1] + surf.get_height()) // self.tile_size + 1):
+                loc = str(x) + ';' + str(y)
+                if loc in self.tilemap:
+                    tile = self.tilemap[loc]
+                    surf.blit(self.game.assets[tile['type']][tile['variant']], (tile['pos'][0] * self.tile_size - offset[0], tile['pos'][1] * self.tile_size - offset[1]))
+
+class BenchGame:
+    '''the only thing Tilemap needs from the game is the assets dict
+    '''
+    def __init__(self):
+        self.assets = {}
+        for name, color in [('grass', (40, 160, 40)), ('stone', (120, 120, 120)), ('decor', (200, 80, 80))]:
+            variants = []
+            for variant in range(9):
+                img = pygame.Surface((TILE_SIZE, TILE_SIZE))
+                img.fill((color[0], color[1], color[2] + variant * 10))
+                variants.append(img)
+            self.assets[name] = variants
+
+def generate_map(width, height, seed=0):
+    '''random platforms - about a third of the cells are filled
+    '''
+    rng = random.Random(seed)
+    tilemap = {}
+    for y in range(0, height, 3):
+        x = 0
+        while x < width:
+            length = rng.randint(2, 12)
+            if rng.random() < 0.6:
+                tile_type = rng.choice(['grass', 'stone', 'stone', 'decor'])
+                for i in range(x, min(width, x + length)):
+                    tilemap[str(i) + ';' + str(y)] = {'type': tile_type, 'variant': rng.randint(0, 8), 'pos': [i, y]}
+            x += length
+    return {'tilemap': tilemap, 'tile_size': TILE_SIZE, 'offgrid': []}
+
+def measured_size(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, after - before
+
+def bench(label, func, calls, number):
+    '''func makes calls lookups - prints the time of one of them
+    '''
+    seconds = min(timeit.repeat(func, number=number, repeat=3))
+    print('  %-24s %10.2f us/call' % (label, seconds / (number * calls) * 1e6))
+    return seconds
+
+def main():
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    game = BenchGame()
+    surf = pygame.Surface((320, 240), pygame.SRCALPHA) #same format as the game display
+
+    for width, height in [(200, 100), (1000, 500), (3000, 1500)]:
+        map_data = generate_map(width, height)
+        print('map %dx%d tiles, %d filled cells' % (width, height, len(map_data['tilemap'])))
+
+        #build both from the same JSON-like data, as load() would
+        def build_old():
+            data = generate_map(width, height)
+            return StringKeyTilemap(game, data)
+        def build_new():
+            tilemap = Tilemap(game, tile_size=TILE_SIZE)
+            for tile in map_data['tilemap'].values():
+                tilemap.set_tile(tile['pos'], tile['type'], tile['variant'])
+            return tilemap
+        old, old_bytes = measured_size(build_old)
+        new, new_bytes = measured_size(build_new)
+        print('  %-24s %10.1f MB -> %.1f MB' % ('memory', old_bytes / 2**20, new_bytes / 2**20))
+
+        rng = random.Random(1)
+        points = [(rng.random() * width * TILE_SIZE, rng.random() * height * TILE_SIZE) for i in range(1000)]
+        #camera panning 2px per frame like in game, starting from a few random spots
+        offsets = [(int(p[0]) + i * 2, int(p[1])) for p in points[:5] for i in range(60)]
+
+        for name, tilemap in [('string keys', old), ('chunks', new)]:
+            print(' ', name)
+            bench('tiles_around', lambda: [tilemap.tiles_around(p) for p in points], len(points), 20)
+            bench('solid_check', lambda: [tilemap.solid_check(p) for p in points], len(points), 20)
+            bench('render (320x240)', lambda: [tilemap.render(surf, offset=o) for o in offsets], len(offsets), 3)
+
+        #AUTOTILE - whole map pass vs the cell + 4 neighbors pass the editor runs on every edit
+        cells = [(int(p[0] // TILE_SIZE), int(p[1] // TILE_SIZE)) for p in points]
+        print('  autotile')
+        bench('whole map', new.autotile, 1, 1)
+        bench('one edit', lambda: [new.autotile_around(cell) for cell in cells], len(cells), 20)
+
+        #BULK EDITS - a 64x64 rect filled tile by tile (set_tile + autotile_around each) vs set_cells + autotile_cells
+        #the type alternates so every call really changes the cells
+        rect = [(x, y) for x in range(width // 2, width // 2 + 64) for y in range(height // 2, height // 2 + 64)]
+        types = ['stone', 'grass']
+        def fill_tiles():
+            types.reverse()
+            for cell in rect:
+                new.set_tile(cell, types[0], 0)
+                new.autotile_around(cell)
+        def fill_bulk():
+            types.reverse()
+            new.autotile_cells(new.set_cells([(x, y, types[0], 0) for x, y in rect]))
+        print('  rect fill 64x64')
+        bench('tile by tile', fill_tiles, 1, 5)
+        bench('set_cells', fill_bulk, 1, 5)
+
+if __name__ == '__main__':
+    main()
@@ -2,21 +2,41 @@ import sys
 import pygame
 
 from scripts.tilemap import Tilemap
+from scripts.history import EditHistory
+from scripts.atlas import load_atlas
+from scripts.autosave import Autosaver
+from scripts.levelfile import load_map
 from scripts.utils import *
 
 RENDER_SCALE = 2.0
+BACKGROUND = (100, 100, 250)
+PREVIEW_ALPHA = 100 #0-transparent, 255-opaque
+MAX_MARKS = 64 #undo/redo of a bigger stroke redraws the whole window
 
 class Editor:
-    def __init__(self) -> None:
+    def __init__(self, map_path='map.json') -> None:
         pygame.init()
 
         pygame.display.set_caption("Editor")
         self.screen = pygame.display.set_mode((640, 480)) #window surface
         self.display = pygame.Surface((320, 240)) #rendering surface (half size of screen) - render here and scale to screen
         #self.display = pygame.Surface((160, 120))
+        self.scaled = pygame.Surface(self.screen.get_size(), 0, self.display) #reused every frame
+
+        #DIRTY RECTS - the map is kept drawn in map_layer between frames, only the areas that changed are redrawn,
+        #scaled and sent to the window (camera moves scroll the layer and draw the uncovered strips) - F2 toggles it
+        self.dirty_rects = True
+        self.map_layer = pygame.Surface(self.display.get_size(), 0, self.display) #background + tilemap, no previews
+        self.map_dirty = [] #display rects of map_layer to redraw this frame (edits, marked at the scroll of this frame)
+        self.full_redraw = True
+        self.last_scroll = None
+        self.overlays = [] #(image, display pos) of the previews drawn last frame
+        self.preview_cache = {} #(group, variant) -> translucent copy of the tile image
 
         self.clock = pygame.time.Clock()
 
+        load_atlas() #packed images if they were built (python -m scripts.atlas)
+
         self.assets = {
             'decor': load_images('tiles/decor'),
             'large_decor': load_images('tiles/large_decor'),
@@ -29,13 +49,30 @@ class Editor:
         self.movement = [False, False, False, False] #camera movement
 
         self.tilemap = Tilemap(self, tile_size=16)
+        self.map_path = map_path #.json or .lvl (binary, much faster to save on big maps)
         try:
-            self.tilemap.load('map.json')
+            load_map(self.tilemap, self.map_path)
         except FileNotFoundError:
             pass
 
+        #UNDO/REDO - ctrl+z / ctrl+y (or ctrl+shift+z), one step per stroke (what was painted while a button was held)
+        self.history = EditHistory(self.tilemap)
+
+        #AUTOSAVE - F5 and the autosaves are written by a background thread, the strokes go to a journal in between
+        #the edits of a session that ended without F5 (or crashed) are loaded back here
+        self.autosaver = Autosaver(self.tilemap, self.map_path, self.history)
+        if self.autosaver.recover():
+            print('recovered unsaved edits of', self.map_path, '- F5 to save them')
+
         self.scroll = [0, 0]
 
+        #BULK TOOLS - ctrl + left drag selects a rect of tiles: F fills it with the current tile, Delete erases it,
+        #ctrl+c / ctrl+x copy / cut it (offgrid tiles included), ctrl+v pastes at the cursor, B flood fills under the cursor
+        self.selection = None #pygame.Rect in tiles
+        self.select_start = None #tile pos where the selection drag started
+        self.selection_img = None #outline of the visible part of the selection
+        self.clipboard = None #copy_region() of the copied tiles
+
         self.tile_list = list(self.assets)
         self.tile_group = 0
         self.tile_variant = 0
@@ -45,62 +82,240 @@ class Editor:
         self.shift = False
         self.ongrid = True
 
+    def preview_image(self):
+        '''translucent copy of the selected tile image - made once per tile/variant
+        '''
+        key = (self.tile_group, self.tile_variant)
+        img = self.preview_cache.get(key)
+        if img is None:
+            img = self.assets[self.tile_list[self.tile_group]][self.tile_variant].copy()
+            img.set_alpha(PREVIEW_ALPHA)
+            self.preview_cache[key] = img
+        return img
+
+    def mark_tiles(self, x0, y0, x1, y1):
+        '''the display area an edit of the cells x0..x1, y0..y1 (excluded) can change - big images spill right/down
+        '''
+        ts = self.tilemap.tile_size
+        reach = self.tilemap.get_max_tile_size()
+        self.map_dirty.append(pygame.Rect(x0 * ts - self.render_scroll[0], y0 * ts - self.render_scroll[1], (x1 - x0 - 1) * ts + reach, (y1 - y0 - 1) * ts + reach))
+
+    def mark_cell(self, tile_pos):
+        '''the cell and its autotiled neighbors
+        '''
+        self.mark_tiles(tile_pos[0] - 1, tile_pos[1] - 1, tile_pos[0] + 2, tile_pos[1] + 2)
+
+    def mark_offgrid(self, tile):
+        '''the display area of an offgrid tile that was placed or removed
+        '''
+        img = self.assets[tile['type']][tile['variant']]
+        self.map_dirty.append(pygame.Rect(int(tile['pos'][0]) - self.render_scroll[0] - 1, int(tile['pos'][1]) - self.render_scroll[1] - 1, img.get_width() + 2, img.get_height() + 2))
+
+    def mark_stroke(self, stroke):
+        '''marks what an undo/redo changed
+        '''
+        if stroke is None:
+            return
+        if len(stroke) > MAX_MARKS:
+            self.full_redraw = True
+            return
+        for pos in stroke.cells:
+            self.mark_cell(pos)
+        for tile, seq, added in stroke.offgrid:
+            self.mark_offgrid(tile)
+
+    def bulk_edit(self, cells):
+        '''writes [(x, y, tile_type, variant), ...] (tile_type None erases) as one edit:
+        written chunk by chunk, autotiled once, one undo step
+        '''
+        self.history.end()
+        self.history.touch_cells([(x, y) for x, y, tile_type, variant in cells])
+        changed = self.tilemap.set_cells(cells)
+        self.tilemap.autotile_cells(changed)
+        if changed:
+            xs = [x for x, y in changed]
+            ys = [y for x, y in changed]
+            self.mark_tiles(min(xs) - 1, min(ys) - 1, max(xs) + 2, max(ys) + 2)
+
+    def selection_cells(self):
+        return [(x, y) for x in range(self.selection.left, self.selection.right) for y in range(self.selection.top, self.selection.bottom)]
+
+    def fill_selection(self):
+        tile_type = self.tile_list[self.tile_group]
+        self.bulk_edit([(x, y, tile_type, self.tile_variant) for x, y in self.selection_cells()])
+
+    def erase_selection(self):
+        self.bulk_edit([(x, y, None, 0) for x, y in self.selection_cells()])
+        for tile in self.tilemap.offgrid_region(self.selection):
+            self.history.remove_offgrid(tile)
+            self.mark_offgrid(tile)
+
+    def flood_fill(self, tile_pos):
+        '''fills the area of tile_pos (same tile type, or empty) with the current tile
+        it can't leave the map and the window, an empty area around the map would have no end
+        '''
+        ts = self.tilemap.tile_size
+        x0, y0, x1, y1 = self.tilemap.tile_bounds()
+        view = (self.render_scroll[0] // ts, self.render_scroll[1] // ts, (self.render_scroll[0] + self.display.get_width()) // ts + 1, (self.render_scroll[1] + self.display.get_height()) // ts + 1)
+        bounds = (min(x0, view[0]), min(y0, view[1]), max(x1, view[2]), max(y1, view[3]))
+        tile_type = self.tile_list[self.tile_group]
+        self.bulk_edit([(x, y, tile_type, self.tile_variant) for x, y in self.tilemap.flood_region(tile_pos, bounds)])
+
+    def paste(self, tile_pos):
+        '''puts the clipboard with its top-left corner at tile_pos - empty cells of the clipboard keep what is under them
+        '''
+        self.bulk_edit([(tile_pos[0] + tile['pos'][0], tile_pos[1] + tile['pos'][1], tile['type'], tile['variant']) for tile in self.clipboard['tilemap']])
+        ts = self.tilemap.tile_size
+        for tile in self.clipboard['offgrid']:
+            tile = dict(tile, pos=(tile_pos[0] * ts + tile['pos'][0], tile_pos[1] * ts + tile['pos'][1]))
+            self.history.add_offgrid(tile)
+            self.mark_offgrid(tile)
+
+    def selection_overlay(self):
+        '''(image, display pos) outlining the selection - cut to the window, a huge selection stays a small surface
+        '''
+        ts = self.tilemap.tile_size
+        rect = pygame.Rect(self.selection.x * ts - self.render_scroll[0], self.selection.y * ts - self.render_scroll[1], self.selection.width * ts, self.selection.height * ts)
+        rect = rect.clip(self.display.get_rect().inflate(4, 4)) #the edges cut by the clip end up out of the window
+        if not (rect.width and rect.height):
+            return None
+        if self.selection_img is None or self.selection_img.get_size() != rect.size:
+            self.selection_img = pygame.Surface(rect.size, pygame.SRCALPHA)
+            pygame.draw.rect(self.selection_img, (255, 255, 255, 180), self.selection_img.get_rect(), 1)
+        return (self.selection_img, rect.topleft)
+
+    def draw_map(self, rect):
+        '''redraws rect (display coords) of map_layer
+        '''
+        rect = rect.clip(self.map_layer.get_rect())
+        if rect.width and rect.height:
+            area = self.map_layer.subsurface(rect)
+            area.fill(BACKGROUND)
+            self.tilemap.render(area, offset=(self.render_scroll[0] + rect.x, self.render_scroll[1] + rect.y))
+            return rect
+
+    def update_map_layer(self):
+        '''brings map_layer to the current scroll and edits, returns the display rects that changed
+        '''
+        bounds = self.map_layer.get_rect()
+        dx, dy = 0, 0
+        if self.last_scroll is not None:
+            dx = self.render_scroll[0] - self.last_scroll[0]
+            dy = self.render_scroll[1] - self.last_scroll[1]
+        self.last_scroll = self.render_scroll
+        if self.full_redraw or abs(dx) >= bounds.width or abs(dy) >= bounds.height:
+            self.full_redraw = False
+            self.map_dirty = [bounds]
+        elif dx or dy:
+            #CAMERA MOVE - shift what is already drawn, only the uncovered strips are drawn from the tilemap
+            self.map_layer.scroll(-dx, -dy)
+            if dx:
+                self.map_dirty.append(pygame.Rect(bounds.width - dx if dx > 0 else 0, 0, abs(dx), bounds.height))
+            if dy:
+                self.map_dirty.append(pygame.Rect(0, bounds.height - dy if dy > 0 else 0, bounds.width, abs(dy)))
+        changed = [rect for rect in (self.draw_map(rect) for rect in self.map_dirty) if rect]
+        self.map_dirty = []
+        if dx or dy:
+            return [bounds] #everything moved on the window
+        return changed
+
+    def render_dirty(self, overlays):
+        '''redraws and presents only what changed since the last frame - nothing at all when idle
+        '''
+        changed = self.update_map_layer()
+        if not changed and overlays == self.overlays:
+            return
+        bounds = self.display.get_rect()
+        if bounds in changed: #camera move - the whole window is sent anyway
+            changed = [bounds]
+        else:
+            #the previews of the last frame are erased with the map under them, then all of them are drawn again
+            changed += [img.get_rect(topleft=pos) for img, pos in self.overlays + overlays]
+        changed = [rect for rect in (rect.clip(bounds) for rect in changed) if rect.width and rect.height]
+        for rect in changed:
+            self.display.blit(self.map_layer, rect, rect)
+        for img, pos in overlays:
+            self.display.blit(img, pos)
+        self.overlays = overlays
+
+        #SCALE AND RENDER only these areas
+        screen_rects = []
+        for rect in changed:
+            screen_rect = pygame.Rect(rect.x * RENDER_SCALE, rect.y * RENDER_SCALE, rect.width * RENDER_SCALE, rect.height * RENDER_SCALE)
+            pygame.transform.scale(self.display.subsurface(rect), screen_rect.size, self.scaled.subsurface(screen_rect))
+            self.screen.blit(self.scaled, screen_rect, screen_rect)
+            screen_rects.append(screen_rect)
+        pygame.display.update(screen_rects)
+
+    def render_full(self, overlays):
+        #EMPTY THE IMAGE and RENDER TILEMAP
+        self.display.fill(BACKGROUND)
+        self.tilemap.render(self.display, offset=self.render_scroll)
+        for img, pos in overlays:
+            self.display.blit(img, pos)
+
+        #SCALE AND RENDER
+        pygame.transform.scale(self.display, self.screen.get_size(), self.scaled)
+        self.screen.blit(self.scaled, (0,0))
+
+        #UPATE
+        pygame.display.update() #draw the new things on the screen
+
     def run(self):
         while True:
-            #EMPTY THE IMAGE
-            self.display.fill((100, 100, 250))
-
             #SET a CAMERA MOVEMENT
             self.scroll[0] += (self.movement[1] - self.movement[0]) * 2
             self.scroll[1] += (self.movement[3] - self.movement[2]) * 2
-            render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
-
-            #RENDER TILEMAP
-            self.tilemap.render(self.display, offset=render_scroll)
-
-            #RENDER CURRENT TILE
-            current_tile_img = self.assets[self.tile_list[self.tile_group]][self.tile_variant].copy()
-            current_tile_img.set_alpha(100) #0-transparent, 255-opaque
-            self.display.blit(current_tile_img, (5,5))
+            self.render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
 
             #STORE MOUSE POSITION
             mpos = pygame.mouse.get_pos()
             mpos = (mpos[0] / RENDER_SCALE, mpos[1] /RENDER_SCALE)
             tile_pos = (int((mpos[0] + self.scroll[0]) // self.tilemap.tile_size), int((mpos[1] + self.scroll[1]) // self.tilemap.tile_size))
-            
-            #DISPLAY PREVIEW - starting from the tile_pos to align with the grid
-            if self.ongrid:
-                self.display.blit(current_tile_img, (tile_pos[0] * self.tilemap.tile_size - self.scroll[0], tile_pos[1] * self.tilemap.tile_size - self.scroll[1]))
-            else:
-                self.display.blit(current_tile_img, mpos)
-            
-            #PLACE a NEW TILE
+
+            #SELECTION - from the tile where the drag started to the one under the cursor
+            if self.select_start:
+                self.selection = pygame.Rect(min(self.select_start[0], tile_pos[0]), min(self.select_start[1], tile_pos[1]), abs(self.select_start[0] - tile_pos[0]) + 1, abs(self.select_start[1] - tile_pos[1]) + 1)
+
+            #PLACE a NEW TILE - autotiled right away, with its neighbors
             if self.clicking and self.ongrid: #the off-grid is on the mouse button listener
-                self.tilemap.tilemap[str(tile_pos[0]) + ';' + str(tile_pos[1])] = {'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': tile_pos}
+                tile_type = self.tile_list[self.tile_group]
+                before = self.tilemap.cell(*tile_pos)
+                self.history.touch_around(tile_pos)
+                variant = self.tilemap.autotile_variant(tile_pos, tile_type)
+                self.tilemap.set_tile(tile_pos, tile_type, self.tile_variant if variant is None else variant)
+                self.tilemap.autotile_around(tile_pos)
+                if self.tilemap.cell(*tile_pos) != before: #holding the button on the same cell changes nothing
+                    self.mark_cell(tile_pos)
                 
             #DELETE TILES
             if self.right_clicking:
-                tile_loc = str(tile_pos[0]) + ';' + str(tile_pos[1])
-                if tile_loc in self.tilemap.tilemap:
-                    del self.tilemap.tilemap[tile_loc]
-                #DELETING OFFGRID - not optimised
-                for tile in self.tilemap.offgrid_tiles:#.copy(): #TODO: use copy to avoid messing with the iteration
-                    tile_img = self.assets[tile['type']][tile['variant']] #computing hitbox for offgrid tile
-                    tile_r = pygame.Rect(tile['pos'][0] - self.scroll[0], tile['pos'][1] - self.scroll[1], tile_img.get_width(), tile_img.get_height())
-                    if tile_r.collidepoint(mpos):
-                        self.tilemap.offgrid_tiles.remove(tile)
+                self.history.touch_around(tile_pos)
+                if self.tilemap.remove_tile(tile_pos):
+                    self.tilemap.autotile_around(tile_pos)
+                    self.mark_cell(tile_pos)
+                #DELETING OFFGRID - hit test in world pixels, only the nearby buckets are checked
+                for tile in self.tilemap.offgrid_at((mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])):
+                    self.history.remove_offgrid(tile)
+                    self.mark_offgrid(tile)
 
             #GET INPUTS
             for event in pygame.event.get(): #all the inputs
                 if event.type == pygame.QUIT:
+                    self.autosaver.close()
                     pygame.quit()
                     sys.exit()
 
                 if event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 1: #left click
+                    if event.button == 1 and pygame.key.get_mods() & pygame.KMOD_CTRL: #ctrl + left click - select
+                        self.select_start = tile_pos
+                        self.selection = pygame.Rect(tile_pos, (1, 1))
+                    elif event.button == 1: #left click
                         self.clicking = True
                         if not self.ongrid:
-                            self.tilemap.offgrid_tiles.append({'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': (mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])})
+                            tile = {'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': (mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])}
+                            self.history.add_offgrid(tile)
+                            self.mark_offgrid(tile)
                     if event.button == 3: #right click
                         self.right_clicking = True
                     if self.shift: #GROUPS > VARIANTS
@@ -119,6 +334,7 @@ class Editor:
                 if event.type == pygame.MOUSEBUTTONUP:
                     if event.button == 1:
                         self.clicking = False
+                        self.select_start = None
                     if event.button == 3:
                         self.right_clicking = False
 
@@ -134,9 +350,33 @@ class Editor:
                     if event.key == pygame.K_g:
                         self.ongrid = not self.ongrid #toggle OnGrid
                     if event.key == pygame.K_t:
+                        self.history.touch_autotiled()
                         self.tilemap.autotile()
+                        self.full_redraw = True
+                    if event.key == pygame.K_F2:
+                        self.dirty_rects = not self.dirty_rects
+                        self.full_redraw = True
+                    if event.key == pygame.K_z and event.mod & pygame.KMOD_CTRL:
+                        self.mark_stroke(self.history.redo() if event.mod & pygame.KMOD_SHIFT else self.history.undo())
+                    if event.key == pygame.K_y and event.mod & pygame.KMOD_CTRL:
+                        self.mark_stroke(self.history.redo())
+                    if event.key == pygame.K_f and self.selection:
+                        self.fill_selection()
+                    if event.key in (pygame.K_DELETE, pygame.K_BACKSPACE) and self.selection:
+                        self.erase_selection()
+                    if event.key == pygame.K_b:
+                        self.flood_fill(tile_pos)
+                    if event.key == pygame.K_ESCAPE:
+                        self.selection = None
+                    if event.key == pygame.K_c and event.mod & pygame.KMOD_CTRL and self.selection:
+                        self.clipboard = self.tilemap.copy_region(self.selection)
+                    if event.key == pygame.K_x and event.mod & pygame.KMOD_CTRL and self.selection:
+                        self.clipboard = self.tilemap.copy_region(self.selection)
+                        self.erase_selection()
+                    if event.key == pygame.K_v and event.mod & pygame.KMOD_CTRL and self.clipboard:
+                        self.paste(tile_pos)
                     if event.key == pygame.K_F5:
-                        self.tilemap.save('map.json')
+                        self.autosaver.save()
                     if event.key == pygame.K_LSHIFT:
                         self.shift = True
                 if event.type == pygame.KEYUP: #a key has been lifted up
@@ -150,12 +390,29 @@ class Editor:
                         self.movement[3] = False
                     if event.key == pygame.K_LSHIFT:
                         self.shift = False
-            
-            #SCALE AND RENDER
-            self.screen.blit(pygame.transform.scale(self.display,self.screen.get_size()), (0,0))
-            
-            #UPATE
-            pygame.display.update() #draw the new things on the screen
+
+            #CLOSE the STROKE once the buttons are released - it becomes one undo step
+            if not (self.clicking or self.right_clicking):
+                self.history.end()
+            self.autosaver.update()
+
+            #PREVIEWS - the current tile in the corner and under the cursor (starting from the tile_pos to align with the grid)
+            current_tile_img = self.preview_image()
+            if self.ongrid:
+                cursor = (tile_pos[0] * self.tilemap.tile_size - self.render_scroll[0], tile_pos[1] * self.tilemap.tile_size - self.render_scroll[1])
+            else:
+                cursor = (int(mpos[0]), int(mpos[1]))
+            overlays = [(current_tile_img, (5, 5)), (current_tile_img, cursor)]
+            if self.selection:
+                selection = self.selection_overlay()
+                if selection:
+                    overlays.append(selection)
+
+            if self.dirty_rects:
+                self.render_dirty(overlays)
+            else:
+                self.render_full(overlays)
             self.clock.tick(60) #dynamic pause to hit 60fps
 
-Editor().run()
\ No newline at end of file
+if __name__ == '__main__':
+    Editor(sys.argv[1] if len(sys.argv) > 1 else 'map.json').run() #map file to edit, .json or .lvl
\ No newline at end of file
@@ -1,28 +1,72 @@
 import sys
 import random
 import math
+import argparse
+import itertools
+import time
+import zlib
 import pygame
 
 from scripts.entities import Player, Enemy
 from scripts.tilemap import Tilemap
 from scripts.clouds import Clouds
-from scripts.particle import Particle
-from scripts.spark import Spark
+from scripts.particle import ParticleSystem
+from scripts.spark import SparkPool
+from scripts.projectile import ProjectilePool
+from scripts.outline import Outline
+from scripts.profiler import Profiler
+from scripts.atlas import load_atlas
+from scripts.stream import LevelStream
+from scripts.levelfile import find_level, level_ids, load_map
+from scripts.inputs import InputState, NO_INPUT, scripted_inputs, load_input_script
+from scripts.replay import InputRecorder, Replay
 from scripts.utils import *
 
 #TODO H5 https://www.youtube.com/watch?v=2gABYM5M0ww&list=PLX5fBCkxJmm07E9qQYYJMR2fPDkzdBZew&index=4 
 #sparks positions on enemy shooting are set at tuples so we get an error on their update
 
+SIM_FPS = 60 #simulation steps per second, independent from the frame rate
+MAX_CATCH_UP = 5 #max simulation steps per rendered frame before the game starts slowing down
+
 class Game:
-    def __init__(self) -> None:
+    def __init__(self, render_fps=60, max_catch_up=MAX_CATCH_UP, interpolate=True, headless=False, seed=None, level=0, levels=None, resolution=(320, 240), profile=False) -> None:
+        #HEADLESS - dummy video/audio drivers, no window and no sound (CI, servers, training)
+        #the dummy display still gives us a surface so images can be converted as usual
+        self.headless = headless
+        if headless:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
         pygame.init()
 
         pygame.display.set_caption("Ninja Game")
-        self.screen = pygame.display.set_mode((640, 480)) #window surface
-        self.display = pygame.Surface((320, 240), pygame.SRCALPHA) #rendering surface (half size of screen) - render here and scale to screen
-        self.display_2 = pygame.Surface((320, 240))
+        self.screen = pygame.display.set_mode((resolution[0] * 2, resolution[1] * 2)) #window surface
+        self.display = pygame.Surface(resolution, pygame.SRCALPHA) #rendering surface (half size of screen) - render here and scale to screen
+        self.display_2 = pygame.Surface(resolution)
+        self.scaled = pygame.Surface(self.screen.get_size(), 0, self.display_2) #display_2 scaled to the screen, same format so scale can write into it
+        self.transition_surf = pygame.Surface(resolution)
+        self.transition_surf.set_colorkey((255, 255, 255)) #white becomes transparent
+        self.outline = Outline(resolution)
+
+        load_atlas() #packed images if they were built (python -m scripts.atlas), else one file per image
 
         self.clock = pygame.time.Clock()
+        self.render_fps = render_fps #0 for uncapped (benchmarking)
+        self.max_catch_up = max_catch_up
+        self.interpolate = interpolate #draw entities and camera between the last two simulation steps
+
+        #RANDOMNESS - everything the simulation draws comes from self.rng so a seed + the inputs reproduce a run
+        #cosmetic randomness (clouds, screenshake) has its own generator so rendering or not doesn't change the run
+        self.rng = random.Random()
+        self.render_rng = random.Random()
+        self.recorder = None
+
+        #PROFILER - per-frame timings of the stages below, F3 toggles it with its overlay
+        self.profiler = Profiler(enabled=profile, overlay=not headless)
+        self.profile_path = None #where the timings are exported on quit
+
+        self.levels = levels #preloaded map data by level id (shared by rollout workers) - None reads data/maps
+        self.stream = None #LevelStream when the level is played from a .chunks file
 
         self.assets = {
             'decor': load_images('tiles/decor'),
@@ -44,13 +88,14 @@ class Game:
             'enemy/idle': Animation(load_images('entities/enemy/idle'), img_dur=6),
             'enemy/run': Animation(load_images('entities/enemy/run'), img_dur=4),
         }
+        self.assets['gun/flipped'] = flip_image(self.assets['gun'])
 
         self.sfx = {
-            'jump': pygame.mixer.Sound('data/sfx/jump.wav'),
-            'dash': pygame.mixer.Sound('data/sfx/dash.wav'),
-            'hit': pygame.mixer.Sound('data/sfx/hit.wav'),
-            'shoot': pygame.mixer.Sound('data/sfx/shoot.wav'),
-            'ambience': pygame.mixer.Sound('data/sfx/ambience.wav'),
+            'jump': load_sound('data/sfx/jump.wav', silent=headless),
+            'dash': load_sound('data/sfx/dash.wav', silent=headless),
+            'hit': load_sound('data/sfx/hit.wav', silent=headless),
+            'shoot': load_sound('data/sfx/shoot.wav', silent=headless),
+            'ambience': load_sound('data/sfx/ambience.wav', silent=headless),
         }
         self.sfx['jump'].set_volume(0.8)
         self.sfx['dash'].set_volume(0.4)
@@ -58,34 +103,65 @@ class Game:
         self.sfx['shoot'].set_volume(0.4)
         self.sfx['ambience'].set_volume(0.2)
 
+        self.tilemap = Tilemap(self, tile_size=16)
+
+        self.particles = ParticleSystem(self) #active particles
+        self.sparks = SparkPool()
+        self.projectiles = ProjectilePool()
+
+        self.reset(seed, level)
+
+    def reset(self, seed=None, level=0):
+        '''starts a new run from level with a fresh player - a reset game plays like a new Game(seed=seed)
+        '''
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng.seed(self.seed)
+        self.render_rng.seed(self.seed)
+
         self.movement = [False, False] #left/right movement
+        self.held_keys = [False, False] #left/right keys currently down
+        self.presses = set() #jump/dash pressed since the last step
 
-        self.clouds = Clouds(self.assets['clouds'], count=16)
+        self.clouds = Clouds(self.assets['clouds'], count=16, rng=self.render_rng)
 
         self.player = Player(self, (50,50), (8,15))
 
-        self.tilemap = Tilemap(self, tile_size=16)
-
-        self.level = 0
+        self.level = level
         self.load_level(self.level)
 
+    def level_count(self):
+        if self.levels is not None:
+            return len(self.levels)
+        return len(level_ids('data/maps')) #a level can have a .json and a .chunks file
+
     def load_level(self, map_id):
-        try:
-            self.tilemap.load('data/maps/' + str(map_id) + '.json')
-        except FileNotFoundError:
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        path = find_level('data/maps/' + str(map_id)) #most recent of .lvl/.chunks/.json
+        if self.levels is not None:
+            self.tilemap.load_data(self.levels[map_id])
+        elif path is None:
             print("ERROR - no map found")
+        elif path.endswith('.chunks'):
+            #STREAMED - only the header is read now, chunks follow the player
+            self.stream = LevelStream(self.tilemap, path)
+        else:
+            load_map(self.tilemap, path)
 
         #LEVEL VARIABLES
         self.scroll = [0, 0] #keep track of the camera movement
+        self.prev_scroll = [0, 0] #camera on the previous step, for interpolation
         self.dead = 0
         self.screenshake = 0
         self.transition = -30 #transition for loading levels
 
         #COLLECTIONS
-        self.particles = [] #active particles
+        self.particles.clear()
         self.enemies = []
-        self.projectiles = []
-        self.sparks = []
+        self.projectiles.clear()
+        self.sparks.clear()
 
         #SPAWNERS
         self.leaf_spawners = [] #Rects for spawning leaves
@@ -95,172 +171,351 @@ class Game:
         for spawner in self.tilemap.extract([('spawners', 0), ('spawners', 1)]): #no keep
             if spawner['variant'] == 0:
                 self.player.pos = spawner['pos']
+                self.player.prev_pos = list(self.player.pos) #no interpolation across a respawn
             else:
                 self.enemies.append(Enemy(self, spawner['pos'], (8, 15)))
 
-    def run(self):
-        #LOAD MUSIC
-        pygame.mixer.music.load('data/music.wav') #no output - it's the only track
-        pygame.mixer.music.set_volume(0.5)
-        pygame.mixer.music.play(-1) #play forever
-
-        self.sfx['ambience'].play(-1)
-
-        while True:
-            #EMPTY THE IMAGE
-            self.display.fill((0, 0, 0, 0))
-            self.display_2.blit(self.assets['background'], (0, 0)) #override all with a bkgrd (same size as screen)
-
-            #TRANSITION to NEXT LEVEL
-            #trans = 0 during play, <0 when starting and > 0 when enemies are defeated
-            if not len(self.enemies): #if no enemies left, transition to next level
-                self.transition += 1
-                if self.transition > 30:
-                    self.level = min(self.level + 1, len(os.listdir('data/maps')) - 1) #cap the max level to the maps
-                    self.load_level(self.level)
-            if self.transition < 0:
-                self.transition += 1
-
-            #CHECK DEAD and RESTART
-            if self.dead:
-                self.dead += 1 #keep running for 1s
-                if self.dead >= 10:
-                    self.transition = min(30, self.transition + 1) #add closing transition on death
-                if self.dead >= 60:
-                    self.player.air_time = 0
-                    self.load_level(self.level)
-
-            #SET SCREENSHAKE
-            self.screenshake = max(0, self.screenshake - 1) #reduces the screenshake
-
-            #SET a CAMERA MOVEMENT
-            #centering on the player but adjusting for display width because the coordinates are relative to 0,0
-            #divide by 30 in the end to move there progressively (also faster the further away)
-            #self.scroll[0] += 0.5 #move linearly to the right
-            self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.scroll[0]) / 10#30
-            self.scroll[1] += (self.player.rect().centery - self.display.get_width() / 2 - self.scroll[1]) / 10#30
-            render_scroll = (int(self.scroll[0]), int(self.scroll[1])) #convert to int to avoid jittering
-
-            #SPAWN PARTICLES
-            for rect in self.leaf_spawners:
-                if random.random() * 49999 < rect.width * rect.height:
-                    #spawning locations are linearly distributed along the rect size (via random 0 to 1)
-                    pos = (rect.x + random.random() * rect.width, rect.y + random.random() * rect.height)
-                    self.particles.append(Particle(self, 'leaf', pos, velocity=[-0.1, 0.3], frame=random.randint(0, 20)))
-
-            #UPDATE AND RENDER
-            self.clouds.update()
-            self.clouds.render(self.display_2, offset=render_scroll) #no outline
-
-            self.tilemap.render(self.display, offset=render_scroll)
-
+        if self.stream:
+            self.stream.update(self.player.pos) #chunks around the spawn, before the first step
+
+    def process_events(self):
+        #GET INPUTS
+        for event in pygame.event.get(): #all the inputs
+            if event.type == pygame.QUIT:
+                self.quit()
+            if event.type == pygame.KEYDOWN: #a key has been pressed down
+                if event.key == pygame.K_a: #the specific key
+                    self.held_keys[0] = True
+                if event.key == pygame.K_d:
+                    self.held_keys[1] = True
+                #if event.key == pygame.K_w:
+                if event.key == pygame.K_SPACE:
+                    self.presses.add('jump')
+                if event.key == pygame.K_LSHIFT:
+                    self.presses.add('dash')
+                if event.key == pygame.K_F3:
+                    self.profiler.toggle()
+            if event.type == pygame.KEYUP: #a key has been lifted up
+                if event.key == pygame.K_a:
+                    self.held_keys[0] = False
+                if event.key == pygame.K_d:
+                    self.held_keys[1] = False
+
+    def read_input(self):
+        '''InputState for the next step from the keyboard - presses are used by one step only
+        '''
+        input_state = InputState(self.held_keys[0], self.held_keys[1], 'jump' in self.presses, 'dash' in self.presses)
+        self.presses.clear()
+        return input_state
+
+    def update(self, input_state=NO_INPUT):
+        '''advances the simulation by one fixed step (1 / SIM_FPS seconds)
+        '''
+        if self.recorder:
+            self.recorder.record(input_state)
+
+        #APPLY INPUTS
+        self.movement = [input_state.left, input_state.right]
+        if input_state.jump:
+            if self.player.jump():
+                self.sfx['jump'].play()
+        if input_state.dash:
+            if self.player.dash():
+                self.sfx['dash'].play()
+
+        #TRANSITION to NEXT LEVEL
+        #trans = 0 during play, <0 when starting and > 0 when enemies are defeated
+        if not len(self.enemies): #if no enemies left, transition to next level
+            self.transition += 1
+            if self.transition > 30:
+                self.level = min(self.level + 1, self.level_count() - 1) #cap the max level to the maps
+                self.load_level(self.level)
+        if self.transition < 0:
+            self.transition += 1
+
+        #CHECK DEAD and RESTART
+        if self.dead:
+            self.dead += 1 #keep running for 1s
+            if self.dead >= 10:
+                self.transition = min(30, self.transition + 1) #add closing transition on death
+            if self.dead >= 60:
+                self.player.air_time = 0
+                self.load_level(self.level)
+
+        #SET SCREENSHAKE
+        self.screenshake = max(0, self.screenshake - 1) #reduces the screenshake
+
+        #SET a CAMERA MOVEMENT
+        #centering on the player but adjusting for display width because the coordinates are relative to 0,0
+        #divide by 30 in the end to move there progressively (also faster the further away)
+        #self.scroll[0] += 0.5 #move linearly to the right
+        self.prev_scroll = list(self.scroll)
+        self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.scroll[0]) / 10#30
+        self.scroll[1] += (self.player.rect().centery - self.display.get_width() / 2 - self.scroll[1]) / 10#30
+
+        #SPAWN PARTICLES
+        for rect in self.leaf_spawners:
+            if self.rng.random() * 49999 < rect.width * rect.height:
+                #spawning locations are linearly distributed along the rect size (via random 0 to 1)
+                pos = (rect.x + self.rng.random() * rect.width, rect.y + self.rng.random() * rect.height)
+                self.particles.add('leaf', pos, velocity=[-0.1, 0.3], frame=self.rng.randint(0, 20))
+
+        self.clouds.update()
+
+        #STREAMING - chunks around the player, entities far from it wait (their tiles may not be loaded)
+        if self.stream:
+            self.stream.update(self.player.pos)
+
+        with self.profiler.scope('update/enemies'):
             for enemy in self.enemies.copy():
+                if self.stream and not self.stream.active(enemy.pos):
+                    #not updated, so it's drawn where it stands - no interpolation from a stale prev_pos when it's woken up
+                    enemy.prev_pos[0] = enemy.pos[0]
+                    enemy.prev_pos[1] = enemy.pos[1]
+                    continue
                 kill = enemy.update(self.tilemap, (0,0))
-                enemy.render(self.display, offset=render_scroll)
                 if kill:
                     self.enemies.remove(enemy)
 
+        with self.profiler.scope('update/player'):
             if not self.dead:
                 self.player.update(self.tilemap, (self.movement[1] - self.movement[0], 0))
-                self.player.render(self.display, offset=render_scroll)
-
-            #TODO make projectile a class
-            #[[x,y], direction, timer]
-            for projectile in self.projectiles.copy():
-                projectile[0][0] += projectile[1] #modify the x component addind direction
-                projectile[2] += 1 #increment timer
-                img = self.assets['projectile']
-                self.display.blit(img, (projectile[0][0] - img.get_width() / 2 - render_scroll[0], projectile[0][1] - img.get_height() / 2 - render_scroll[1]))
+
+        with self.profiler.scope('update/projectiles'):
+            #PROJECTILES - moved, expired and checked against walls and the player all at once
+            #the ones out of the streamed area are dropped, a dashing player can't be hit
+            active = self.stream.active_array(self.projectiles.positions()) if self.stream else None
+            player_rect = self.player.rect() if abs(self.player.dashing) < 50 else None
+            for pos, direction, hit_player in self.projectiles.update(self.tilemap.solid_grid(), player_rect, active):
+                #PLAYER HIT
+                if hit_player:
+                    self.dead += 1
+                    self.screenshake = max(32, self.screenshake)
+                    self.sfx['hit'].play()
+                    #SPARKS - TODO: make a class - used in enemy death as well
+                    for i in range(30):
+                        s_angle = self.rng.random() * math.pi * 2
+                        s_speed = self.rng.random() * 5
+                        self.sparks.add(self.player.rect().center, s_angle, 2 + self.rng.random())
+                        self.particles.add('particle', self.player.rect().center, velocity=[math.cos(s_angle + math.pi) * s_speed * 0.5, math.sin(s_angle + math.pi) * s_speed * 0.5], frame=self.rng.randint(0, 7))
                 #WALL HIT
-                if self.tilemap.solid_check(projectile[0]):
-                    self.projectiles.remove(projectile)
+                else:
                     #SPARKS - will bounce back
                     for i in range(4):
-                            self.sparks.append(Spark(projectile[0], random.random() - 0.5 + (math.pi if projectile[1] > 0 else 0), 2 + random.random()))
-                #TIMEOUT
-                elif projectile[2] > 360: #remove after 6s
-                    self.projectiles.remove(projectile)
-                #PLAYER HIT
-                elif abs(self.player.dashing) < 50: #only if the player is not dashing
-                    if self.player.rect().collidepoint(projectile[0]): #player is hit
-                        self.projectiles.remove(projectile)
-                        self.dead += 1
-                        self.screenshake = max(32, self.screenshake)
-                        self.sfx['hit'].play()
-                        #SPARKS - TODO: make a class - used in enemy death as well
-                        for i in range(30):
-                            s_angle = random.random() * math.pi * 2
-                            s_speed = random.random() * 5
-                            self.sparks.append(Spark(self.player.rect().center, s_angle, 2 + random.random()))
-                            self.particles.append(Particle(self, 'particle', self.player.rect().center, velocity=[math.cos(s_angle + math.pi) * s_speed * 0.5, math.sin(s_angle + math.pi) * s_speed * 0.5], frame=random.randint(0, 7)))
-
-            #SPARK U&R
-            for spark in self.sparks.copy():
-                kill = spark.update()
-                spark.render(self.display, offset=render_scroll)
-                if kill:
-                    self.sparks.remove(spark)
-
-            #BUILD OUTLINES MASK
-            #the silhouette has blobs of black wherever we drew something
-            display_mask = pygame.mask.from_surface(self.display)
-            display_silhouette = display_mask.to_surface(setcolor=(0, 0, 0, 180), unsetcolor=(0, 0, 0, 0)) #rgb + transparency
-            
-            #APPLY OUTLINES
-            #self.display_2.blit(display_silhouette, (0,0))
-            for offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                self.display_2.blit(display_silhouette, offset)
-
-            #PARTICLE U&R
-            for particle in self.particles.copy():
-                kill = particle.update()
-                if particle.p_type == 'leaf':
-                    particle.pos[0] += math.sin(particle.animation.frame * 0.035) * 0.3
-                if kill:
-                    self.particles.remove(particle)
-                particle.render(self.display, offset=render_scroll)
-
-            #print(self.tilemap.physics_rects_around(self.player.pos))
-
-            #GET INPUTS
-            for event in pygame.event.get(): #all the inputs
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                if event.type == pygame.KEYDOWN: #a key has been pressed down
-                    if event.key == pygame.K_a: #the specific key
-                        self.movement[0] = True
-                    if event.key == pygame.K_d:
-                        self.movement[1] = True
-                    #if event.key == pygame.K_w:
-                    if event.key == pygame.K_SPACE:
-                        if self.player.jump():
-                            self.sfx['jump'].play()
-                    if event.key == pygame.K_LSHIFT:
-                        if self.player.dash():
-                            self.sfx['dash'].play()
-                if event.type == pygame.KEYUP: #a key has been lifted up
-                    if event.key == pygame.K_a:
-                        self.movement[0] = False
-                    if event.key == pygame.K_d:
-                        self.movement[1] = False
+                        self.sparks.add(pos, self.rng.random() - 0.5 + (math.pi if direction > 0 else 0), 2 + self.rng.random())
+
+        with self.profiler.scope('update/sparks'):
+            self.sparks.update()
+        with self.profiler.scope('update/particles'):
+            self.particles.update() #leaf sway is part of the update
+
+    def entity_offset(self, entity, offset, alpha):
+        '''render offset that draws entity between its previous and current position (alpha 0 to 1)
+        '''
+        if not self.interpolate:
+            return offset
+        return (offset[0] + (entity.pos[0] - entity.prev_pos[0]) * (1 - alpha), offset[1] + (entity.pos[1] - entity.prev_pos[1]) * (1 - alpha))
+
+    def render(self, alpha=1):
+        '''draws the current state - alpha is how far we are between the last two simulation steps
+        '''
+        #EMPTY THE IMAGE
+        self.display.fill((0, 0, 0, 0))
+        self.display_2.blit(self.assets['background'], (0, 0)) #override all with a bkgrd (same size as screen)
+
+        if self.interpolate:
+            scroll = (self.prev_scroll[0] + (self.scroll[0] - self.prev_scroll[0]) * alpha, self.prev_scroll[1] + (self.scroll[1] - self.prev_scroll[1]) * alpha)
+        else:
+            scroll = self.scroll
+        render_scroll = (int(scroll[0]), int(scroll[1])) #convert to int to avoid jittering
+
+        with self.profiler.scope('render/clouds'):
+            self.clouds.render(self.display_2, offset=render_scroll) #no outline
+
+        with self.profiler.scope('render/tilemap'):
+            self.tilemap.render(self.display, offset=render_scroll)
+
+        #DYNAMIC LAYER - the drawn areas are kept for the outline mask
+        self.outline.begin()
+        with self.profiler.scope('render/enemies'):
+            for enemy in self.enemies:
+                self.outline.add(enemy.render(self.display, offset=self.entity_offset(enemy, render_scroll, alpha)))
+
+        with self.profiler.scope('render/player'):
+            if not self.dead:
+                self.outline.add(self.player.render(self.display, offset=self.entity_offset(self.player, render_scroll, alpha)))
+
+        with self.profiler.scope('render/projectiles'):
+            for rect in self.projectiles.render(self.display, self.assets['projectile'], offset=render_scroll):
+                self.outline.add(rect)
+
+        with self.profiler.scope('render/sparks'):
+            for rect in self.sparks.render(self.display, offset=render_scroll):
+                self.outline.add(rect)
 
+        #BUILD and APPLY OUTLINES - static tile masks + the dynamic areas
+        with self.profiler.scope('render/outline'):
+            self.outline.build(self.display, self.tilemap, render_scroll)
+            self.outline.render(self.display_2)
+
+        with self.profiler.scope('render/particles'):
+            self.particles.render(self.display, offset=render_scroll)
+
+        #print(self.tilemap.physics_rects_around(self.player.pos))
+
+        with self.profiler.scope('render/transition'):
             if self.transition:
-                transition_surf = pygame.Surface(self.display.get_size())
+                self.transition_surf.fill((0, 0, 0))
                 #circle is drawn on transition_surf (not display) / 30 is transition value, 8 is a constant due to the 4 edges of the screen
-                pygame.draw.circle(transition_surf, (255, 255, 255), (self.display.get_width()// 2, self.display.get_height()// 2), (30 - abs(self.transition)) * 8)
-                transition_surf.set_colorkey((255, 255, 255)) #white becomes transparent
-                self.display.blit(transition_surf, (0, 0))
+                pygame.draw.circle(self.transition_surf, (255, 255, 255), (self.display.get_width()// 2, self.display.get_height()// 2), (30 - abs(self.transition)) * 8)
+                self.display.blit(self.transition_surf, (0, 0))
 
+        with self.profiler.scope('render/present'):
             #DRAW DISPLAY 2 OVER DISPLAY 1 / add PROJECTION
             self.display_2.blit(self.display, (0, 0))
 
             #SCALE AND RENDER
-            screenshake_offset = (random.random() * self.screenshake - self.screenshake / 2, random.random() * self.screenshake - self.screenshake / 2)
-            self.screen.blit(pygame.transform.scale(self.display_2,self.screen.get_size()), screenshake_offset)
+            screenshake_offset = (self.render_rng.random() * self.screenshake - self.screenshake / 2, self.render_rng.random() * self.screenshake - self.screenshake / 2)
+            pygame.transform.scale(self.display_2, self.screen.get_size(), self.scaled)
+            self.screen.blit(self.scaled, screenshake_offset)
 
-            #UPATE
+        with self.profiler.scope('render/profiler'):
+            self.profiler.render_overlay(self.screen) #on the screen, the display is too small for text
+
+        #UPATE
+        with self.profiler.scope('render/present'):
             pygame.display.update() #draw the new things on the screen
-            self.clock.tick(60) #dynamic pause to hit 60fps
 
-Game().run()
\ No newline at end of file
+    def record(self, path):
+        '''logs the input of every following step - the game must be fresh (seeded, nothing simulated yet)
+        '''
+        self.recorder = InputRecorder(path, self.seed, self.level)
+
+    def stop_recording(self):
+        if self.recorder:
+            self.recorder.close(self.state_checksum())
+            self.recorder = None
+
+    def state_checksum(self):
+        '''checksum of the simulation state - equal checksums after a replay mean it didn't desync
+        '''
+        state = (self.level, self.dead, self.transition, self.player.pos, self.player.velocity, self.player.dashing,
+                 [(enemy.pos, enemy.walking) for enemy in self.enemies], self.projectiles.state(), len(self.particles), len(self.sparks), self.rng.getstate())
+        return zlib.crc32(repr(state).encode())
+
+    def stop_profiling(self):
+        '''exports the timings if a path was given, and prints their summary
+        '''
+        if self.profile_path and self.profiler.log:
+            self.profiler.export(self.profile_path)
+            print(self.profiler.report())
+            print("timings of", len(self.profiler.log), "frames written to", self.profile_path)
+            self.profile_path = None
+
+    def quit(self):
+        self.stop_recording()
+        self.stop_profiling()
+        pygame.quit()
+        sys.exit()
+
+    def run(self, inputs=None):
+        '''plays in the window - inputs (an iterator of InputStates, e.g. a replay) replaces the keyboard
+        returns when inputs run out
+        '''
+        #LOAD MUSIC
+        pygame.mixer.music.load('data/music.wav') #no output - it's the only track
+        pygame.mixer.music.set_volume(0.5)
+        pygame.mixer.music.play(-1) #play forever
+
+        self.sfx['ambience'].play(-1)
+
+        #FIXED TIMESTEP - the simulation always advances in steps of 1 / SIM_FPS seconds
+        #rendering runs at whatever rate we get (capped by render_fps) and draws in between steps
+        step = 1 / SIM_FPS
+        accumulator = 0
+        self.clock.tick() #don't count the loading time
+        while True:
+            accumulator += self.clock.tick(self.render_fps) / 1000 #dynamic pause to hit render_fps (0 = uncapped)
+
+            with self.profiler.scope('events'):
+                self.process_events()
+
+            steps = 0
+            while accumulator >= step and steps < self.max_catch_up:
+                if inputs is None:
+                    self.update(self.read_input())
+                else:
+                    input_state = next(inputs, None)
+                    if input_state is None:
+                        return
+                    self.update(input_state)
+                accumulator -= step
+                steps += 1
+            if accumulator >= step: #too far behind - drop the backlog and slow down instead of spiraling
+                accumulator %= step
+
+            self.render(alpha=accumulator / step)
+            self.profiler.end_frame()
+
+    def simulate(self, inputs, frames=None, render=False):
+        '''runs the game as fast as possible on a stream of InputStates (no clock, no events)
+        stops when inputs run out or after frames steps, returns the number of steps
+        '''
+        steps = 0
+        for input_state in inputs:
+            if frames is not None and steps >= frames:
+                break
+            self.update(input_state)
+            if render:
+                self.render()
+            self.profiler.end_frame()
+            steps += 1
+        return steps
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ninja Game")
+    parser.add_argument('--headless', action='store_true', help="simulate without window and audio, as fast as possible")
+    parser.add_argument('--frames', type=int, default=3600, help="steps to simulate in headless mode")
+    parser.add_argument('--script', help="input script for headless mode (lines of: frames [left] [right] [jump] [dash])")
+    parser.add_argument('--render', action='store_true', help="also render every frame in headless mode")
+    parser.add_argument('--uncapped', action='store_true', help="don't cap the frame rate")
+    parser.add_argument('--seed', type=int, help="seed for the game randomness")
+    parser.add_argument('--record', help="write the inputs of the run to this replay file")
+    parser.add_argument('--replay', help="play back a replay file (as fast as possible with --headless)")
+    parser.add_argument('--profile', help="time every frame by stage and write the timings here on exit (.csv or .json) - F3 toggles the profiler")
+    args = parser.parse_args()
+
+    replay = Replay.load(args.replay) if args.replay else None
+    seed = replay.seed if replay else args.seed
+    level = replay.level if replay else 0
+    game = Game(render_fps=0 if args.uncapped else 60, headless=args.headless, seed=seed, level=level, profile=bool(args.profile))
+    game.profile_path = args.profile
+    if args.record:
+        game.record(args.record)
+
+    if replay:
+        inputs = replay.inputs()
+    elif args.script:
+        inputs = scripted_inputs(load_input_script(args.script))
+    elif args.headless:
+        inputs = itertools.repeat(NO_INPUT)
+    else:
+        inputs = None #keyboard
+
+    if args.headless:
+        start = time.perf_counter()
+        steps = game.simulate(inputs, frames=None if replay else args.frames, render=args.render)
+        elapsed = time.perf_counter() - start
+        print(steps, "steps in", round(elapsed, 2), "s -", round(steps / elapsed), "steps/s")
+    else:
+        game.run(inputs)
+        steps = replay.steps if replay else None
+    game.stop_recording()
+    game.stop_profiling()
+
+    if replay and replay.checksum is not None:
+        if steps == replay.steps and game.state_checksum() == replay.checksum:
+            print("replay OK - final state matches the recording")
+        else:
+            print("replay DESYNC - final state differs from the recording")
+            sys.exit(1)
\ No newline at end of file
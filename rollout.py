@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+import multiprocessing
+from collections import namedtuple
+
+#DUMMY DRIVERS before pygame gets imported - workers never open a window or an audio device
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+from game import Game
+from scripts.tilemap import Tilemap
+from scripts.levelfile import find_level, level_ids, load_map
+from scripts.inputs import InputState, NO_INPUT, scripted_inputs, load_input_script
+
+#EPISODE - one simulated run, from a fresh start of level until death, clear or max frames
+#segments is an input script (see scripts/inputs.py) - None uses the policy of the runner
+Episode = namedtuple('Episode', ['seed', 'level', 'frames', 'segments'])
+
+def load_levels(map_dir='data/maps'):
+    '''parses every map once - level id -> map data (the .json layout)
+    same levels and files as the game: level_ids, then the most recent .lvl/.chunks/.json of each (find_level)
+    a .chunks level is loaded whole, the workers don't stream
+    '''
+    levels = {}
+    tilemap = Tilemap(None)
+    for level_id in level_ids(map_dir):
+        load_map(tilemap, find_level(os.path.join(map_dir, str(level_id))))
+        levels[level_id] = tilemap.map_data()
+    return levels
+
+#POLICIES - policy(game, rng) returns the InputState for the next step
+#rng is seeded from the episode so policy decisions are reproducible too
+#module level functions so they can be sent to the worker processes
+def idle_policy(game, rng):
+    return NO_INPUT
+
+def random_policy(game, rng):
+    '''mostly runs in one direction, jumps and dashes now and then
+    '''
+    direction = rng.random() < 0.3
+    return InputState(direction, not direction, rng.random() < 0.05, rng.random() < 0.02)
+
+POLICIES = {'idle': idle_policy, 'random': random_policy}
+
+#WORKER - one Game per process, reset for each episode
+worker_levels = None
+worker_policy = None
+worker_game = None
+
+def init_worker(levels, policy):
+    '''levels is sent once per worker (with fork it's not even copied until written)
+    '''
+    global worker_levels, worker_policy
+    worker_levels = levels
+    worker_policy = policy
+
+def run_episode(episode):
+    '''simulates one episode, returns its statistics as a dict
+    '''
+    global worker_game
+    start = time.perf_counter()
+    if worker_game is None:
+        worker_game = Game(headless=True, seed=episode.seed, level=episode.level, levels=worker_levels)
+    else:
+        worker_game.reset(episode.seed, episode.level)
+    game = worker_game
+
+    if episode.segments is not None:
+        inputs = scripted_inputs(episode.segments)
+        next_input = lambda: next(inputs, NO_INPUT)
+    else:
+        policy_rng = random.Random(episode.seed)
+        next_input = lambda: worker_policy(game, policy_rng)
+
+    enemies = len(game.enemies)
+    frames = 0
+    clear_time = None
+    while frames < episode.frames:
+        game.update(next_input())
+        frames += 1
+        if game.dead:
+            break
+        if not game.enemies:
+            clear_time = frames
+            break
+
+    return {
+        'seed': episode.seed,
+        'level': episode.level,
+        'frames': frames, #frames survived
+        'enemies': enemies,
+        'killed': enemies - len(game.enemies),
+        'died': bool(game.dead),
+        'clear_time': clear_time, #None if not cleared
+        'seconds': time.perf_counter() - start,
+    }
+
+def make_episodes(count, levels, frames, seed=0, segments=None):
+    '''count episodes going round the levels, seeds seed, seed + 1, ...
+    '''
+    levels = sorted(levels)
+    return [Episode(seed + i, levels[i % len(levels)], frames, segments) for i in range(count)]
+
+def run_rollouts(episodes, levels, policy=random_policy, workers=None):
+    '''runs the episodes on a pool of workers (all cores by default)
+    returns the per-episode statistics in episode order and the wall time
+    '''
+    workers = workers or os.cpu_count()
+    start = time.perf_counter()
+    pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=(levels, policy))
+    try:
+        #small chunks keep the workers busy until the end, episodes can have very different lengths
+        results = pool.map(run_episode, episodes, chunksize=max(1, len(episodes) // (workers * 8)))
+    finally:
+        pool.close()
+        pool.join()
+    return results, time.perf_counter() - start
+
+def summarize(results, elapsed):
+    '''prints the stats per level and the aggregate throughput
+    '''
+    print('%5s %8s %10s %8s %8s %12s' % ('level', 'episodes', 'avg frames', 'killed', 'cleared', 'clear time'))
+    for level, group in itertools.groupby(sorted(results, key=lambda r: r['level']), key=lambda r: r['level']):
+        group = list(group)
+        cleared = [r['clear_time'] for r in group if r['clear_time'] is not None]
+        print('%5d %8d %10.1f %7.1f%% %7.1f%% %12s' % (
+            level, len(group),
+            sum(r['frames'] for r in group) / len(group),
+            100 * sum(r['killed'] for r in group) / max(1, sum(r['enemies'] for r in group)),
+            100 * len(cleared) / len(group),
+            '%.1f' % (sum(cleared) / len(cleared)) if cleared else '-'))
+    frames = sum(r['frames'] for r in results)
+    print(len(results), "episodes,", frames, "frames in", round(elapsed, 2), "s -",
+          round(frames / elapsed), "frames/s,", round(len(results) / elapsed, 1), "episodes/s")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ninja Game - parallel headless rollouts")
+    parser.add_argument('--episodes', type=int, default=64)
+    parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    parser.add_argument('--frames', type=int, default=3600, help="max steps per episode")
+    parser.add_argument('--levels', type=int, nargs='*', help="level ids to play (default: all the maps)")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first episode, the next ones count up")
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='random')
+    parser.add_argument('--script', help="input script played by every episode instead of the policy")
+    parser.add_argument('--json', help="also write the per-episode statistics to this file")
+    args = parser.parse_args()
+
+    levels = load_levels()
+    if not levels:
+        print("ERROR - no map found")
+        sys.exit(1)
+    level_ids = args.levels if args.levels else list(levels)
+    segments = load_input_script(args.script) if args.script else None
+
+    episodes = make_episodes(args.episodes, level_ids, args.frames, args.seed, segments)
+    results, elapsed = run_rollouts(episodes, levels, POLICIES[args.policy], args.workers)
+    summarize(results, elapsed)
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=1)
+        f.close()
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import pygame
+
+from scripts import utils
+
+#ATLAS - every image directory packed in one sheet, sliced back into subsurfaces when loading
+#manifest.json: for each directory the sheet rect of its images (sorted by name, which is also the frame order)
+#atlas.raw: the pixels of all the sheets (RGB, one after the other) so loading needs no PNG decoding
+#each group also keeps the name, mtime and size of its source PNGs - a group that doesn't match data/images anymore
+#(an image edited, added or removed without rebuilding) is not used, its images are loaded from the PNGs
+ATLAS_PATH = 'data/atlas/'
+MANIFEST = 'manifest.json'
+RAW_CACHE = 'atlas.raw'
+VERSION = 2
+
+def pack(sizes):
+    '''shelf packing - returns the (x, y) of each size and the sheet size
+    tallest images go first so shelves waste little height, the sheet is about square
+    '''
+    area = sum(w * h for w, h in sizes)
+    width = max([int(area ** 0.5) + 1] + [w for w, h in sizes])
+    positions = [None] * len(sizes)
+    x = y = shelf_height = 0
+    for i in sorted(range(len(sizes)), key=lambda i: -sizes[i][1]):
+        w, h = sizes[i]
+        if x + w > width:
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+        positions[i] = (x, y)
+        x += w
+        shelf_height = max(shelf_height, h)
+    return positions, (width, y + shelf_height)
+
+def source_files(folder):
+    '''[[name, mtime_ns, size], ...] of the PNGs in folder, sorted by name - None if the folder is gone
+    '''
+    if not os.path.isdir(folder):
+        return None
+    sources = []
+    for entry in os.scandir(folder):
+        if entry.name.endswith('.png') and entry.is_file():
+            stat = entry.stat()
+            sources.append([entry.name, stat.st_mtime_ns, stat.st_size])
+    sources.sort()
+    return sources
+
+def build_atlas(base=utils.BASE_IMG_PATH, out=ATLAS_PATH):
+    '''packs the PNGs of every directory under base into out - needs a display mode for convert()
+    returns the manifest
+    '''
+    os.makedirs(out, exist_ok=True)
+    manifest = {'version': VERSION, 'sheets': {}}
+    raw = open(os.path.join(out, RAW_CACHE), 'wb')
+    offset = 0
+    for root, dirs, files in sorted(os.walk(base)):
+        names = sorted(name for name in files if name.endswith('.png'))
+        if not names:
+            continue
+        group = os.path.relpath(root, base).replace(os.sep, '/')
+        group = '' if group == '.' else group
+        images = [pygame.image.load(os.path.join(root, name)).convert() for name in names] #same pixels as load_image
+        positions, size = pack([img.get_size() for img in images])
+
+        sheet = pygame.Surface(size)
+        for img, pos in zip(images, positions):
+            sheet.blit(img, pos)
+        sheet_file = (group.replace('/', '_') or 'root') + '.png'
+        pygame.image.save(sheet, os.path.join(out, sheet_file))
+        pixels = pygame.image.tobytes(sheet, 'RGB')
+        raw.write(pixels)
+
+        manifest['sheets'][group] = {
+            'file': sheet_file,
+            'size': list(size),
+            'raw': [offset, len(pixels)], #byte range in the raw cache
+            'images': [[name, pos[0], pos[1], img.get_width(), img.get_height()] for name, pos, img in zip(names, positions, images)],
+            'sources': source_files(root),
+        }
+        offset += len(pixels)
+    raw.close()
+
+    f = open(os.path.join(out, MANIFEST), 'w')
+    json.dump(manifest, f, indent=1)
+    f.close()
+    return manifest
+
+class Atlas:
+    '''packed images ready to use - groups maps an image directory to its images in name order
+    images maps the path of each image ("dir/name.png", as given to load_image) to its surface
+    stale: the groups left out because their PNGs changed since the atlas was built
+    '''
+    def __init__(self, groups, stale=()):
+        self.groups = groups
+        self.stale = list(stale)
+        self.images = {}
+        for group, group_images in groups.items():
+            for name, img in group_images:
+                self.images[(group + '/' if group else '') + name] = img
+
+    @classmethod
+    def load(cls, path=ATLAS_PATH, use_raw=True, base=utils.BASE_IMG_PATH):
+        f = open(os.path.join(path, MANIFEST), 'r')
+        manifest = json.load(f)
+        f.close()
+        if manifest['version'] != VERSION:
+            raise ValueError("unsupported atlas version " + str(manifest['version']))
+
+        raw = None
+        if use_raw and os.path.exists(os.path.join(path, RAW_CACHE)):
+            f = open(os.path.join(path, RAW_CACHE), 'rb')
+            raw = f.read()
+            f.close()
+
+        groups = {}
+        stale = []
+        for group, sheet_data in manifest['sheets'].items():
+            if source_files(os.path.join(base, group)) != sheet_data['sources']:
+                stale.append(group)
+                continue
+            if raw is not None:
+                start, length = sheet_data['raw']
+                sheet = pygame.image.frombytes(raw[start:start + length], tuple(sheet_data['size']), 'RGB')
+            else:
+                sheet = pygame.image.load(os.path.join(path, sheet_data['file']))
+            sheet = sheet.convert()
+            sheet.set_colorkey((0, 0, 0)) #subsurfaces share it
+            groups[group] = [(name, sheet.subsurface((x, y, w, h))) for name, x, y, w, h in sheet_data['images']]
+        return cls(groups, stale)
+
+def load_atlas(path=ATLAS_PATH):
+    '''makes load_image/load_images slice from the atlas if it was built, returns True if it's used
+    '''
+    if not os.path.exists(os.path.join(path, MANIFEST)):
+        return False
+    try:
+        atlas = Atlas.load(path)
+    except ValueError: #built by another version
+        print("atlas out of date - run python -m scripts.atlas")
+        return False
+    if atlas.stale:
+        print("atlas out of date for", ', '.join(group or '.' for group in atlas.stale), "- loading them from the PNGs, run python -m scripts.atlas")
+    utils.atlas = atlas
+    return True
+
+if __name__ == '__main__':
+    #python -m scripts.atlas - run again after changing anything in data/images
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    start = time.perf_counter()
+    manifest = build_atlas()
+    count = sum(len(sheet['images']) for sheet in manifest['sheets'].values())
+    print(count, "images packed in", len(manifest['sheets']), "sheets in", round(time.perf_counter() - start, 2), "s")
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import queue
+import threading
+
+from scripts.levelfile import load_map, save_map
+
+AUTOSAVE_INTERVAL = 30 #seconds between two full autosaves while there are unsaved edits
+JOURNAL_LIMIT = 2000 #journal entries (strokes) before a full autosave compacts the journal
+
+#FILES - in AUTOSAVE_FOLDER, not next to the map: data/maps only holds levels (Game.level_count counts the files there)
+#data/maps/0.json -> data/autosave/0.autosave.json (last full autosave) + data/autosave/0.autosave.journal, temp files of the saves too
+AUTOSAVE_FOLDER = 'data/autosave'
+#the journal has one JSON line per stroke stored/undone/redone, with the state of the cells after it (not a diff):
+#{"cells": [[x, y, type or null, variant], ...], "offgrid": [[added, tile], ...]}
+#replaying it is idempotent, so a journal line already in the base file (crash between two writes) does no harm
+#the base it applies to is the autosave file when it is newer than the map, else the map itself
+
+def autosave_paths(path, folder=AUTOSAVE_FOLDER):
+    root, ext = os.path.splitext(os.path.basename(path))
+    return os.path.join(folder, root + '.autosave' + ext), os.path.join(folder, root + '.autosave.journal')
+
+def write_atomic(tilemap, path, folder=AUTOSAVE_FOLDER):
+    '''saves to a temp file in folder then renames it over path - a crash mid-save never leaves half a file
+    folder has to be on the same drive as path for the rename
+    '''
+    root, ext = os.path.splitext(os.path.basename(path))
+    tmp = os.path.join(folder, root + '.tmp' + ext) #same extension, save_map picks the format from it
+    save_map(tilemap, tmp)
+    os.replace(tmp, path)
+
+def journal_entry(names, stroke, undone):
+    '''one journal line for a stroke of EditHistory - the cells as they are after it was applied (or undone)
+    names - the type_names of the tilemap when the stroke was logged
+    '''
+    cells = []
+    for (x, y), change in stroke.cells.items():
+        tid, variant = change[0] if undone else change[1]
+        cells.append([x, y, names[tid] if tid else None, variant])
+    offgrid = [[added != undone, tile] for tile, seq, added in (reversed(stroke.offgrid) if undone else stroke.offgrid)]
+    return json.dumps({'cells': cells, 'offgrid': offgrid})
+
+def find_offgrid(tilemap, tile):
+    for seq, other in tilemap.offgrid_buckets.get(tilemap.offgrid_key(tile['pos']), []):
+        if other['type'] == tile['type'] and other['variant'] == tile['variant'] and list(other['pos']) == list(tile['pos']):
+            return other
+    return None
+
+def replay_journal(tilemap, path):
+    '''applies the journal at path to tilemap, returns the number of entries replayed
+    a torn last line (crash mid-write) ends the replay
+    '''
+    count = 0
+    f = open(path, 'r')
+    for line in f:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            break
+        tilemap.set_cells([tuple(cell) for cell in entry['cells']])
+        for added, tile in entry['offgrid']:
+            other = find_offgrid(tilemap, tile)
+            if added and other is None:
+                tilemap.add_offgrid(tile)
+            if not added and other is not None:
+                tilemap.remove_offgrid(other)
+        count += 1
+    f.close()
+    return count
+
+class Autosaver:
+    '''saves the editor map without stopping the editor
+    the main thread only takes a snapshot (Tilemap.snapshot, a copy of the chunk bytes) or queues the strokes to journal,
+    the encoding (journal lines included, a whole map autotile is one big stroke) and the writes happen on a background thread,
+    in the order they were asked for - strokes don't change once EditHistory.end() returned them, the thread can read them
+    save(): full save to the map file (F5), update(): every frame, journals the strokes and autosaves now and then
+    snapshots are only taken between strokes: a cell changed and put back within a stroke isn't in its diff,
+    a snapshot taken in the middle would keep the change with nothing in the journal to undo it
+    '''
+    def __init__(self, tilemap, path, history, interval=AUTOSAVE_INTERVAL, journal_limit=JOURNAL_LIMIT, folder=AUTOSAVE_FOLDER):
+        self.tilemap = tilemap
+        self.path = path
+        self.history = history
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.autosave_path, self.journal_path = autosave_paths(path, folder)
+        self.interval = interval
+        self.journal_limit = journal_limit
+        self.entries = 0 #journal entries since the last full save
+        self.last_save = time.time()
+        self.save_pending = False #F5 in the middle of a stroke, saved once it ends
+        self.error = None #last failed write (OSError), the editor keeps going
+
+        self.tasks = queue.Queue() #('journal', (stroke, undone, type_names)) / ('save', snapshot) / ('autosave', snapshot), None stops the thread
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+
+    def recover(self):
+        '''loads the edits that weren't saved in the last session over the map already loaded, returns True if there were some
+        '''
+        recovered = False
+        if os.path.exists(self.autosave_path) and (not os.path.exists(self.path) or os.path.getmtime(self.autosave_path) >= os.path.getmtime(self.path)):
+            load_map(self.tilemap, self.autosave_path)
+            recovered = True
+        if os.path.exists(self.journal_path):
+            self.entries = replay_journal(self.tilemap, self.journal_path)
+            recovered = recovered or self.entries > 0
+        return recovered
+
+    def save(self):
+        '''full save to the map file (at the end of the open stroke), the autosave and the journal are dropped once it's written
+        '''
+        self.save_pending = True
+        self.update()
+
+    def update(self):
+        '''journals the strokes of EditHistory since the last call - every frame, after the stroke was closed or not
+        '''
+        for stroke, undone in self.history.take_log():
+            self.tasks.put(('journal', (stroke, undone, list(self.tilemap.type_names))))
+            self.entries += 1
+        if self.history.recording:
+            return
+        if self.save_pending:
+            self.save_pending = False
+            self.entries = 0
+            self.last_save = time.time()
+            self.tasks.put(('save', self.tilemap.snapshot()))
+        #COMPACTION - a full autosave replaces the journal
+        if self.entries and (self.entries >= self.journal_limit or time.time() - self.last_save > self.interval):
+            self.entries = 0
+            self.last_save = time.time()
+            self.tasks.put(('autosave', self.tilemap.snapshot()))
+
+    def close(self):
+        '''closes the open stroke and waits for the pending writes - call before quitting
+        '''
+        self.history.end()
+        self.update()
+        self.tasks.put(None)
+        self.thread.join()
+
+    def work(self):
+        journal = None
+        while True:
+            task = self.tasks.get()
+            if task is None or task[0] != 'journal':
+                if journal:
+                    journal.close()
+                    journal = None
+            if task is None:
+                return
+            try:
+                if task[0] == 'journal':
+                    if journal is None:
+                        journal = open(self.journal_path, 'a')
+                    stroke, undone, names = task[1]
+                    journal.write(journal_entry(names, stroke, undone) + '\n')
+                    if self.tasks.empty():
+                        journal.flush()
+                else:
+                    write_atomic(task[1], self.path if task[0] == 'save' else self.autosave_path, self.folder)
+                    #the journal goes first: an autosave older than the map is ignored by recover()
+                    if os.path.exists(self.journal_path):
+                        os.remove(self.journal_path)
+                    if task[0] == 'save' and os.path.exists(self.autosave_path):
+                        os.remove(self.autosave_path)
+            except OSError as e:
+                self.error = e
+                print('autosave failed:', e)
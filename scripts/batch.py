@@ -0,0 +1,290 @@
+import numpy as np
+
+#SIZES and RULES - same values as Player / Enemy / ProjectilePool
+PLAYER_SIZE = np.array([8, 15])
+ENEMY_SIZE = np.array([8, 15])
+MAX_PROJECTILES = 32 #projectile slots per environment, extra shots are dropped
+PROJECTILE_SPEED = 1.5
+PROJECTILE_LIFETIME = 360
+MAX_AIR_TIME = 180
+
+def decode_actions(actions, n):
+    '''actions are input bitmasks (left 1, right 2, jump 4, dash 8 - as in replays) or (n, 4) bools
+    '''
+    actions = np.asarray(actions)
+    if actions.ndim == 2:
+        return actions[:, 0].astype(bool), actions[:, 1].astype(bool), actions[:, 2].astype(bool), actions[:, 3].astype(bool)
+    actions = np.broadcast_to(actions, (n,)).astype(np.int64)
+    return (actions & 1) != 0, (actions & 2) != 0, (actions & 4) != 0, (actions & 8) != 0
+
+def resolve_axis(grid, pos, move, size, axis):
+    '''pushes entities out of the solid tiles they overlap along one axis, after moving along it
+    same outcome as SolidGrid.move (PhysicsEntity.update) for moves shorter than a tile: our edge is set on the tile edge
+    pos is (..., 2) and updated in place, returns the (negative side, positive side) collision flags
+    '''
+    ts = grid.tile_size
+    rect = np.trunc(pos).astype(np.int64) #pygame.Rect truncates float positions
+    first = rect // ts #first and last tile covered on each axis
+    last = (rect + size - 1) // ts
+    other = 1 - axis
+
+    def line_solid(tile):
+        #any solid tile along the other axis at tile (entities are smaller than a tile so they span 2 at most)
+        if axis == 0:
+            return grid.solid_at(tile, first[..., other]) | grid.solid_at(tile, last[..., other])
+        return grid.solid_at(first[..., other], tile) | grid.solid_at(last[..., other], tile)
+
+    hit_first = line_solid(first[..., axis])
+    hit_last = line_solid(last[..., axis])
+    hit = hit_first | hit_last
+    positive = hit & (move > 0)
+    negative = hit & (move < 0)
+
+    new = np.where(hit, rect[..., axis], pos[..., axis]) #colliding without moving only snaps to the rect
+    new = np.where(positive, np.where(hit_last, last[..., axis], first[..., axis]) * ts - size[axis], new)
+    new = np.where(negative, (np.where(hit_first, first[..., axis], last[..., axis]) + 1) * ts, new)
+    pos[..., axis] = new
+    return negative, positive
+
+def move_and_collide(grid, pos, move, size):
+    '''moves X then Y like PhysicsEntity.update, returns (left, right, up, down) collision flags
+    '''
+    pos[..., 0] += move[..., 0]
+    left, right = resolve_axis(grid, pos, move[..., 0], size, 0)
+    pos[..., 1] += move[..., 1]
+    up, down = resolve_axis(grid, pos, move[..., 1], size, 1)
+    return left, right, up, down
+
+def rects_overlap(pos_a, size_a, pos_b, size_b):
+    a = np.trunc(pos_a)
+    b = np.trunc(pos_b)
+    return ((a[..., 0] < b[..., 0] + size_b[0]) & (a[..., 0] + size_a[0] > b[..., 0]) &
+            (a[..., 1] < b[..., 1] + size_b[1]) & (a[..., 1] + size_a[1] > b[..., 1]))
+
+class BatchEnv:
+    '''n independent copies of a level stepped in lockstep for agent training
+    the player, enemies and projectiles of every copy live in arrays and are updated together
+    tile collisions use the tilemap SolidGrid, so no pygame is involved
+    an environment is done when the player dies, all enemies are dead or max_steps is reached - it's reset right away
+    '''
+    def __init__(self, tilemap, n_envs, seed=None, max_steps=3600, max_projectiles=MAX_PROJECTILES):
+        self.grid = tilemap.solid_grid()
+        self.n = n_envs
+        self.max_steps = max_steps
+        self.max_projectiles = max_projectiles
+        self.rng = np.random.default_rng(seed)
+
+        #SPAWNERS - the last player spawner wins, as in Game.load_level
+        spawners = tilemap.extract([('spawners', 0), ('spawners', 1)], keep=True)
+        self.player_spawn = np.array([50.0, 50.0])
+        enemy_spawns = []
+        for spawner in spawners:
+            if spawner['variant'] == 0:
+                self.player_spawn = np.array(spawner['pos'], dtype=float)
+            else:
+                enemy_spawns.append(spawner['pos'])
+        self.enemy_spawns = np.array(enemy_spawns, dtype=float).reshape(-1, 2)
+        self.n_enemies = len(self.enemy_spawns)
+
+        n, e, p = n_envs, self.n_enemies, max_projectiles
+        #PLAYER
+        self.pos = np.zeros((n, 2))
+        self.velocity = np.zeros((n, 2))
+        self.air_time = np.zeros(n, dtype=np.int64)
+        self.jumps = np.zeros(n, dtype=np.int64)
+        self.dashing = np.zeros(n, dtype=np.int64)
+        self.flip = np.zeros(n, dtype=bool)
+        self.wall_slide = np.zeros(n, dtype=bool)
+        self.last_movement = np.zeros(n)
+        #ENEMIES
+        self.enemy_pos = np.zeros((n, e, 2))
+        self.enemy_velocity = np.zeros((n, e, 2))
+        self.enemy_flip = np.zeros((n, e), dtype=bool)
+        self.enemy_walking = np.zeros((n, e), dtype=np.int64)
+        self.enemy_alive = np.zeros((n, e), dtype=bool)
+        self.enemy_sides = np.zeros((n, e), dtype=bool) #left or right collision on the last update
+        #PROJECTILES
+        self.projectile_pos = np.zeros((n, p, 2))
+        self.projectile_dir = np.zeros((n, p))
+        self.projectile_timer = np.zeros((n, p), dtype=np.int64)
+        self.projectile_active = np.zeros((n, p), dtype=bool)
+        #EPISODES
+        self.steps = np.zeros(n, dtype=np.int64)
+
+        self.reset()
+
+    def reset(self, mask=None):
+        '''resets the environments in mask (all by default), returns the observations
+        '''
+        if mask is None:
+            mask = np.ones(self.n, dtype=bool)
+        self.pos[mask] = self.player_spawn
+        self.velocity[mask] = 0
+        self.air_time[mask] = 0
+        self.jumps[mask] = 1
+        self.dashing[mask] = 0
+        self.flip[mask] = False
+        self.wall_slide[mask] = False
+        self.last_movement[mask] = 0
+        self.enemy_pos[mask] = self.enemy_spawns
+        self.enemy_velocity[mask] = 0
+        self.enemy_flip[mask] = False
+        self.enemy_walking[mask] = 0
+        self.enemy_alive[mask] = True
+        self.enemy_sides[mask] = False
+        self.projectile_active[mask] = False
+        self.steps[mask] = 0
+        return self.observe()
+
+    def observe(self):
+        '''(n, 9 + 3 * enemies) float32 - player state, then each enemy relative to the player and its alive flag
+        '''
+        player = np.stack([self.pos[:, 0], self.pos[:, 1], self.velocity[:, 0], self.velocity[:, 1], self.dashing / 60, self.air_time / MAX_AIR_TIME,
+                           self.jumps, self.wall_slide, self.flip], axis=1)
+        enemies = np.concatenate([self.enemy_pos - self.pos[:, None], self.enemy_alive[..., None]], axis=2).reshape(self.n, -1)
+        return np.concatenate([player, enemies], axis=1).astype(np.float32)
+
+    def step(self, actions):
+        '''advances every environment by one step
+        returns observations, rewards (+1 per enemy killed, -1 on death), done flags and an info dict of arrays
+        '''
+        left, right, jump, dash = decode_actions(actions, self.n)
+
+        #APPLY INPUTS - jump and dash happen before the update, as in Game.update
+        self.jump(jump)
+        self.dash(dash)
+        movement = right.astype(float) - left
+
+        kills = self.update_enemies()
+        died = self.update_player(movement)
+        died |= self.update_projectiles()
+
+        self.steps += 1
+        cleared = ~self.enemy_alive.any(axis=1) & (self.n_enemies > 0)
+        truncated = self.steps >= self.max_steps
+        done = died | cleared | truncated
+        rewards = kills - died.astype(np.float64)
+        info = {'died': died, 'cleared': cleared, 'truncated': truncated, 'steps': self.steps.copy()}
+
+        obs = self.reset(done) if done.any() else self.observe()
+        return obs, rewards, done, info
+
+    def jump(self, mask):
+        #WALL JUMP - away from the wall we're sliding on, only when pushing against it
+        wall = mask & self.wall_slide
+        off_left = wall & self.flip & (self.last_movement < 0)
+        off_right = wall & ~self.flip & (self.last_movement > 0)
+        self.velocity[off_left] = (3.5, -2.5)
+        self.velocity[off_right] = (-3.5, -2.5)
+        wall_jump = off_left | off_right
+        self.air_time[wall_jump] = 5
+        self.jumps[wall_jump] = np.maximum(0, self.jumps[wall_jump] - 1)
+        #NORMAL JUMP
+        normal = mask & ~self.wall_slide & (self.jumps > 0)
+        self.velocity[normal, 1] = -3
+        self.jumps[normal] -= 1
+        self.air_time[normal] = 5
+
+    def dash(self, mask):
+        start = mask & (self.dashing == 0)
+        self.dashing[start] = np.where(self.flip[start], -60, 60)
+
+    def update_player(self, movement):
+        '''PhysicsEntity.update + Player.update for every environment, returns the envs where the player died
+        '''
+        move = np.stack([movement + self.velocity[:, 0], self.velocity[:, 1]], axis=1)
+        left, right, up, down = move_and_collide(self.grid, self.pos, move, PLAYER_SIZE)
+
+        self.flip = np.where(movement > 0, False, np.where(movement < 0, True, self.flip))
+        self.last_movement = movement
+        self.velocity[:, 1] = np.minimum(5, self.velocity[:, 1] + 0.1) #gravity
+        self.velocity[up | down, 1] = 0
+
+        #AIRTIME and JUMPS
+        self.air_time = np.where(down, 0, self.air_time + 1)
+        self.jumps[down] = 1
+        died = self.air_time > MAX_AIR_TIME
+
+        #WALL SLIDE
+        self.wall_slide = (left | right) & (self.air_time >= 5)
+        self.velocity[self.wall_slide, 1] = np.minimum(self.velocity[self.wall_slide, 1], 0.5)
+        self.flip = np.where(self.wall_slide, ~right, self.flip)
+
+        #DASHING - full speed for 10 steps then a sudden stop, cooldown until 0
+        dashing = np.abs(self.dashing)
+        self.velocity[:, 0] = np.where(dashing > 50, np.sign(self.dashing) * 8, self.velocity[:, 0])
+        self.velocity[:, 0] = np.where(dashing == 50, self.velocity[:, 0] * 0.1, self.velocity[:, 0])
+        self.dashing -= np.sign(self.dashing)
+
+        #X VELOCITY decays to 0
+        vx = self.velocity[:, 0]
+        self.velocity[:, 0] = np.where(vx > 0, np.maximum(vx - 0.1, 0), np.minimum(vx + 0.1, 0))
+        return died
+
+    def update_enemies(self):
+        '''Enemy.update for every enemy of every environment, returns the kills per environment
+        '''
+        alive = self.enemy_alive
+        walking = alive & (self.enemy_walking > 0)
+
+        #WALK - turn at ledges and walls, otherwise move half a pixel
+        center_x = np.trunc(self.enemy_pos[..., 0]) + ENEMY_SIZE[0] // 2
+        probe = np.stack([center_x + np.where(self.enemy_flip, -7, 7), self.enemy_pos[..., 1] + 23], axis=-1)
+        ground = self.grid.solid_at_px(probe)
+        self.enemy_flip ^= walking & (~ground | self.enemy_sides)
+        movement = np.where(walking & ground & ~self.enemy_sides, np.where(self.enemy_flip, -0.5, 0.5), 0)
+        self.enemy_walking = np.where(walking, np.maximum(0, self.enemy_walking - 1), self.enemy_walking)
+
+        #SHOOT when stopping, if the player is in front and on the same height
+        distance = self.pos[:, None] - self.enemy_pos
+        facing = np.where(self.enemy_flip, distance[..., 0] < 0, distance[..., 0] > 0)
+        shoot = walking & (self.enemy_walking == 0) & (np.abs(distance[..., 1]) < 16) & facing
+        for env, enemy in zip(*np.nonzero(shoot)): #rare, a loop is fine
+            self.add_projectile(env, enemy)
+
+        #START WALKING at random
+        start = alive & ~walking & (self.rng.random(alive.shape) < 0.01)
+        self.enemy_walking[start] = self.rng.integers(30, 121, int(start.sum()))
+
+        move = np.stack([movement + self.enemy_velocity[..., 0], self.enemy_velocity[..., 1]], axis=-1)
+        left, right, up, down = move_and_collide(self.grid, self.enemy_pos, move, ENEMY_SIZE)
+        self.enemy_sides = left | right
+        self.enemy_flip = np.where(movement > 0, False, np.where(movement < 0, True, self.enemy_flip))
+        self.enemy_velocity[..., 1] = np.minimum(5, self.enemy_velocity[..., 1] + 0.1)
+        self.enemy_velocity[up | down, 1] = 0
+
+        #KILL - dashing player touching an enemy
+        dashing = np.abs(self.dashing) >= 50
+        killed = alive & dashing[:, None] & rects_overlap(self.enemy_pos, ENEMY_SIZE, self.pos[:, None], PLAYER_SIZE)
+        self.enemy_alive &= ~killed
+        return killed.sum(axis=1).astype(np.float64)
+
+    def add_projectile(self, env, enemy):
+        free = np.flatnonzero(~self.projectile_active[env])
+        if not len(free):
+            return
+        slot = free[0]
+        direction = -PROJECTILE_SPEED if self.enemy_flip[env, enemy] else PROJECTILE_SPEED
+        rect = np.trunc(self.enemy_pos[env, enemy])
+        self.projectile_pos[env, slot] = (rect[0] + ENEMY_SIZE[0] // 2 + (-7 if direction < 0 else 7), rect[1] + ENEMY_SIZE[1] // 2)
+        self.projectile_dir[env, slot] = direction
+        self.projectile_timer[env, slot] = 0
+        self.projectile_active[env, slot] = True
+
+    def update_projectiles(self):
+        '''moves the projectiles, returns the envs where the player got hit
+        '''
+        active = self.projectile_active
+        self.projectile_pos[..., 0] += self.projectile_dir * active
+        self.projectile_timer += active
+
+        wall = active & self.grid.solid_at_px(self.projectile_pos)
+        timeout = active & ~wall & (self.projectile_timer > PROJECTILE_LIFETIME)
+        #PLAYER HIT - only when not dashing, point in the player rect
+        rect = np.trunc(self.pos)[:, None]
+        point = np.trunc(self.projectile_pos)
+        inside = ((point >= rect) & (point < rect + PLAYER_SIZE)).all(axis=-1)
+        hit = active & ~wall & ~timeout & (np.abs(self.dashing) < 50)[:, None] & inside
+
+        self.projectile_active &= ~(wall | timeout | hit)
+        return hit.any(axis=1)
@@ -17,11 +17,11 @@ class Cloud:
         surf.blit(self.img, (render_pos[0] % (surf.get_width() + self.img.get_width()) - self.img.get_width(), render_pos[1] % (surf.get_height() + self.img.get_height()) - self.img.get_height()))
         
 class Clouds:
-    def __init__(self, cloud_images, count=16):
+    def __init__(self, cloud_images, count=16, rng=random):
         self.clouds = []
 
         for i in range(count): #999s because of the module
-            self.clouds.append(Cloud((random.random()*99999, random.random()*99999), random.choice(cloud_images), random.random()*0.05 + 0.05, random.random() * 0.5 + 0.2))
+            self.clouds.append(Cloud((rng.random()*99999, rng.random()*99999), rng.choice(cloud_images), rng.random()*0.05 + 0.05, rng.random() * 0.5 + 0.2))
             
         self.clouds.sort(key=lambda x : x.depth) #sort clouds by their depth - closest to front
 
@@ -1,15 +1,13 @@
-import random
 import math
 import pygame
 
-from scripts.particle import Particle
-from scripts.spark import Spark
 
 class PhysicsEntity:
     def __init__(self, game, e_type, pos, size):
         self.game = game
         self.type = e_type
         self.pos = list(pos) #convert every iterable into a list
+        self.prev_pos = list(pos) #position before the last update, for render interpolation
         self.size = size
         self.velocity = [0, 0]
         self.collisions = {'up': False, 'down': False, 'right': False, 'left': False} #keep track of collisions
@@ -31,37 +29,21 @@ class PhysicsEntity:
             self.animation = self.game.assets[self.type + '/' + self.action].copy()
 
     def update(self, tilemap, movement=(0,0)):
-        #RESET COLLISIONS
-        self.collisions = {'up': False, 'down': False, 'right': False, 'left': False}
+        self.prev_pos[0] = self.pos[0]
+        self.prev_pos[1] = self.pos[1]
 
         #CALCULATE MOVEMENT
         frame_movement = (movement[0] + self.velocity[0], movement[1] + self.velocity[1])
 
-        #UPDATE and COLLISIONS X
-        self.pos[0] += frame_movement[0]
-        entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
-            if entity_rect.colliderect(rect):
-                if frame_movement[0] > 0: #you were moving right
-                    entity_rect.right = rect.left #set our right side to the left one of the oject collided
-                    self.collisions['right'] = True
-                if frame_movement[0] < 0:
-                    entity_rect.left = rect.right
-                    self.collisions['left'] = True
-                self.pos[0] = entity_rect.x #the final X position is stored in self.pos
-
-        #UPDATE and COLLISIONS Y
-        self.pos[1] += frame_movement[1]
-        entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
-            if entity_rect.colliderect(rect):
-                if frame_movement[1] > 0:
-                    entity_rect.bottom = rect.top
-                    self.collisions['down'] = True
-                if frame_movement[1] < 0:
-                    entity_rect.top = rect.bottom
-                    self.collisions['up'] = True
-                self.pos[1] = entity_rect.y
+        #UPDATE and COLLISIONS - swept over the solid grid, X then Y, stopping on the first solid tile on the way
+        x, y, left, right, up, down = tilemap.solid_grid().move(self.pos, self.size, frame_movement)
+        self.pos[0] = x
+        self.pos[1] = y
+        collisions = self.collisions #updated in place, no new dict per step
+        collisions['left'] = left
+        collisions['right'] = right
+        collisions['up'] = up
+        collisions['down'] = down
 
         #APPLY FLIP if required
         if movement[0] > 0: #our assets already face right
@@ -82,7 +64,9 @@ class PhysicsEntity:
         self.animation.update()
 
     def render(self, surf, offset=(0, 0)):
-        surf.blit(pygame.transform.flip(self.animation.img(), self.flip, False), (self.pos[0] - offset[0] + self.anim_offset[0], self.pos[1] - offset[1] + self.anim_offset[1]))
+        '''returns the drawn area
+        '''
+        return surf.blit(self.animation.img(self.flip), (self.pos[0] - offset[0] + self.anim_offset[0], self.pos[1] - offset[1] + self.anim_offset[1]))
 
 #INHERITING PE into CLASSES to implement specific behaviours (e.g. airtime for Player)
 class Player(PhysicsEntity):
@@ -138,15 +122,15 @@ class Player(PhysicsEntity):
 
         #DASHING PARTICLES
         if abs(self.dashing) > 50 and abs(self.dashing) < 60: #during dash
-            p_velocity = [abs(self.dashing) / self.dashing * random.random() * 3, 0] #no y particles
-            self.game.particles.append(Particle(self.game, 'particle', self.rect().center, velocity=p_velocity, frame=random.randint(0, 7)))
+            p_velocity = [abs(self.dashing) / self.dashing * self.game.rng.random() * 3, 0] #no y particles
+            self.game.particles.add('particle', self.rect().center, velocity=p_velocity, frame=self.game.rng.randint(0, 7))
         
         elif abs(self.dashing) in {50, 60}: #either start or end of dash - burst of 20 particles
             for i in range(20):
-                p_angle = random.random() * math.pi * 2
-                p_speed = random.random() * 0.5 + 0.5
+                p_angle = self.game.rng.random() * math.pi * 2
+                p_speed = self.game.rng.random() * 0.5 + 0.5
                 p_velocity = [math.cos(p_angle) * p_speed, math.sin(p_angle) * p_speed] #standard way to derive velocity from angles
-                self.game.particles.append(Particle(self.game, 'particle', self.rect().center, velocity=p_velocity, frame=random.randint(0, 7)))
+                self.game.particles.add('particle', self.rect().center, velocity=p_velocity, frame=self.game.rng.randint(0, 7))
         
         #CONTROLLING DASHING
         if self.dashing > 0:
@@ -190,7 +174,7 @@ class Player(PhysicsEntity):
 
     def render(self, surf, offset=(0, 0)):
         if abs(self.dashing) <= 50: #TODO ???
-            super().render(surf, offset=offset)
+            return super().render(surf, offset=offset)
 
 class Enemy(PhysicsEntity):
     def __init__(self, game, pos, size):
@@ -215,18 +199,20 @@ class Enemy(PhysicsEntity):
                 if (abs(dis[1]) < 16):
                     if (self.flip and dis[0] < 0): #enemy facing left and player to its left
                         self.game.sfx['shoot'].play()
-                        self.game.projectiles.append([[self.rect().centerx - 7, self.rect().centery], -1.5, 0])
+                        pos = (self.rect().centerx - 7, self.rect().centery)
+                        self.game.projectiles.add(pos, -1.5)
                         #SPARKS - LEFT
                         for i in range(4):
-                            self.game.sparks.append(Spark(self.game.projectiles[-1][0], random.random() - 0.5 + math.pi, 2 + random.random()))
+                            self.game.sparks.add(pos, self.game.rng.random() - 0.5 + math.pi, 2 + self.game.rng.random())
                     elif (not self.flip and dis[0] > 0): #enemy facing right and player to its right
                         self.game.sfx['shoot'].play()
-                        self.game.projectiles.append([[self.rect().centerx + 7, self.rect().centery], 1.5, 0])
+                        pos = (self.rect().centerx + 7, self.rect().centery)
+                        self.game.projectiles.add(pos, 1.5)
                         #SPARKS - RIGHT
                         for i in range(4):
-                            self.game.sparks.append(Spark(self.game.projectiles[-1][0], random.random() - 0.5, 2 + random.random()))
-        elif random.random() < 0.01:
-            self.walking = random.randint(30, 120)
+                            self.game.sparks.add(pos, self.game.rng.random() - 0.5, 2 + self.game.rng.random())
+        elif self.game.rng.random() < 0.01:
+            self.walking = self.game.rng.randint(30, 120)
 
         super().update(tilemap, movement=movement)
 
@@ -242,20 +228,21 @@ class Enemy(PhysicsEntity):
                 self.game.sfx['hit'].play()
                 #SPARKS
                 for i in range(30):
-                    s_angle = random.random() * math.pi * 2
-                    s_speed = random.random() * 5
-                    self.game.sparks.append(Spark(self.rect().center, s_angle, 2 + random.random()))
-                    self.game.particles.append(Particle(self.game, 'particle', self.rect().center, velocity=[math.cos(s_angle + math.pi) * s_speed * 0.5, math.sin(s_angle + math.pi) * s_speed * 0.5], frame=random.randint(0, 7)))                
+                    s_angle = self.game.rng.random() * math.pi * 2
+                    s_speed = self.game.rng.random() * 5
+                    self.game.sparks.add(self.rect().center, s_angle, 2 + self.game.rng.random())
+                    self.game.particles.add('particle', self.rect().center, velocity=[math.cos(s_angle + math.pi) * s_speed * 0.5, math.sin(s_angle + math.pi) * s_speed * 0.5], frame=self.game.rng.randint(0, 7))                
                 #extra left and right sparks for enemies
-                self.game.sparks.append(Spark(self.rect().center, 0, 5 + random.random()))
-                self.game.sparks.append(Spark(self.rect().center, math.pi, 5 + random.random()))
+                self.game.sparks.add(self.rect().center, 0, 5 + self.game.rng.random())
+                self.game.sparks.add(self.rect().center, math.pi, 5 + self.game.rng.random())
                 return True
 
 
     def render(self, surf, offset=(0, 0)):
-        super().render(surf, offset=offset)
+        rect = super().render(surf, offset=offset)
 
         if self.flip:
-            surf.blit(pygame.transform.flip(self.game.assets['gun'], True, False), (self.rect().centerx - 4 - self.game.assets['gun'].get_width() - offset[0], self.rect().centery - offset[1]))
+            gun_rect = surf.blit(self.game.assets['gun/flipped'], (self.rect().centerx - 4 - self.game.assets['gun'].get_width() - offset[0], self.rect().centery - offset[1]))
         else:
-            surf.blit(self.game.assets['gun'], (self.rect().centerx + 4 - offset[0], self.rect().centery - offset[1]))
\ No newline at end of file
+            gun_rect = surf.blit(self.game.assets['gun'], (self.rect().centerx + 4 - offset[0], self.rect().centery - offset[1]))
+        return rect.union(gun_rect)
\ No newline at end of file
@@ -0,0 +1,161 @@
+from collections import deque
+
+from scripts.tilemap import AUTOTILE_SHIFTS
+
+UNDO_LIMIT = 500 #strokes kept for undo
+CELL_LIMIT = 500000 #changes kept for undo over all the strokes (~100 bytes each, ~50 MB) - the oldest strokes are dropped past it
+
+class Stroke:
+    '''one undoable edit - everything changed between EditHistory.begin() and end()
+    cells: (x, y) -> (before, after), (type_id, variant) of the cell, (0, 0) when empty
+    offgrid: [(tile, seq, added), ...] in the order it happened
+    '''
+    __slots__ = ('cells', 'offgrid')
+
+    def __init__(self, cells, offgrid):
+        self.cells = cells
+        self.offgrid = offgrid
+
+    def __len__(self):
+        return len(self.cells) + len(self.offgrid)
+
+class EditHistory:
+    '''undo/redo of the editor edits
+    the edits made while a mouse button is held are one stroke: a cell painted over on every frame is stored once,
+    with its state before the stroke and after it, cells that end up unchanged are dropped
+    undo/redo replay the diff of one stroke - it costs the size of the stroke, never the size of the map
+    '''
+    def __init__(self, tilemap, limit=UNDO_LIMIT, cell_limit=CELL_LIMIT):
+        self.tilemap = tilemap
+        self.limit = limit
+        self.cell_limit = cell_limit
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.size = 0 #changes stored in undo_stack
+        self.log = [] #(stroke, undone) for every stroke stored, undone or redone since the last take_log()
+
+        #OPEN STROKE
+        self.recording = False
+        self.before = {} #(x, y) -> cell when it was first touched in the stroke
+        self.offgrid = []
+
+    def begin(self):
+        '''opens a stroke - the edits below open one themselves, the editor only has to end() it
+        '''
+        if not self.recording:
+            self.recording = True
+            self.before = {}
+            self.offgrid = []
+
+    def touch(self, pos):
+        '''call before changing the cell at tile pos - only the first call in a stroke keeps the state
+        '''
+        if not self.recording:
+            self.begin()
+        if pos not in self.before:
+            self.before[pos] = self.tilemap.cell(pos[0], pos[1])
+
+    def touch_around(self, pos):
+        '''the cell and the 4 neighbors autotile_around can change
+        '''
+        self.touch(pos)
+        for (dx, dy), bit in AUTOTILE_SHIFTS:
+            self.touch((pos[0] + dx, pos[1] + dy))
+
+    def touch_cells(self, cells):
+        '''touch_around for every cell of a bulk edit
+        '''
+        for pos in cells:
+            self.touch_around(pos)
+
+    def touch_autotiled(self):
+        '''every cell the whole map autotile() can change
+        '''
+        for x, y, tid, variant in self.tilemap.iter_cells():
+            if self.tilemap.autotile_ids[tid]:
+                self.touch((x, y))
+
+    def add_offgrid(self, tile):
+        self.begin()
+        seq = self.tilemap.offgrid_seq
+        self.tilemap.add_offgrid(tile)
+        self.offgrid.append((tile, seq, True))
+
+    def remove_offgrid(self, tile):
+        self.begin()
+        seq = self.tilemap.remove_offgrid(tile)
+        if seq is not None:
+            self.offgrid.append((tile, seq, False))
+
+    def end(self):
+        '''closes the stroke and stores what it changed, returns the Stroke - None if nothing changed
+        '''
+        if not self.recording:
+            return None
+        self.recording = False
+        cells = {}
+        for pos, before in self.before.items():
+            after = self.tilemap.cell(pos[0], pos[1])
+            if after != before:
+                cells[pos] = (before, after)
+        self.before = {}
+        if not (cells or self.offgrid):
+            return None
+        stroke = Stroke(cells, self.offgrid)
+        self.undo_stack.append(stroke)
+        self.size += len(stroke)
+        self.redo_stack = []
+        self.log.append((stroke, False))
+        #MEMORY BOUND - the oldest strokes go first, the last one is always kept
+        while len(self.undo_stack) > 1 and (len(self.undo_stack) > self.limit or self.size > self.cell_limit):
+            self.size -= len(self.undo_stack.popleft())
+        return stroke
+
+    def take_log(self):
+        '''returns the log and starts a new one - Autosaver.update takes it every frame for the journal
+        '''
+        log = self.log
+        self.log = []
+        return log
+
+    def apply(self, stroke, undo):
+        '''puts the cells and offgrid tiles of stroke in their state before it (undo) or after it
+        '''
+        names = self.tilemap.type_names
+        for pos, change in stroke.cells.items():
+            tid, variant = change[0] if undo else change[1]
+            if tid:
+                self.tilemap.set_tile(pos, names[tid], variant)
+            else:
+                self.tilemap.remove_tile(pos)
+        for tile, seq, added in (reversed(stroke.offgrid) if undo else stroke.offgrid):
+            if added != undo:
+                self.tilemap.add_offgrid(tile, seq)
+            else:
+                self.tilemap.remove_offgrid(tile)
+
+    def undo(self):
+        '''reverts the last stroke (closing the open one first), returns it - None if there is nothing to undo
+        '''
+        self.end()
+        if not self.undo_stack:
+            return None
+        stroke = self.undo_stack.pop()
+        self.size -= len(stroke)
+        self.apply(stroke, True)
+        self.redo_stack.append(stroke)
+        self.log.append((stroke, True))
+        return stroke
+
+    def redo(self):
+        '''replays the last undone stroke, returns it - None if there is nothing to redo
+        '''
+        self.end()
+        if not self.redo_stack:
+            return None
+        stroke = self.redo_stack.pop()
+        self.apply(stroke, False)
+        self.undo_stack.append(stroke)
+        self.size += len(stroke)
+        self.log.append((stroke, False))
+        return stroke
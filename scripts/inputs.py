@@ -0,0 +1,39 @@
+from collections import namedtuple
+
+#INPUT for one simulation step
+#left/right are held keys, jump/dash are presses (True only on the step the key went down)
+InputState = namedtuple('InputState', ['left', 'right', 'jump', 'dash'])
+NO_INPUT = InputState(False, False, False, False)
+
+ACTIONS = InputState._fields
+
+def scripted_inputs(segments):
+    '''yields one InputState per step from (frames, actions) segments
+    held actions (left/right) last for the whole segment, presses (jump/dash) only for its first step
+    e.g. [(30, {'right'}), (1, {'right', 'jump'}), (60, set())]
+    '''
+    for frames, actions in segments:
+        for frame in range(frames):
+            yield InputState('left' in actions, 'right' in actions, frame == 0 and 'jump' in actions, frame == 0 and 'dash' in actions)
+
+def parse_input_script(text):
+    '''reads segments from text, one per line: frame count followed by the actions
+    e.g. "30 right" or "1 right jump" - everything after # is a comment
+    '''
+    segments = []
+    for line in text.splitlines():
+        words = line.split('#')[0].split()
+        if not words:
+            continue
+        actions = set(words[1:])
+        unknown = actions - set(ACTIONS)
+        if unknown:
+            raise ValueError("unknown input action(s): " + ', '.join(sorted(unknown)))
+        segments.append((int(words[0]), actions))
+    return segments
+
+def load_input_script(path):
+    f = open(path, 'r')
+    segments = parse_input_script(f.read())
+    f.close()
+    return segments
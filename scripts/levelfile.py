@@ -0,0 +1,146 @@
+import os
+import sys
+import mmap
+import struct
+import numpy as np
+
+from scripts.tilemap import Tilemap, CHUNK_SIZE
+from scripts.stream import load_chunked
+
+#BINARY LEVEL FILE (.lvl) - every section is a typed array, so the file can be memory-mapped and used in place
+#header: magic, version, tile_size, names length, chunk count, offgrid count
+#names: type names separated by \0 (index + 1 = type id in the file, 0 is empty), padded to 8 bytes
+#chunk keys: int32 (chunk_x, chunk_y) per chunk
+#types, then variants: uint8 CHUNK_SIZE * CHUNK_SIZE per chunk, rows of cells like TileChunk
+#offgrid records: type id, variant, flags (bit 0/1: x/y was an int in the JSON), x, y as float64
+MAGIC = b'NJLV'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIII')
+CELLS = CHUNK_SIZE * CHUNK_SIZE
+OFFGRID_DTYPE = np.dtype([('type', '<u2'), ('variant', '<u2'), ('flags', 'u1'), ('pad', 'u1', 3), ('x', '<f8'), ('y', '<f8')])
+
+#the level files the game looks for, the most recently written one is used
+LEVEL_EXTENSIONS = ('.lvl', '.chunks', '.json')
+
+def padded(length):
+    return (length + 7) & ~7
+
+def save_lvl(tilemap, path):
+    names = tilemap.type_names[1:]
+    for tile in tilemap.offgrid_tiles:
+        if tile['type'] not in names:
+            names.append(tile['type'])
+    file_ids = {name: i + 1 for i, name in enumerate(names)}
+    names_data = '\0'.join(names).encode()
+
+    #on-grid cells keep the tilemap ids, offgrid only types are appended after them
+    keys = sorted(tilemap.chunks)
+    key_array = np.array(keys, dtype=np.int32).reshape(-1, 2)
+
+    offgrid = tilemap.offgrid_tiles
+    records = np.array([(file_ids[tile['type']], tile['variant'], isinstance(tile['pos'][0], int) | isinstance(tile['pos'][1], int) << 1, 0, tile['pos'][0], tile['pos'][1])
+                        for tile in offgrid], dtype=OFFGRID_DTYPE)
+
+    f = open(path, 'wb')
+    f.write(HEADER.pack(MAGIC, VERSION, tilemap.tile_size, len(names_data), len(keys), len(offgrid)))
+    f.write(names_data.ljust(padded(len(names_data)), b'\0'))
+    f.write(key_array.tobytes())
+    f.write(b''.join(tilemap.chunks[key].types for key in keys))
+    f.write(b''.join(tilemap.chunks[key].variants for key in keys))
+    f.write(records.tobytes())
+    f.close()
+
+class LevelFile:
+    '''memory-mapped .lvl file - the arrays are views on the file, nothing is read until used
+    keys (n, 2) int32, types/variants (n, CHUNK_SIZE, CHUNK_SIZE) uint8, offgrid structured records
+    '''
+    def __init__(self, path):
+        self.f = open(path, 'rb')
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.tile_size, names_length, n_chunks, n_offgrid = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(path + " is not a level file")
+        if version != VERSION:
+            raise ValueError("unsupported level file version " + str(version))
+
+        offset = HEADER.size
+        self.names = [None] + bytes(self.mm[offset:offset + names_length]).decode().split('\0') if names_length else [None]
+        offset += padded(names_length)
+        self.keys = np.frombuffer(self.mm, dtype=np.int32, count=n_chunks * 2, offset=offset).reshape(-1, 2)
+        offset += n_chunks * 8
+        self.types = np.frombuffer(self.mm, dtype=np.uint8, count=n_chunks * CELLS, offset=offset).reshape(-1, CHUNK_SIZE, CHUNK_SIZE)
+        offset += n_chunks * CELLS
+        self.variants = np.frombuffer(self.mm, dtype=np.uint8, count=n_chunks * CELLS, offset=offset).reshape(-1, CHUNK_SIZE, CHUNK_SIZE)
+        offset += n_chunks * CELLS
+        self.offgrid = np.frombuffer(self.mm, dtype=OFFGRID_DTYPE, count=n_offgrid, offset=offset)
+
+    def close(self):
+        #views must be dropped before the map can be closed
+        self.keys = self.types = self.variants = self.offgrid = None
+        self.mm.close()
+        self.f.close()
+
+def load_lvl(tilemap, path):
+    level = LevelFile(path)
+    tilemap.clear()
+    tilemap.tile_size = level.tile_size
+
+    #file ids -> tilemap ids for the types used on the grid, whole chunks are remapped with bytes.translate
+    table = bytearray(range(256))
+    for file_id in np.unique(level.types).tolist():
+        if file_id:
+            table[file_id] = tilemap.type_id(level.names[file_id])
+    table = bytes(table)
+
+    types = level.types.reshape(-1, CELLS)
+    variants = level.variants.reshape(-1, CELLS)
+    for i, (chunk_x, chunk_y) in enumerate(level.keys.tolist()):
+        tilemap.install_chunk((chunk_x, chunk_y), types[i].tobytes().translate(table), variants[i].tobytes())
+
+    for tid, variant, flags, x, y in zip(*(level.offgrid[field].tolist() for field in ('type', 'variant', 'flags', 'x', 'y'))):
+        tilemap.add_offgrid({'type': level.names[tid], 'variant': variant, 'pos': [int(x) if flags & 1 else x, int(y) if flags & 2 else y]})
+    del types, variants #views on the map
+    level.close()
+
+def load_map(tilemap, path):
+    '''loads a .lvl, .chunks (the whole level, see LevelStream to stream it) or .json map file
+    '''
+    if path.endswith('.lvl'):
+        load_lvl(tilemap, path)
+    elif path.endswith('.chunks'):
+        load_chunked(tilemap, path)
+    else:
+        tilemap.load(path)
+
+def save_map(tilemap, path):
+    if path.endswith('.lvl'):
+        save_lvl(tilemap, path)
+    else:
+        tilemap.save(path)
+
+def level_ids(folder='data/maps'):
+    '''sorted ids of the levels in folder - files named <digits>.lvl/.chunks/.json, nothing else there is a level
+    '''
+    ids = set()
+    for name in os.listdir(folder):
+        stem, ext = os.path.splitext(name)
+        if stem.isdigit() and ext in LEVEL_EXTENSIONS:
+            ids.add(int(stem))
+    return sorted(ids)
+
+def find_level(base):
+    '''returns the most recent of base.lvl/.chunks/.json, None if there is none or if base isn't a level id (digits)
+    '''
+    if not os.path.basename(base).isdigit():
+        return None
+    paths = [base + ext for ext in LEVEL_EXTENSIONS if os.path.exists(base + ext)]
+    if not paths:
+        return None
+    return max(paths, key=os.path.getmtime)
+
+if __name__ == '__main__':
+    #python -m scripts.levelfile in.json out.lvl (or the other way around) - lossless both ways
+    tilemap = Tilemap(None)
+    load_map(tilemap, sys.argv[1])
+    save_map(tilemap, sys.argv[2])
+    print(sys.argv[1], '->', sys.argv[2], os.path.getsize(sys.argv[1]), '->', os.path.getsize(sys.argv[2]), 'bytes')
@@ -0,0 +1,213 @@
+import os
+import time
+import random
+import argparse
+
+from scripts.tilemap import Tilemap
+from scripts.levelfile import save_map
+
+#SIZES - the hand-made maps (data/maps) are 28 x 16 tiles, scale 1 of the stress corpus; a scale is a multiple of their area
+REFERENCE_SIZE = (28, 16)
+CORPUS_SCALES = (1, 10, 100, 1000)
+CORPUS_PATH = 'data/stress/'
+
+WALL = 3 #stone columns on each side and rows of floor under the level, like the hand-made maps
+GROUND_HEIGHT = 5 #tiles the ground can rise above the floor
+BAND_SPACING = (4, 6) #rows between two bands of floating platforms
+PLATFORM_LENGTH = (3, 9)
+PLATFORM_GAP = (2, 8)
+PLATFORM_THICKNESS = (1, 2) #thinner than BAND_SPACING - 2, there is always room to walk under a platform
+PIT_RATE = 0.04 #chance per column to start a pit (ground down to the floor)
+
+#SMALLEST LEVEL - the walls and a column of ground for the player (who starts at WALL + 2),
+#the floor and the highest ground with 2 free rows above it (floor - GROUND_HEIGHT > 2)
+MIN_WIDTH = WALL * 2 + 3
+MIN_HEIGHT = WALL + GROUND_HEIGHT + 3
+
+#what goes on the surfaces (empty cells above a solid one), rates per surface cell
+ENEMY_RATE = 0.04
+TREE_RATE = 0.03
+ROCK_RATE = 0.03
+DECOR_RATE = 0.08
+PLAYER_CLEARANCE = 8 #tiles around the player start without enemies
+
+#pixel sizes of data/images/tiles - offgrid tiles are placed standing on the ground, and the trees need room for their leaves
+LARGE_DECOR_SIZES = {0: (31, 9), 1: (25, 12), 2: (33, 44)}
+SPAWNER_SIZES = {0: (8, 15), 1: (6, 15)}
+
+EMPTY, GRASS, STONE = 0, 1, 2
+GRID_TYPES = (None, 'grass', 'stone')
+
+def level_size(scale):
+    '''(width, height) in tiles of a level with scale times the area of the hand-made maps, same proportions
+    '''
+    k = scale ** 0.5
+    return max(REFERENCE_SIZE[0], round(REFERENCE_SIZE[0] * k)), max(REFERENCE_SIZE[1], round(REFERENCE_SIZE[1] * k))
+
+class LevelGrid:
+    '''the solid cells of a level being generated, a flat bytearray of EMPTY / GRASS / STONE
+    '''
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.cells = bytearray(width * height)
+
+    def get(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.cells[y * self.width + x]
+        return EMPTY
+
+    def fill(self, x, y, w, h, value):
+        for row in range(max(0, y), min(self.height, y + h)):
+            start = row * self.width
+            self.cells[start + max(0, x):start + min(self.width, x + w)] = bytes([value]) * (min(self.width, x + w) - max(0, x))
+
+    def clear(self, x, y, w, h):
+        '''True if the w x h tiles at x, y are all empty
+        '''
+        if x < 0 or y < 0 or x + w > self.width or y + h > self.height:
+            return False
+        return all(not any(self.cells[row * self.width + x:row * self.width + x + w]) for row in range(y, y + h))
+
+    def surface(self, x, y, w, h):
+        '''True if w tiles at x, y are solid with h empty rows above them - room for something standing there
+        '''
+        return all(self.get(x + i, y) for i in range(w)) and self.clear(x, y - h, w, h)
+
+def generate_level(width, height, seed=0):
+    '''a playable level in the map format: stone walls and floor, a ground of grass with steps and pits,
+    bands of floating grass/stone platforms up to the top, then on their surfaces the player, enemies,
+    trees (large_decor 2, the leaf spawners), rocks/bushes (large_decor 0/1) and decor
+    the same (width, height, seed) always gives the same level
+    raises ValueError for a level smaller than MIN_WIDTH x MIN_HEIGHT
+    '''
+    if width < MIN_WIDTH or height < MIN_HEIGHT:
+        raise ValueError('level too small: %d x %d tiles, the walls, floor and ground need at least %d x %d' % (width, height, MIN_WIDTH, MIN_HEIGHT))
+    rng = random.Random(seed)
+    grid = LevelGrid(width, height)
+    tile_size = 16
+    floor = height - WALL #first row of the floor
+
+    #WALLS AND FLOOR
+    grid.fill(0, 0, WALL, height, STONE)
+    grid.fill(width - WALL, 0, WALL, height, STONE)
+    grid.fill(0, floor, width, WALL, STONE)
+
+    #GROUND - random walk above the floor, flat at the start for the player
+    ground = floor - 3
+    pit = 0
+    for x in range(WALL, width - WALL):
+        if x > WALL + 6:
+            if pit:
+                pit -= 1
+            elif rng.random() < PIT_RATE:
+                pit = rng.randint(2, 4)
+            if rng.random() < 0.2:
+                ground = max(floor - GROUND_HEIGHT, min(floor - 1, ground + rng.choice((-1, 1))))
+        if not pit:
+            grid.fill(x, ground, 1, floor - ground, GRASS)
+
+    #PLATFORMS - rows of them every few tiles up to the top of the level
+    y = floor - GROUND_HEIGHT - BAND_SPACING[0]
+    while y >= 3:
+        x = WALL + rng.randint(0, PLATFORM_GAP[1])
+        while x < width - WALL:
+            length = rng.randint(*PLATFORM_LENGTH)
+            grid.fill(x, y, min(length, width - WALL - x), rng.randint(*PLATFORM_THICKNESS), GRASS if rng.random() < 0.7 else STONE)
+            x += length + rng.randint(*PLATFORM_GAP)
+        y -= rng.randint(*BAND_SPACING)
+
+    #SURFACES - the player starts on the ground at the left, everything else is spread over the surfaces
+    player = None
+    for y in range(floor - 1, 1, -1):
+        if grid.surface(WALL + 2, y, 1, 2):
+            player = (WALL + 2, y)
+            break
+    offgrid = [{'type': 'spawners', 'variant': 0, 'pos': [player[0] * tile_size + 4, player[1] * tile_size - SPAWNER_SIZES[0][1]]}]
+    decor = []
+    cells = grid.cells
+    used = set([player])
+    enemies = 0
+    for y in range(3, floor):
+        row = y * width
+        for x in range(WALL, width - WALL):
+            if not cells[row + x] or cells[row - width + x] or (x, y) in used or not grid.surface(x, y, 1, 2):
+                continue
+            r = rng.random()
+            if r < ENEMY_RATE:
+                if abs(x - player[0]) + abs(y - player[1]) > PLAYER_CLEARANCE:
+                    offgrid.append({'type': 'spawners', 'variant': 1, 'pos': [x * tile_size + 5, y * tile_size - SPAWNER_SIZES[1][1]]})
+                    used.add((x, y))
+                    enemies += 1
+                continue
+            r -= ENEMY_RATE
+            if r < TREE_RATE:
+                #3 tiles wide, 3 tall above the ground
+                if grid.surface(x, y, 3, 3) and not used.intersection((x + i, y) for i in range(3)):
+                    offgrid.append({'type': 'large_decor', 'variant': 2, 'pos': [x * tile_size + 7, y * tile_size - LARGE_DECOR_SIZES[2][1]]})
+                    used.update((x + i, y) for i in range(3))
+                continue
+            r -= TREE_RATE
+            if r < ROCK_RATE:
+                variant = rng.randrange(2)
+                if grid.surface(x, y, 2, 1) and (x + 1, y) not in used:
+                    offgrid.append({'type': 'large_decor', 'variant': variant, 'pos': [x * tile_size + rng.randrange(8) / 2, y * tile_size - LARGE_DECOR_SIZES[variant][1]]})
+                    used.update(((x, y), (x + 1, y)))
+                continue
+            r -= ROCK_RATE
+            if r < DECOR_RATE:
+                decor.append((x, y - 1, 'decor', rng.randrange(4)))
+                used.add((x, y))
+
+    #at least one enemy - the level is cleared when there are none left
+    if not enemies:
+        for x in range(width - WALL - 1, WALL, -1):
+            y = next((y for y in range(floor) if grid.surface(x, y, 1, 2)), None)
+            if y is not None and (x, y) not in used:
+                offgrid.append({'type': 'spawners', 'variant': 1, 'pos': [x * tile_size + 5, y * tile_size - SPAWNER_SIZES[1][1]]})
+                break
+
+    #TILEMAP - cells in one bulk edit, autotiled afterwards like a hand-made map
+    tilemap = Tilemap(None, tile_size)
+    tilemap.set_cells([(i % width, i // width, GRID_TYPES[cells[i]], 0) for i in range(len(cells)) if cells[i]])
+    tilemap.autotile()
+    tilemap.set_cells(decor)
+    for tile in offgrid:
+        tilemap.add_offgrid(tile)
+    return tilemap
+
+def build_corpus(folder=CORPUS_PATH, scales=CORPUS_SCALES, seed=0, ext='.json'):
+    '''writes folder/stress_<scale>x<ext> for each scale, returns the paths
+    the files are rebuilt from the seed on demand, they aren't meant to be committed (the 1000x json is ~5 MB)
+    '''
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for scale in scales:
+        width, height = level_size(scale)
+        start = time.perf_counter()
+        tilemap = generate_level(width, height, seed + scale)
+        path = os.path.join(folder, 'stress_%dx%s' % (scale, ext))
+        save_map(tilemap, path)
+        print('%-28s %5d x %-4d tiles %8d cells %6d offgrid %8.2f s' % (path, width, height, tilemap.tile_count(), len(tilemap.offgrid_tiles), time.perf_counter() - start))
+        paths.append(path)
+    return paths
+
+if __name__ == '__main__':
+    #python -m scripts.levelgen - stress corpus in data/stress, or one level: python -m scripts.levelgen --size 60x30 --out data/maps/3.json
+    parser = argparse.ArgumentParser(description='seeded procedural levels')
+    parser.add_argument('--folder', default=CORPUS_PATH, help='where the corpus goes')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(CORPUS_SCALES), help='areas of the corpus levels, in hand-made maps')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--lvl', action='store_true', help='binary .lvl files instead of .json')
+    parser.add_argument('--size', help='WxH in tiles - writes a single level to --out instead of the corpus')
+    parser.add_argument('--out', help='map file for --size (.json or .lvl)')
+    args = parser.parse_args()
+    if args.size:
+        width, height = (int(n) for n in args.size.split('x'))
+        try:
+            tilemap = generate_level(width, height, args.seed)
+        except ValueError as e:
+            parser.error(str(e))
+        save_map(tilemap, args.out or 'map.json')
+    else:
+        build_corpus(args.folder, args.scales, args.seed, '.lvl' if args.lvl else '.json')
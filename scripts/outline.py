@@ -0,0 +1,40 @@
+import pygame
+
+OUTLINE_OFFSETS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+class Outline:
+    '''black outline behind everything drawn on the display
+    the frame mask is put together from the static masks of the tilemap (built once per level)
+    and the areas dynamic objects (entities, projectiles, sparks) were drawn on - only those are read back
+    the mask and the silhouette surface are allocated once and reused every frame
+    '''
+    def __init__(self, size, color=(0, 0, 0, 180)):
+        self.color = color #rgb + transparency
+        self.mask = pygame.Mask(size)
+        self.silhouette = pygame.Surface(size, pygame.SRCALPHA)
+        self.dirty = [] #display rects drawn on by dynamic objects this frame
+
+    def begin(self):
+        self.dirty.clear()
+
+    def add(self, rect):
+        '''marks an area drawn by a dynamic object - blit and draw functions return it
+        '''
+        if rect:
+            self.dirty.append(rect)
+
+    def build(self, display, tilemap, offset):
+        '''the silhouette has blobs of black wherever we drew something
+        '''
+        self.mask.clear()
+        tilemap.draw_mask(self.mask, offset)
+        bounds = display.get_rect()
+        for rect in self.dirty:
+            rect = rect.clip(bounds)
+            if rect.width and rect.height:
+                self.mask.draw(pygame.mask.from_surface(display.subsurface(rect)), rect.topleft)
+        self.mask.to_surface(self.silhouette, setcolor=self.color, unsetcolor=(0, 0, 0, 0))
+
+    def render(self, surf):
+        for offset in OUTLINE_OFFSETS:
+            surf.blit(self.silhouette, offset)
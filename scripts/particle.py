@@ -1,26 +1,124 @@
-class Particle:
-    def __init__(self, game, p_type, pos, velocity=[0, 0], frame=0):
+import numpy as np
+
+SWAY_TYPES = {'leaf'} #particles drifting left and right while they fall
+
+class ParticleSystem:
+    '''every live particle in flat arrays (one row per particle) instead of one object each
+    updates are a handful of vectorized operations whatever the number of particles
+    dead particles are swap-removed: the last live rows are moved into the holes
+    '''
+    def __init__(self, game, p_types=('leaf', 'particle'), capacity=1024):
         self.game = game
-        self.p_type = p_type
-        self.pos = list(pos)
-        self.velocity = list(velocity)
-        self.animation = self.game.assets['particle/' + p_type].copy()
-        self.animation.frame = frame
+        self.p_types = list(p_types)
+
+        #IMAGE TABLE - frames of all the types in one list, a particle shows image base + frame // duration
+        self.images = []
+        base, duration, last, loop, sway = [], [], [], [], []
+        for p_type in self.p_types:
+            animation = self.game.assets['particle/' + p_type]
+            base.append(len(self.images))
+            self.images.extend(animation.images)
+            duration.append(animation.img_duration)
+            last.append(animation.img_duration * len(animation.images) - 1) #-1 because off by one
+            loop.append(animation.loop)
+            sway.append(p_type in SWAY_TYPES)
+        self.type_base = np.array(base)
+        self.type_duration = np.array(duration)
+        self.type_last = np.array(last)
+        self.type_loop = np.array(loop)
+        self.type_sway = np.array(sway)
+        self.half_sizes = np.array([(img.get_width() // 2, img.get_height() // 2) for img in self.images], dtype=float) #for centering
+
+        self.count = 0
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        '''(re)allocates the arrays keeping the live particles
+        '''
+        n = self.count
+        arrays = {
+            'pos': np.zeros((capacity, 2)),
+            'velocity': np.zeros((capacity, 2)),
+            'frame': np.zeros(capacity, dtype=np.int64),
+            'p_type': np.zeros(capacity, dtype=np.int64),
+            'done': np.zeros(capacity, dtype=bool),
+            'kill': np.zeros(capacity, dtype=bool),
+        }
+        for name, array in arrays.items():
+            if n:
+                array[:n] = getattr(self, name)[:n]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def add(self, p_type, pos, velocity=(0, 0), frame=0):
+        if self.count == self.capacity:
+            self.allocate(self.capacity * 2)
+        i = self.count
+        self.pos[i] = pos
+        self.velocity[i] = velocity
+        self.frame[i] = frame
+        self.p_type[i] = self.p_types.index(p_type)
+        self.done[i] = False
+        self.kill[i] = False
+        self.count += 1
+
+    def compact(self):
+        '''swap-removes the killed particles - order is not kept, it doesn't matter for drawing
+        '''
+        n = self.count
+        alive = ~self.kill[:n]
+        new_count = int(alive.sum())
+        holes = np.flatnonzero(~alive[:new_count]) #dead rows that stay inside the live range
+        movers = np.flatnonzero(alive[new_count:]) + new_count #live rows past the live range
+        for array in (self.pos, self.velocity, self.frame, self.p_type, self.done):
+            array[holes] = array[movers]
+        self.kill[:new_count] = False
+        self.count = new_count
 
     def update(self):
-        kill = False
-        if self.animation.done:
-            kill = True
+        #REMOVE the particles killed on the previous update - they have been rendered one last time
+        if self.kill[:self.count].any():
+            self.compact()
+        n = self.count
+        if not n:
+            return
+
+        p_type = self.p_type[:n]
+        frame = self.frame[:n]
+
+        #KILL when the animation was already done
+        self.kill[:n] = self.done[:n]
+
+        self.pos[:n] += self.velocity[:n]
 
-        self.pos[0] += self.velocity[0]
-        self.pos[1] += self.velocity[1]
+        #ANIMATION - looping types wrap around, the others stop on the last frame
+        last = self.type_last[p_type]
+        frame += 1
+        np.copyto(frame, np.where(self.type_loop[p_type], frame % (last + 1), np.minimum(frame, last)))
+        self.done[:n] = ~self.type_loop[p_type] & (frame >= last)
 
-        self.animation.update()
+        #SWAY - leaves move following their frame
+        sway = self.type_sway[p_type]
+        if sway.any():
+            self.pos[:n, 0] += np.where(sway, np.sin(frame * 0.035) * 0.3, 0)
 
-        return kill
-    
     def render(self, surf, offset=(0, 0)):
-        img = self.animation.img()
-        #centering particles wrt screen center
-        surf.blit(img, (self.pos[0] - offset[0] - img.get_width() // 2, self.pos[1] - offset[1] - img.get_height() // 2))
-        
\ No newline at end of file
+        n = self.count
+        if not n:
+            return
+        p_type = self.p_type[:n]
+        image_ids = self.type_base[p_type] + self.frame[:n] // self.type_duration[p_type]
+        #centering particles wrt their position
+        dest = self.pos[:n] - offset - self.half_sizes[image_ids]
+        #CULLING - skip the particles outside of the surface (half_sizes * 2 is the image size)
+        visible = ((dest > -2 * self.half_sizes[image_ids] - 1) & (dest < surf.get_size())).all(axis=1)
+        if not visible.all():
+            image_ids = image_ids[visible]
+            dest = dest[visible]
+        surf.blits(zip(map(self.images.__getitem__, image_ids.tolist()), dest.tolist()), doreturn=False)
@@ -0,0 +1,156 @@
+import csv
+import json
+import time
+from collections import deque
+import numpy as np
+import pygame
+
+HISTORY = 300 #frames the overlay percentiles are computed on (5s at 60 fps)
+MAX_LOG = 36000 #frames kept for the export (10 min at 60 fps), the oldest are dropped
+OVERLAY_REFRESH = 30 #frames between overlay redraws - drawing text every frame would show up in the timings
+PERCENTILES = (50, 95, 99)
+
+class NullScope:
+    '''what scope() returns while profiling is off - entering and leaving it does nothing
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SCOPE = NullScope()
+
+class Scope:
+    '''times a with block and adds it to the current frame of the profiler - one per name, reused
+    '''
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        frame = self.profiler.frame
+        frame[self.name] = frame.get(self.name, 0) + (time.perf_counter() - self.start) * 1000
+        return False
+
+class Profiler:
+    '''per-frame timings of named scopes:  with profiler.scope('render/tilemap'): ...
+    a scope entered several times in a frame adds up (update/* when the simulation catches up)
+    'frame' is the time between two end_frame calls, waiting for the frame cap included
+    while disabled scope() only returns NULL_SCOPE, so the instrumented code stays in place for free
+    '''
+    def __init__(self, enabled=False, overlay=True):
+        self.enabled = enabled
+        self.overlay = overlay #draw the percentiles on the screen (render_overlay)
+        self.scopes = {} #name -> Scope
+        self.names = ['frame'] #in the order they were first seen - columns of the exports
+        self.frame = {} #name -> ms for the frame being timed
+        self.frame_start = None
+        self.history = deque(maxlen=HISTORY)
+        self.log = deque(maxlen=MAX_LOG)
+
+        #OVERLAY - redrawn every OVERLAY_REFRESH frames, blitted every frame
+        self.font = None
+        self.overlay_surf = None
+        self.refresh = 0
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frame = {}
+        self.frame_start = None
+        self.overlay_surf = None
+
+    def scope(self, name):
+        if not self.enabled:
+            return NULL_SCOPE
+        scope = self.scopes.get(name)
+        if scope is None:
+            scope = self.scopes[name] = Scope(self, name)
+            self.names.append(name)
+        return scope
+
+    def end_frame(self):
+        '''closes the frame being timed - call once per rendered (or simulated, headless) frame
+        '''
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.frame_start is not None: #the first frame after enabling has no start, it's dropped
+            self.frame['frame'] = (now - self.frame_start) * 1000
+            self.history.append(self.frame)
+            self.log.append(self.frame)
+        self.frame_start = now
+        self.frame = {}
+
+    def summary(self, frames=None):
+        '''name -> {'mean', 'p50', 'p95', 'p99', 'max'} in ms over frames (default: the rolling history)
+        frames where a scope didn't run count as 0
+        '''
+        frames = self.history if frames is None else frames
+        stats = {}
+        if not frames:
+            return stats
+        for name in self.names:
+            values = np.array([frame.get(name, 0) for frame in frames])
+            stats[name] = {'mean': float(values.mean()), 'max': float(values.max())}
+            for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES).tolist()):
+                stats[name]['p' + str(p)] = value
+        return stats
+
+    def report(self):
+        '''text table of the summary of every logged frame
+        '''
+        lines = ['%-20s %8s %8s %8s %8s' % ('scope (ms)', 'mean', 'p50', 'p95', 'p99')]
+        for name, s in self.summary(self.log).items():
+            lines.append('%-20s %8.3f %8.3f %8.3f %8.3f' % (name, s['mean'], s['p50'], s['p95'], s['p99']))
+        return '\n'.join(lines)
+
+    def export(self, path):
+        '''writes the logged frames to path - .json (frames + summary) or .csv (one row per frame)
+        '''
+        frames = list(self.log)
+        if path.endswith('.json'):
+            f = open(path, 'w')
+            json.dump({'scopes': self.names, 'frames': frames, 'summary': self.summary(frames)}, f)
+            f.close()
+        else:
+            f = open(path, 'w', newline='')
+            writer = csv.writer(f)
+            writer.writerow(['index'] + self.names)
+            for i, frame in enumerate(frames):
+                writer.writerow([i] + [round(frame.get(name, 0), 4) for name in self.names])
+            f.close()
+
+    def render_overlay(self, surf):
+        if not (self.enabled and self.overlay):
+            return
+        self.refresh -= 1
+        if self.overlay_surf is None or self.refresh <= 0:
+            self.refresh = OVERLAY_REFRESH
+            self.overlay_surf = self.draw_overlay()
+        if self.overlay_surf:
+            surf.blit(self.overlay_surf, (4, 4))
+
+    def draw_overlay(self):
+        stats = self.summary()
+        if not stats:
+            return None
+        if self.font is None:
+            self.font = pygame.font.Font(None, 16)
+        columns = ['p50', 'p95', 'p99']
+        line_height = self.font.get_linesize()
+        surf = pygame.Surface((250, line_height * (len(stats) + 1) + 4), pygame.SRCALPHA)
+        surf.fill((0, 0, 0, 160))
+        #one text per cell at a fixed x, the default font is not monospaced
+        rows = [['ms'] + columns] + [[name] + ['%.2f' % stats[name][c] for c in columns] for name in stats]
+        for i, row in enumerate(rows):
+            for j, text in enumerate(row):
+                surf.blit(self.font.render(text, True, (255, 255, 255)), (2 + (j and 125 + (j - 1) * 40), 2 + i * line_height))
+        return surf
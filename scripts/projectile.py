@@ -0,0 +1,104 @@
+import numpy as np
+
+LIFETIME = 360 #steps before a projectile is removed (6s)
+
+class ProjectilePool:
+    '''all the projectiles in preallocated arrays - position, direction (x speed per step) and timer
+    moving, expiring and hitting walls are a few vectorized operations whatever the number of projectiles,
+    only the ones that hit something run Python code
+    removals keep the firing order, so hits are handled in the same order on every run (replays)
+    '''
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        '''(re)allocates the arrays keeping the live projectiles
+        '''
+        n = self.count
+        arrays = {
+            'pos': np.zeros((capacity, 2)),
+            'direction': np.zeros(capacity),
+            'timer': np.zeros(capacity, dtype=np.int64),
+        }
+        for name, array in arrays.items():
+            if n:
+                array[:n] = getattr(self, name)[:n]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def add(self, pos, direction):
+        if self.count == self.capacity:
+            self.allocate(self.capacity * 2)
+        i = self.count
+        self.pos[i] = pos
+        self.direction[i] = direction
+        self.timer[i] = 0
+        self.count += 1
+
+    def positions(self):
+        return self.pos[:self.count]
+
+    def keep(self, alive):
+        '''removes the projectiles where alive (bool array) is False, the others stay in order
+        '''
+        n = self.count
+        new_count = int(alive.sum())
+        for array in (self.pos, self.direction, self.timer):
+            array[:new_count] = array[:n][alive]
+        self.count = new_count
+
+    def update(self, solid_grid, player_rect=None, active=None):
+        '''one simulation step - solid_grid is the SolidGrid of the map
+        player_rect - the player can be hit (None if not, e.g. dashing)
+        active - bool array, False for the projectiles out of the simulated area: removed before moving
+        returns (pos, direction, hit_player) for each projectile removed on a wall or on the player, in firing order
+        '''
+        if active is not None and not active.all():
+            self.keep(active)
+        n = self.count
+        if not n:
+            return []
+
+        #MOVE and AGE
+        pos = self.pos[:n]
+        pos[:, 0] += self.direction[:n]
+        self.timer[:n] += 1
+
+        #WALL HIT, TIMEOUT and PLAYER HIT - in this priority, like the checks in the old per-projectile loop
+        wall = solid_grid.solid_at_px(pos)
+        alive = ~wall & (self.timer[:n] <= LIFETIME)
+        hit = np.zeros(n, dtype=bool)
+        if player_rect is not None:
+            point = np.trunc(pos) #Rect.collidepoint truncates the point
+            hit = alive & (point[:, 0] >= player_rect.left) & (point[:, 0] < player_rect.right) & (point[:, 1] >= player_rect.top) & (point[:, 1] < player_rect.bottom)
+            alive &= ~hit
+
+        if alive.all():
+            return []
+        events = [(pos[i].tolist(), float(self.direction[i]), bool(hit[i])) for i in np.flatnonzero(wall | hit)]
+        self.keep(alive)
+        return events
+
+    def render(self, surf, img, offset=(0, 0)):
+        '''draws img centered on every projectile on surf, returns the drawn areas
+        '''
+        n = self.count
+        if not n:
+            return []
+        dest = self.pos[:n] - (img.get_width() / 2, img.get_height() / 2) - offset
+        #CULLING - 1px margin for the rounding of the blit position
+        visible = ((dest > (-img.get_width() - 1, -img.get_height() - 1)) & (dest < (surf.get_width() + 1, surf.get_height() + 1))).all(axis=1)
+        return surf.blits([(img, tuple(p)) for p in dest[visible].tolist()])
+
+    def state(self):
+        '''[[x, y], direction, timer] for each projectile - for the state checksum
+        '''
+        n = self.count
+        return [[pos, direction, timer] for pos, direction, timer in zip(self.pos[:n].tolist(), self.direction[:n].tolist(), self.timer[:n].tolist())]
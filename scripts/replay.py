@@ -0,0 +1,97 @@
+import struct
+
+from scripts.inputs import InputState
+
+#REPLAY FILE
+#header: magic, version, rng seed, starting level
+#body: runs of identical inputs - input bitmask (1 byte) + run length (2 bytes)
+#trailer: END marker, total steps, checksum of the final game state (to catch desyncs)
+MAGIC = b'NJRP'
+VERSION = 1
+HEADER = struct.Struct('<4sHQI')
+RUN = struct.Struct('<BH')
+TRAILER = struct.Struct('<BIQ')
+END = 0xFF #never a valid input bitmask
+MAX_RUN = 0xFFFF
+
+def input_mask(input_state):
+    '''packs an InputState in one byte - left 1, right 2, jump 4, dash 8
+    '''
+    return input_state.left | input_state.right << 1 | input_state.jump << 2 | input_state.dash << 3
+
+def mask_input(mask):
+    return InputState(bool(mask & 1), bool(mask & 2), bool(mask & 4), bool(mask & 8))
+
+class InputRecorder:
+    '''writes the input of every simulation step to a compact binary log
+    '''
+    def __init__(self, path, seed, level=0):
+        self.f = open(path, 'wb')
+        self.f.write(HEADER.pack(MAGIC, VERSION, seed, level))
+        self.mask = None
+        self.run = 0
+        self.steps = 0
+
+    def record(self, input_state):
+        mask = input_mask(input_state)
+        if mask == self.mask and self.run < MAX_RUN:
+            self.run += 1
+        else:
+            self.flush()
+            self.mask = mask
+            self.run = 1
+        self.steps += 1
+
+    def flush(self):
+        if self.run:
+            self.f.write(RUN.pack(self.mask, self.run))
+            self.run = 0
+
+    def close(self, checksum=0):
+        self.flush()
+        self.f.write(TRAILER.pack(END, self.steps, checksum))
+        self.f.close()
+
+class Replay:
+    '''a recorded run - seed, starting level and the input for each step
+    '''
+    def __init__(self, seed, level, runs, steps=None, checksum=None):
+        self.seed = seed
+        self.level = level
+        self.runs = runs #[(mask, length), ...]
+        self.steps = steps #None if the recording was cut short (no trailer)
+        self.checksum = checksum
+
+    @classmethod
+    def load(cls, path):
+        f = open(path, 'rb')
+        data = f.read()
+        f.close()
+
+        if len(data) < HEADER.size:
+            raise ValueError(path + " is not a replay file")
+        magic, version, seed, level = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(path + " is not a replay file")
+        if version != VERSION:
+            raise ValueError("unsupported replay version " + str(version))
+
+        runs = []
+        steps = checksum = None
+        offset = HEADER.size
+        while offset + RUN.size <= len(data):
+            if data[offset] == END:
+                if offset + TRAILER.size <= len(data): #cut inside the trailer - same as no trailer
+                    marker, steps, checksum = TRAILER.unpack_from(data, offset)
+                break
+            runs.append(RUN.unpack_from(data, offset))
+            offset += RUN.size
+        return cls(seed, level, runs, steps, checksum)
+
+    def inputs(self):
+        '''yields one InputState per recorded step
+        '''
+        for mask, length in self.runs:
+            input_state = mask_input(mask)
+            for i in range(length):
+                yield input_state
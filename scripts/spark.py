@@ -1,24 +1,82 @@
 import math
+import numpy as np
 import pygame
 
-class Spark:
-    def __init__(self, pos, angle, speed):
-        self.pos = list(pos)
-        self.angle = angle
-        self.speed = speed
+#CORNERS of the spark polygon - angle offset and length (multiplied by speed to shrink automatically)
+CORNER_ANGLES = (0, math.pi * 0.5, math.pi, -math.pi * 0.5)
+CORNER_LENGTHS = np.array([3, 0.5, 3, 0.5])
+
+class SparkPool:
+    '''all the sparks in preallocated arrays, slots of dead sparks are reused
+    the direction of each corner is computed once when the spark is added, so no trig runs per frame
+    '''
+    def __init__(self, capacity=256):
+        self.count = 0
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        '''(re)allocates the arrays keeping the live sparks
+        '''
+        n = self.count
+        arrays = {
+            'pos': np.zeros((capacity, 2)),
+            'corners': np.zeros((capacity, 4, 2)), #unit vector for each corner, corner 0 is the moving direction
+            'speed': np.zeros(capacity),
+            'kill': np.zeros(capacity, dtype=bool),
+        }
+        for name, array in arrays.items():
+            if n:
+                array[:n] = getattr(self, name)[:n]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def add(self, pos, angle, speed):
+        if self.count == self.capacity:
+            self.allocate(self.capacity * 2)
+        i = self.count
+        self.pos[i] = pos
+        for corner, corner_angle in enumerate(CORNER_ANGLES):
+            self.corners[i, corner] = (math.cos(angle + corner_angle), math.sin(angle + corner_angle))
+        self.speed[i] = speed
+        self.kill[i] = False
+        self.count += 1
+
+    def compact(self):
+        '''swap-removes the killed sparks
+        '''
+        n = self.count
+        alive = ~self.kill[:n]
+        new_count = int(alive.sum())
+        holes = np.flatnonzero(~alive[:new_count])
+        movers = np.flatnonzero(alive[new_count:]) + new_count
+        for array in (self.pos, self.corners, self.speed):
+            array[holes] = array[movers]
+        self.kill[:new_count] = False
+        self.count = new_count
 
     def update(self):
-        self.pos[0] += math.cos(self.angle) * self.speed
-        self.pos[1] += math.sin(self.angle) * self.speed
+        #REMOVE the sparks killed on the previous update - they have been rendered one last time
+        if self.kill[:self.count].any():
+            self.compact()
+        n = self.count
+        self.pos[:n] += self.corners[:n, 0] * self.speed[:n, None]
+        np.maximum(self.speed[:n] - 0.1, 0, out=self.speed[:n])
+        self.kill[:n] = self.speed[:n] == 0 #speed=0 means the spark needs to be removed
 
-        self.speed = max(0, self.speed - 0.1)
-        return not self.speed #true when speed=0, which means the spark needs to be removed
-    
     def render(self, surf, offset=(0, 0)):
-        render_points = [ #define 4 points for the polygon corners - multiplying by speed to shrink automatically
-            (self.pos[0] + math.cos(self.angle) * self.speed * 3 - offset[0], self.pos[1] + math.sin(self.angle) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[0], self.pos[1] + math.sin(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[1]),
-            (self.pos[0] + math.cos(self.angle + math.pi) * self.speed * 3 - offset[0], self.pos[1] + math.sin(self.angle + math.pi) * self.speed * 3 - offset[1]),
-            (self.pos[0] + math.cos(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[0], self.pos[1] + math.sin(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[1])
-        ]
-        pygame.draw.polygon(surf, (255, 255, 255), render_points)
+        '''returns the drawn areas
+        '''
+        n = self.count
+        if not n:
+            return []
+        #4 points for the polygon corners of every spark at once
+        points = self.pos[:n, None] + self.corners[:n] * self.speed[:n, None, None] * CORNER_LENGTHS[:, None] - offset
+        #CULLING - skip the sparks with no corner on the surface
+        visible = ((points.max(axis=1) > -1) & (points.min(axis=1) < surf.get_size())).all(axis=1) #-1 for rounding on the edge
+        return [pygame.draw.polygon(surf, (255, 255, 255), polygon) for polygon in points[visible].tolist()]
@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import zlib
+import queue
+import struct
+import threading
+import numpy as np
+
+from scripts.tilemap import Tilemap, CHUNK_SHIFT, CHUNK_SIZE, CHUNK_MASK
+
+#CHUNKED LEVEL FILE (.chunks) - a small header, then every chunk as its own compressed record
+#header: magic, version, length of the JSON part
+#JSON part: tile_size, type names (index = type id in the records), offgrid tiles, markers, chunk index
+#record: zlib of types + variants (CHUNK_SIZE * CHUNK_SIZE bytes each) - offsets count from the end of the header
+MAGIC = b'NJCH'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')
+CELLS = CHUNK_SIZE * CHUNK_SIZE
+
+#MARKERS - on-grid types the game extracts when a level starts (spawners, trees dropping leaves)
+#they are kept in the header instead of the chunks so they are all there before any chunk is loaded
+#a chunk holding markers is evicted like any other, the markers still in it are put back when it's loaded again
+MARKER_TYPES = {'spawners', 'large_decor'}
+
+#STREAMING RADII in chunks around the player
+STREAM_RADIUS = 2 #always in memory - loaded on the spot if the background thread didn't get to it yet
+PREFETCH_RADIUS = 3 #requested to the background thread ahead of time
+EVICT_RADIUS = 4 #chunks further than this are dropped
+
+def save_chunked(tilemap, path, markers=MARKER_TYPES):
+    '''writes tilemap to a .chunks file - lossless, the markers are moved to the header
+    '''
+    marker_ids = {tid for tid, name in enumerate(tilemap.type_names) if name in markers}
+    marker_cells = []
+    records = []
+    index = []
+    offset = 0
+    for key in sorted(tilemap.chunks):
+        chunk = tilemap.chunks[key]
+        types = bytearray(chunk.types)
+        variants = bytearray(chunk.variants)
+        for i in range(CELLS):
+            if types[i] in marker_ids:
+                pos = [(key[0] << CHUNK_SHIFT) | (i & CHUNK_MASK), (key[1] << CHUNK_SHIFT) | (i >> CHUNK_SHIFT)]
+                marker_cells.append({'type': tilemap.type_names[types[i]], 'variant': variants[i], 'pos': pos})
+                types[i] = variants[i] = 0
+        if not any(types):
+            continue
+        record = zlib.compress(bytes(types + variants))
+        records.append(record)
+        index.append([key[0], key[1], offset, len(record)])
+        offset += len(record)
+
+    header = json.dumps({
+        'tile_size': tilemap.tile_size,
+        'types': tilemap.type_names[1:], #id 0 is empty
+        'offgrid': tilemap.offgrid_tiles,
+        'markers': marker_cells,
+        'chunks': index,
+    }).encode()
+    f = open(path, 'wb')
+    f.write(HEADER.pack(MAGIC, VERSION, len(header)))
+    f.write(header)
+    for record in records:
+        f.write(record)
+    f.close()
+
+def read_header(f):
+    '''reads the header of an open .chunks file, returns the header dict and where the records start
+    '''
+    magic, version, length = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("not a chunked level file")
+    if version != VERSION:
+        raise ValueError("unsupported chunked level version " + str(version))
+    return json.loads(f.read(length)), HEADER.size + length
+
+def load_chunked(tilemap, path):
+    '''loads a whole .chunks file in tilemap, no streaming - the same map as the one save_chunked wrote
+    '''
+    f = open(path, 'rb')
+    header, data_start = read_header(f)
+    tilemap.clear()
+    tilemap.tile_size = header['tile_size']
+    table = bytearray(range(256))
+    for file_id, name in enumerate(header['types'], start=1):
+        table[file_id] = tilemap.type_id(name)
+    table = bytes(table)
+    for chunk_x, chunk_y, offset, length in header['chunks']:
+        f.seek(data_start + offset)
+        cells = zlib.decompress(f.read(length))
+        tilemap.install_chunk((chunk_x, chunk_y), cells[:CELLS].translate(table), cells[CELLS:])
+    f.close()
+    for tile in header['markers']:
+        tilemap.set_tile(tile['pos'], tile['type'], tile['variant'])
+    for tile in header['offgrid']:
+        tilemap.add_offgrid(tile)
+
+def chunk_distance(key, center):
+    return max(abs(key[0] - center[0]), abs(key[1] - center[1]))
+
+class LevelStream:
+    '''keeps the chunks of a .chunks level around the player in a Tilemap
+    level start only reads the header, chunks are read by a background thread ahead of the player
+    the chunks within STREAM_RADIUS are always loaded before the simulation needs them,
+    so what the simulation sees doesn't depend on the thread timing (replays stay in sync)
+    '''
+    def __init__(self, tilemap, path):
+        self.tilemap = tilemap
+        self.path = path
+        self.f = open(path, 'rb')
+        self.header, self.data_start = read_header(self.f)
+        self.index = {(cx, cy): (offset, length) for cx, cy, offset, length in self.header['chunks']}
+
+        #MAP SETUP - everything but the chunks
+        tilemap.clear()
+        tilemap.tile_size = self.header['tile_size']
+        #file type ids -> tilemap type ids, applied to whole records with bytes.translate
+        table = bytearray(range(256))
+        for file_id, name in enumerate(self.header['types'], start=1):
+            table[file_id] = tilemap.type_id(name)
+        self.id_table = bytes(table)
+        for tile in self.header['offgrid']:
+            tilemap.add_offgrid(tile)
+        for tile in self.header['markers']:
+            tilemap.set_tile(tile['pos'], tile['type'], tile['variant'])
+        self.marker_ids = {tilemap.type_id(tile['type']) for tile in self.header['markers']}
+        #chunks with only markers have no record, they are streamed (empty + markers) like the others
+        self.keys = set(self.index) | {(tile['pos'][0] >> CHUNK_SHIFT, tile['pos'][1] >> CHUNK_SHIFT) for tile in self.header['markers']}
+        self.markers = {} #key -> [(cell index, type id, variant), ...] left in the chunk when it was evicted
+
+        self.loaded = set() #keys of the chunks read from the file
+        self.pending = set() #keys requested to the thread
+        self.center = None
+
+        #BACKGROUND THREAD - reads with its own file handle, results are applied on the main thread
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    def read_chunk(self, f, key):
+        if key not in self.index:
+            return bytes(CELLS), bytes(CELLS)
+        offset, length = self.index[key]
+        f.seek(self.data_start + offset)
+        cells = zlib.decompress(f.read(length))
+        return cells[:CELLS].translate(self.id_table), cells[CELLS:]
+
+    def worker(self):
+        f = open(self.path, 'rb')
+        while True:
+            key = self.requests.get()
+            if key is None:
+                break
+            self.results.put((key,) + self.read_chunk(f, key))
+        f.close()
+
+    def install(self, key, types, variants):
+        if key not in self.loaded:
+            markers = self.markers.pop(key, None)
+            if markers:
+                types = bytearray(types)
+                variants = bytearray(variants)
+                for i, tid, variant in markers:
+                    types[i] = tid
+                    variants[i] = variant
+            self.tilemap.install_chunk(key, types, variants)
+            self.loaded.add(key)
+
+    def drop(self, key):
+        '''evicts a chunk - the marker cells still in it are kept for install (the game removed the spawners it extracted)
+        '''
+        chunk = self.tilemap.chunks.get(key)
+        if chunk is not None:
+            markers = []
+            for tid in self.marker_ids:
+                i = chunk.types.find(tid)
+                while i != -1:
+                    markers.append((i, tid, chunk.variants[i]))
+                    i = chunk.types.find(tid, i + 1)
+            if markers:
+                self.markers[key] = markers
+            self.tilemap.drop_chunk(key)
+        self.loaded.discard(key)
+
+    def update(self, pos):
+        '''call once per simulation step with the player pos (pixels)
+        '''
+        chunk_px = CHUNK_SIZE * self.tilemap.tile_size
+        center = (int(pos[0] // chunk_px), int(pos[1] // chunk_px))
+
+        #RESULTS from the thread - a prefetch the player moved away from is dropped, it would be evicted anyway
+        while True:
+            try:
+                key, types, variants = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.discard(key)
+            if chunk_distance(key, center) <= EVICT_RADIUS:
+                self.install(key, types, variants)
+
+        if center == self.center:
+            return
+        self.center = center
+
+        #REQUIRED and PREFETCH
+        for key in self.keys_around(center, PREFETCH_RADIUS):
+            if key in self.loaded:
+                continue
+            if chunk_distance(key, center) <= STREAM_RADIUS:
+                self.install(key, *self.read_chunk(self.f, key)) #the thread result will be ignored
+            elif key not in self.pending:
+                self.pending.add(key)
+                self.requests.put(key)
+
+        #EVICT - the chunks with markers set at the start count too, they are not in loaded until their record is
+        for key in self.loaded.union(self.tilemap.chunks):
+            if chunk_distance(key, center) > EVICT_RADIUS:
+                self.drop(key)
+
+    def keys_around(self, center, radius):
+        return [(center[0] + dx, center[1] + dy) for dx in range(-radius, radius + 1) for dy in range(-radius, radius + 1) if (center[0] + dx, center[1] + dy) in self.keys]
+
+    def active(self, pos):
+        '''True if pos (pixels) is close enough to the player for entities to be simulated
+        one chunk inside the stream radius so their tile checks never reach an unloaded chunk
+        '''
+        if self.center is None:
+            return False
+        chunk_px = CHUNK_SIZE * self.tilemap.tile_size
+        return chunk_distance((int(pos[0] // chunk_px), int(pos[1] // chunk_px)), self.center) < STREAM_RADIUS
+
+    def active_array(self, pos):
+        '''active() for a (n, 2) array of positions, returns a bool array
+        '''
+        if self.center is None:
+            return np.zeros(len(pos), dtype=bool)
+        chunk_px = CHUNK_SIZE * self.tilemap.tile_size
+        chunks = np.floor_divide(pos, chunk_px).astype(np.int64)
+        return np.abs(chunks - self.center).max(axis=1) < STREAM_RADIUS
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
+        self.f.close()
+
+if __name__ == '__main__':
+    #python -m scripts.stream data/maps/0.json ... - writes data/maps/0.chunks next to each map
+    for path in sys.argv[1:]:
+        tilemap = Tilemap(None)
+        tilemap.load(path)
+        out = os.path.splitext(path)[0] + '.chunks'
+        save_chunked(tilemap, out)
+        print(path, '->', out, os.path.getsize(path), '->', os.path.getsize(out), 'bytes')
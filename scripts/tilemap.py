@@ -1,31 +1,523 @@
+import math
 import pygame
 import json
+import numpy as np
 
 #RULES for AUTOTILE
-#tuple/sorted is for avoiding duplicate cases
-#values are indexes for the variants needed in each case
-AUTOTILE_MAP = {
-    tuple(sorted([(1,0), (0, 1)])): 0,
-    tuple(sorted([(1,0), (0, 1), (-1, 0)])): 1,
-    tuple(sorted([(-1,0), (0,1)])): 2,
-    tuple(sorted([(-1,0), (0,-1), (0,1)])): 3,
-    tuple(sorted([(-1, 0), (0, -1)])): 4,
-    tuple(sorted([(-1, 0), (0, -1), (1, 0)])): 5,
-    tuple(sorted([(1,0), (0,-1)])): 6,
-    tuple(sorted([(1, 0), (0, -1), (0, 1)])): 7,
-    tuple(sorted([(1, 0), (-1, 0), (0, 1), (0, -1)])): 8,
-}
+#the neighbors of the same type make a bitmask, the table gives the variant needed in each case
+#None - no rule for that case, the variant is kept
+RIGHT, LEFT, UP, DOWN = 1, 2, 4, 8
+AUTOTILE_SHIFTS = [((1, 0), RIGHT), ((-1, 0), LEFT), ((0, -1), UP), ((0, 1), DOWN)]
+AUTOTILE_VARIANTS = [None] * 16
+AUTOTILE_VARIANTS[RIGHT | DOWN] = 0
+AUTOTILE_VARIANTS[RIGHT | DOWN | LEFT] = 1
+AUTOTILE_VARIANTS[LEFT | DOWN] = 2
+AUTOTILE_VARIANTS[LEFT | UP | DOWN] = 3
+AUTOTILE_VARIANTS[LEFT | UP] = 4
+AUTOTILE_VARIANTS[LEFT | UP | RIGHT] = 5
+AUTOTILE_VARIANTS[RIGHT | UP] = 6
+AUTOTILE_VARIANTS[RIGHT | UP | DOWN] = 7
+AUTOTILE_VARIANTS[RIGHT | LEFT | UP | DOWN] = 8
 
 NEIGHBOR_OFFSETS = [(-1,0),(-1,-1),(0,-1),(1,-1),(1,0),(0,0),(-1,1),(0,1),(1,1)]
 PHYSICS_TILES = {'grass', 'stone'} #set of tile types that support physics
 AUTOTILE_TYPES = {'grass', 'stone'}
 
+#CHUNKS - the grid is split in square chunks of CHUNK_SIZE x CHUNK_SIZE cells
+#power of 2 so tile to chunk conversion is a shift and a mask (works for negative coords too)
+CHUNK_SHIFT = 4
+CHUNK_SIZE = 1 << CHUNK_SHIFT
+CHUNK_MASK = CHUNK_SIZE - 1
+
+RENDER_CACHE_SIZE = 64 #max baked chunk surfaces kept in memory (least recently drawn are dropped)
+
+class TileChunk:
+    '''compact storage for a CHUNK_SIZE x CHUNK_SIZE block of cells
+    types holds the type id of each cell (0 is empty), variants its variant
+    cells are indexed row by row: (y & CHUNK_MASK) << CHUNK_SHIFT | (x & CHUNK_MASK)
+    '''
+    __slots__ = ('types', 'variants', 'count')
+
+    def __init__(self):
+        self.types = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+        self.variants = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+        self.count = 0 #filled cells, the chunk is dropped when it gets empty
+
+EMPTY_SOLID = bytes(CHUNK_SIZE * CHUNK_SIZE)
+
+class SolidGrid:
+    '''the physics tiles of the map, one solid mask per chunk: bytes indexed like TileChunk.types, 1 for a solid cell
+    chunks without a solid cell have no mask, everything outside of the masks is empty
+    the Tilemap only recomputes the chunks that changed (edits, streamed chunks coming and going),
+    so the cost and the memory follow the chunks in memory, not the size of the level
+    '''
+    def __init__(self, tile_size):
+        self.tile_size = tile_size
+        self.chunks = {} #(chunk_x, chunk_y) -> solid mask
+
+        #VECTORIZED LOOKUPS - the masks stacked in one array (row 0 empty) and the chunk keys sorted for searchsorted
+        #rebuilt on the first solid_at after a change, from the masks in memory
+        self.stack = None
+        self.codes = None #chunk keys packed in int64 (chunk_x << 32 | chunk_y), sorted
+        self.code_rows = None #row in stack of each code
+
+    def set_chunk(self, key, mask):
+        if mask is None or mask == EMPTY_SOLID:
+            if self.chunks.pop(key, None) is None:
+                return
+        else:
+            self.chunks[key] = mask
+        self.stack = None
+
+    def solid(self, tile_x, tile_y):
+        '''single cell lookup
+        '''
+        mask = self.chunks.get((tile_x >> CHUNK_SHIFT, tile_y >> CHUNK_SHIFT))
+        return mask is not None and mask[((tile_y & CHUNK_MASK) << CHUNK_SHIFT) | (tile_x & CHUNK_MASK)] != 0
+
+    def solid_span(self, col, first_row, last_row):
+        '''any solid cell in column col (tile x) from first_row to last_row
+        '''
+        #one mask lookup per chunk crossed, the box rarely spans two
+        local_x = col & CHUNK_MASK
+        chunk_x = col >> CHUNK_SHIFT
+        row = first_row
+        while row <= last_row:
+            chunk_end = min(last_row, row | CHUNK_MASK)
+            mask = self.chunks.get((chunk_x, row >> CHUNK_SHIFT))
+            if mask is not None:
+                for r in range(row, chunk_end + 1):
+                    if mask[((r & CHUNK_MASK) << CHUNK_SHIFT) | local_x]:
+                        return True
+            row = chunk_end + 1
+        return False
+
+    def solid_row(self, row, first_col, last_col):
+        start = (row & CHUNK_MASK) << CHUNK_SHIFT
+        chunk_y = row >> CHUNK_SHIFT
+        col = first_col
+        while col <= last_col:
+            chunk_end = min(last_col, col | CHUNK_MASK)
+            mask = self.chunks.get((col >> CHUNK_SHIFT, chunk_y))
+            if mask is not None and any(mask[start + (col & CHUNK_MASK):start + (chunk_end & CHUNK_MASK) + 1]):
+                return True
+            col = chunk_end + 1
+        return False
+
+    def move(self, pos, size, movement):
+        '''swept AABB - moves a box of size at pos (pixels) by movement, X then Y
+        every tile on the way is checked, so the box stops on the first solid one whatever the speed (no tunneling)
+        the box rect truncates pos like pygame.Rect, a blocked box snaps its edge on the tile edge
+        for moves shorter than a tile it gives the same result as colliding with physics_rects_around
+        returns x, y, left, right, up, down (collision flags)
+        '''
+        ts = self.tile_size
+        x, y = pos
+        width, height = size
+        left = right = up = down = False
+
+        #X - sweep the columns between the start and the end of the move, on the rows the box covers
+        first_row = int(y) // ts
+        last_row = (int(y) + height - 1) // ts
+        if movement[0] > 0:
+            start = int(x) // ts
+            x += movement[0]
+            for col in range(start, (int(x) + width - 1) // ts + 1):
+                if self.solid_span(col, first_row, last_row):
+                    x = col * ts - width
+                    right = True
+                    break
+        elif movement[0] < 0:
+            start = (int(x) + width - 1) // ts
+            x += movement[0]
+            for col in range(start, int(x) // ts - 1, -1):
+                if self.solid_span(col, first_row, last_row):
+                    x = (col + 1) * ts
+                    left = True
+                    break
+        else:
+            #not moving but inside a solid tile - only snaps to the rect, like the rect loop did
+            for col in range(int(x) // ts, (int(x) + width - 1) // ts + 1):
+                if self.solid_span(col, first_row, last_row):
+                    x = int(x)
+                    break
+
+        #Y - same on the columns covered after the X move
+        first_col = int(x) // ts
+        last_col = (int(x) + width - 1) // ts
+        if movement[1] > 0:
+            start = int(y) // ts
+            y += movement[1]
+            for row in range(start, (int(y) + height - 1) // ts + 1):
+                if self.solid_row(row, first_col, last_col):
+                    y = row * ts - height
+                    down = True
+                    break
+        elif movement[1] < 0:
+            start = (int(y) + height - 1) // ts
+            y += movement[1]
+            for row in range(start, int(y) // ts - 1, -1):
+                if self.solid_row(row, first_col, last_col):
+                    y = (row + 1) * ts
+                    up = True
+                    break
+        else:
+            for row in range(int(y) // ts, (int(y) + height - 1) // ts + 1):
+                if self.solid_row(row, first_col, last_col):
+                    y = int(y)
+                    break
+
+        return x, y, left, right, up, down
+
+    def build_stack(self):
+        keys = list(self.chunks)
+        codes = np.array([(cx << 32) | (cy & 0xFFFFFFFF) for cx, cy in keys], dtype=np.int64)
+        order = np.argsort(codes)
+        self.codes = codes[order]
+        self.code_rows = order + 1
+        self.stack = np.frombuffer(EMPTY_SOLID + b''.join(self.chunks[key] for key in keys), dtype=np.uint8).reshape(-1, CHUNK_SIZE * CHUNK_SIZE)
+
+    def solid_at(self, tile_x, tile_y):
+        '''vectorized lookup - tile_x/tile_y are int arrays of the same shape, returns a bool array
+        '''
+        tile_x = np.asarray(tile_x, dtype=np.int64)
+        tile_y = np.asarray(tile_y, dtype=np.int64)
+        if not self.chunks:
+            return np.zeros(tile_x.shape, dtype=bool)
+        if self.stack is None:
+            self.build_stack()
+        #row of the chunk of each cell - 0 (empty) for the chunks without a mask
+        codes = ((tile_x >> CHUNK_SHIFT) << 32) | ((tile_y >> CHUNK_SHIFT) & 0xFFFFFFFF)
+        i = np.minimum(np.searchsorted(self.codes, codes), len(self.codes) - 1)
+        rows = np.where(self.codes[i] == codes, self.code_rows[i], 0)
+        return self.stack[rows, ((tile_y & CHUNK_MASK) << CHUNK_SHIFT) | (tile_x & CHUNK_MASK)] != 0
+
+    def solid_at_px(self, pos):
+        '''vectorized lookup for pixel positions - pos is a (..., 2) float array
+        '''
+        tiles = np.floor_divide(pos, self.tile_size).astype(np.int64)
+        return self.solid_at(tiles[..., 0], tiles[..., 1])
+
 class Tilemap:
     def __init__(self, game, tile_size=16):
         self.game = game
         self.tile_size = tile_size
-        self.tilemap = {} #this handles physics
-        self.offgrid_tiles = [] #this doesn't handle physics
+        self.chunks = {} #(chunk_x, chunk_y) -> TileChunk - this handles physics
+
+        #OFFGRID - this doesn't handle physics
+        #tiles are bucketed by the chunk their top-left corner falls in, seq keeps the placing (= drawing) order
+        self.offgrid_buckets = {} #(chunk_x, chunk_y) -> [(seq, tile), ...]
+        self.offgrid_types = set()
+        self.offgrid_seq = 0
+
+        #TYPE IDS - cells store small ints, names are only used at the edges (load/save/render)
+        self.type_names = [None] #id -> name, 0 is reserved for empty cells
+        self.type_ids = {}
+        self.physics_ids = bytearray(256) #id -> 1 if the type supports physics
+        self.autotile_ids = bytearray(256) #id -> 1 if the type follows the autotile rules
+
+        #RENDER CACHE - on-grid tiles pre-composited per chunk, rebuilt only when a chunk changes
+        self.chunk_surfs = {} #(chunk_x, chunk_y) -> Surface, ordered from least to most recently drawn
+        self.max_tile_size = None #biggest tile image side, for overhangs on chunk surfaces and offgrid queries
+
+        #OUTLINE MASKS - silhouette of everything drawn from a chunk (on-grid + offgrid tiles), built once per level
+        self.static_masks = {} #(chunk_x, chunk_y) -> Mask covering chunk_px + max_tile_size on each side
+        self.image_masks = {} #(type, variant) -> Mask of the tile image
+
+        self.solid_cache = None #SolidGrid, built on demand
+        self.solid_dirty = set() #keys of the chunks changed since solid_cache was updated
+
+    def type_id(self, name):
+        '''returns the id for a tile type, registering it on first use
+        '''
+        tid = self.type_ids.get(name)
+        if tid is None:
+            tid = len(self.type_names)
+            if tid > 255:
+                raise ValueError("too many tile types in a tilemap")
+            self.type_names.append(name)
+            self.type_ids[name] = tid
+            self.physics_ids[tid] = name in PHYSICS_TILES
+            self.autotile_ids[tid] = name in AUTOTILE_TYPES
+            self.reset_tile_size()
+        return tid
+
+    def cell(self, x, y):
+        '''returns (type_id, variant) for the cell at tile pos x, y - (0, 0) if empty
+        '''
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is None:
+            return 0, 0
+        i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        return chunk.types[i], chunk.variants[i]
+
+    def get_tile(self, pos):
+        '''returns the tile at tile pos as a dict (type, variant, pos) or None
+        '''
+        tid, variant = self.cell(pos[0], pos[1])
+        if tid:
+            return {'type': self.type_names[tid], 'variant': variant, 'pos': [pos[0], pos[1]]}
+
+    def set_tile(self, pos, tile_type, variant):
+        x, y = int(pos[0]), int(pos[1])
+        key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = TileChunk()
+        i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        tid = self.type_id(tile_type)
+        if chunk.types[i] == tid and chunk.variants[i] == variant:
+            return #unchanged - keep the baked surface
+        if not chunk.types[i]:
+            chunk.count += 1
+        chunk.types[i] = tid
+        chunk.variants[i] = variant
+        self.chunk_surfs.pop(key, None)
+        self.static_masks.pop(key, None)
+        self.solid_dirty.add(key)
+
+    def remove_tile(self, pos):
+        '''empties the cell at tile pos, returns True if there was a tile
+        '''
+        x, y = int(pos[0]), int(pos[1])
+        key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return False
+        i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        if not chunk.types[i]:
+            return False
+        chunk.types[i] = 0
+        chunk.variants[i] = 0
+        chunk.count -= 1
+        if not chunk.count:
+            del self.chunks[key]
+        self.chunk_surfs.pop(key, None)
+        self.static_masks.pop(key, None)
+        self.solid_dirty.add(key)
+        return True
+
+    def set_cells(self, cells):
+        '''bulk edit - cells is [(x, y, tile_type, variant), ...], tile_type None empties the cell
+        the chunks touched are invalidated once for the whole edit, returns the (x, y) of the cells that changed
+        '''
+        changed = []
+        dirty = set()
+        chunk_key = chunk = None
+        names = (None, 0) #last tile_type -> id, bulk edits mostly write a single type
+        for x, y, tile_type, variant in cells:
+            if tile_type != names[0]:
+                names = (tile_type, self.type_id(tile_type) if tile_type is not None else 0)
+            tid = names[1]
+            key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+            if key != chunk_key or chunk is None:
+                chunk_key = key
+                chunk = self.chunks.get(key)
+                if chunk is None and tid:
+                    chunk = self.chunks[key] = TileChunk()
+            if chunk is None:
+                continue #erasing where there is nothing
+            i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+            if not tid:
+                variant = 0
+            if chunk.types[i] == tid and chunk.variants[i] == variant:
+                continue
+            chunk.count += (tid != 0) - (chunk.types[i] != 0)
+            chunk.types[i] = tid
+            chunk.variants[i] = variant
+            changed.append((x, y))
+            dirty.add(key)
+        for key in dirty:
+            if not self.chunks[key].count:
+                del self.chunks[key]
+            self.chunk_surfs.pop(key, None)
+            self.static_masks.pop(key, None)
+        self.solid_dirty.update(dirty)
+        return changed
+
+    def install_chunk(self, key, types, variants):
+        '''puts a whole chunk of cells in the map at once (level streaming)
+        types must already use this tilemap's type ids, cells already filled in the map are kept
+        '''
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = TileChunk()
+            chunk.types[:] = types
+            chunk.variants[:] = variants
+        else:
+            for i in range(CHUNK_SIZE * CHUNK_SIZE):
+                if types[i] and not chunk.types[i]:
+                    chunk.types[i] = types[i]
+                    chunk.variants[i] = variants[i]
+        chunk.count = CHUNK_SIZE * CHUNK_SIZE - chunk.types.count(0)
+        if not chunk.count:
+            del self.chunks[key]
+        self.chunk_surfs.pop(key, None)
+        self.static_masks.pop(key, None)
+        self.solid_dirty.add(key)
+
+    def drop_chunk(self, key):
+        '''removes a whole chunk from memory (level streaming), returns True if it was there
+        '''
+        if self.chunks.pop(key, None) is None:
+            return False
+        self.chunk_surfs.pop(key, None)
+        self.static_masks.pop(key, None)
+        self.solid_dirty.add(key)
+        return True
+
+    def iter_cells(self):
+        '''yields (x, y, type_id, variant) for every filled cell
+        '''
+        for (cx, cy), chunk in self.chunks.items():
+            types = chunk.types
+            variants = chunk.variants
+            for i in range(CHUNK_SIZE * CHUNK_SIZE):
+                if types[i]:
+                    yield (cx << CHUNK_SHIFT) | (i & CHUNK_MASK), (cy << CHUNK_SHIFT) | (i >> CHUNK_SHIFT), types[i], variants[i]
+
+    def iter_tiles(self):
+        '''yields every on-grid tile as a dict (type, variant, pos)
+        '''
+        for x, y, tid, variant in self.iter_cells():
+            yield {'type': self.type_names[tid], 'variant': variant, 'pos': [x, y]}
+
+    def offgrid_key(self, pos):
+        chunk_px = CHUNK_SIZE * self.tile_size
+        return (int(pos[0] // chunk_px), int(pos[1] // chunk_px))
+
+    def add_offgrid(self, tile, seq=None):
+        '''seq - drawing order, a tile put back (editor undo) passes the one remove_offgrid returned
+        '''
+        if tile['type'] not in self.offgrid_types:
+            self.offgrid_types.add(tile['type'])
+            self.reset_tile_size()
+        if seq is None:
+            seq = self.offgrid_seq
+            self.offgrid_seq += 1
+        key = self.offgrid_key(tile['pos'])
+        self.offgrid_buckets.setdefault(key, []).append((seq, tile)) #queries sort by seq
+        self.static_masks.pop(key, None)
+
+    def remove_offgrid(self, tile):
+        '''removes tile (the same dict), returns its drawing seq - None if it wasn't there
+        '''
+        key = self.offgrid_key(tile['pos'])
+        bucket = self.offgrid_buckets.get(key, [])
+        for i, entry in enumerate(bucket):
+            if entry[1] is tile:
+                del bucket[i]
+                if not bucket:
+                    del self.offgrid_buckets[key]
+                self.static_masks.pop(key, None)
+                return entry[0]
+        return None
+
+    @property
+    def offgrid_tiles(self):
+        '''every offgrid tile in placing order
+        '''
+        entries = [entry for bucket in self.offgrid_buckets.values() for entry in bucket]
+        entries.sort(key=lambda entry: entry[0])
+        return [entry[1] for entry in entries]
+
+    def offgrid_in_rect(self, rect):
+        '''returns the offgrid tiles that can overlap rect (pixels), in drawing order
+        only the buckets around rect are visited, tiles are not tested one by one
+        '''
+        chunk_px = CHUNK_SIZE * self.tile_size
+        reach = self.get_max_tile_size() #tiles starting up to this far left/above can still reach into rect
+        entries = []
+        for chunk_x in range((rect[0] - reach) // chunk_px, (rect[0] + rect[2]) // chunk_px + 1):
+            for chunk_y in range((rect[1] - reach) // chunk_px, (rect[1] + rect[3]) // chunk_px + 1):
+                bucket = self.offgrid_buckets.get((chunk_x, chunk_y))
+                if bucket:
+                    entries.extend(bucket)
+        entries.sort(key=lambda entry: entry[0])
+        return [entry[1] for entry in entries]
+
+    def offgrid_at(self, pos):
+        '''returns the offgrid tiles whose image covers pos (pixels)
+        '''
+        hits = []
+        for tile in self.offgrid_in_rect((int(pos[0]), int(pos[1]), 1, 1)):
+            img = self.game.assets[tile['type']][tile['variant']]
+            if pygame.Rect(tile['pos'][0], tile['pos'][1], img.get_width(), img.get_height()).collidepoint(pos):
+                hits.append(tile)
+        return hits
+
+    def solid_grid(self):
+        '''returns the SolidGrid of the current map, up to date - only the chunks changed since the last call are recomputed
+        '''
+        if self.solid_cache is None:
+            self.solid_cache = SolidGrid(self.tile_size)
+            self.solid_dirty = set(self.chunks)
+        if self.solid_dirty:
+            for key in self.solid_dirty:
+                chunk = self.chunks.get(key)
+                self.solid_cache.set_chunk(key, bytes(chunk.types).translate(self.physics_ids) if chunk is not None else None)
+            self.solid_dirty = set()
+        return self.solid_cache
+
+    def tile_count(self):
+        return sum(chunk.count for chunk in self.chunks.values())
+
+    def tile_bounds(self):
+        '''(x0, y0, x1, y1) in tiles, x1/y1 excluded - the chunks in use, so it can be up to a chunk too big
+        '''
+        if not self.chunks:
+            return (0, 0, 0, 0)
+        chunk_xs = [key[0] for key in self.chunks]
+        chunk_ys = [key[1] for key in self.chunks]
+        return (min(chunk_xs) * CHUNK_SIZE, min(chunk_ys) * CHUNK_SIZE, (max(chunk_xs) + 1) * CHUNK_SIZE, (max(chunk_ys) + 1) * CHUNK_SIZE)
+
+    def flood_region(self, pos, bounds):
+        '''the cells 4-connected to tile pos holding the same tile type (or all empty), as a list of (x, y)
+        bounds - (x0, y0, x1, y1) in tiles the fill can't leave, an empty area has no end otherwise
+        '''
+        x0, y0, x1, y1 = bounds
+        if not (x0 <= pos[0] < x1 and y0 <= pos[1] < y1):
+            return []
+        tid = self.cell(pos[0], pos[1])[0]
+        start = (pos[0], pos[1])
+        region = {start}
+        todo = [start]
+        while todo:
+            x, y = todo.pop()
+            for cell in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if cell not in region and x0 <= cell[0] < x1 and y0 <= cell[1] < y1 and self.cell(cell[0], cell[1])[0] == tid:
+                    region.add(cell)
+                    todo.append(cell)
+        return list(region)
+
+    def offgrid_region(self, rect):
+        '''the offgrid tiles whose pos is inside rect (x, y, w, h in tiles), in drawing order
+        only the buckets the rect covers are visited, a tile is in the bucket of its pos
+        '''
+        left, top = rect[0] * self.tile_size, rect[1] * self.tile_size
+        right, bottom = left + rect[2] * self.tile_size, top + rect[3] * self.tile_size
+        first, last = self.offgrid_key((left, top)), self.offgrid_key((right - 1, bottom - 1))
+        entries = []
+        for chunk_x in range(first[0], last[0] + 1):
+            for chunk_y in range(first[1], last[1] + 1):
+                entries.extend(self.offgrid_buckets.get((chunk_x, chunk_y), []))
+        entries.sort(key=lambda entry: entry[0])
+        return [tile for seq, tile in entries if left <= tile['pos'][0] < right and top <= tile['pos'][1] < bottom]
+
+    def copy_region(self, rect):
+        '''the tiles of rect (x, y, w, h in tiles) with their pos relative to its top-left corner, in the map file format:
+        {'tilemap': [tile, ...], 'offgrid': [tile, ...]} - offgrid tiles are copied when their pos is inside rect
+        '''
+        x0, y0, w, h = rect
+        tiles = []
+        for x in range(x0, x0 + w):
+            for y in range(y0, y0 + h):
+                tid, variant = self.cell(x, y)
+                if tid:
+                    tiles.append({'type': self.type_names[tid], 'variant': variant, 'pos': [x - x0, y - y0]})
+        left, top = x0 * self.tile_size, y0 * self.tile_size
+        offgrid = [dict(tile, pos=[tile['pos'][0] - left, tile['pos'][1] - top]) for tile in self.offgrid_region(rect)]
+        return {'tilemap': tiles, 'offgrid': offgrid}
 
     def extract(self, id_pairs, keep=False):
         '''takes id_pairs (types of tiles)
@@ -33,90 +525,277 @@ class Tilemap:
         can remove them with keep
         '''
         matches = []
-        
+
         #OFFGRID
-        for tile in self.offgrid_tiles.copy():
+        for tile in self.offgrid_tiles:
             if(tile['type'], tile['variant']) in id_pairs:
                 matches.append(tile.copy())
                 if not keep:
-                    self.offgrid_tiles.remove(tile)
-        #ONGRID
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            if(tile['type'], tile['variant']) in id_pairs:
-                matches.append(tile.copy())
-                #copying the pos value (no referece to tilemap) and setting it to pixels
-                matches[-1]['pos'] = matches[-1]['pos'].copy()
-                matches[-1]['pos'][0] *= self.tile_size
-                matches[-1]['pos'][1] *= self.tile_size
+                    self.remove_offgrid(tile)
+        #ONGRID - match on ids so we don't build a dict per cell
+        id_pairs = {(self.type_ids[t], v) for t, v in id_pairs if t in self.type_ids}
+        for x, y, tid, variant in list(self.iter_cells()):
+            if (tid, variant) in id_pairs:
+                #setting pos to pixels
+                matches.append({'type': self.type_names[tid], 'variant': variant, 'pos': [x * self.tile_size, y * self.tile_size]})
                 if not keep:
-                    del self.tilemap[loc]
-        
+                    self.remove_tile((x, y))
+
         return matches
 
+    def neighborhood(self, pos):
+        '''yields (x, y, type_id, variant) for the filled cells in the 3x3 block around a pixel pos
+        '''
+        tile_x = int(pos[0] // self.tile_size) #convert pixel pos into tile pos
+        tile_y = int(pos[1] // self.tile_size)
+        local_x = tile_x & CHUNK_MASK
+        local_y = tile_y & CHUNK_MASK
+        if 0 < local_x < CHUNK_MASK and 0 < local_y < CHUNK_MASK:
+            #FAST PATH - the whole block is inside one chunk
+            chunk = self.chunks.get((tile_x >> CHUNK_SHIFT, tile_y >> CHUNK_SHIFT))
+            if chunk is None:
+                return
+            types = chunk.types
+            center = (local_y << CHUNK_SHIFT) | local_x
+            for offset in NEIGHBOR_OFFSETS:
+                i = center + (offset[1] << CHUNK_SHIFT) + offset[0]
+                if types[i]:
+                    yield tile_x + offset[0], tile_y + offset[1], types[i], chunk.variants[i]
+        else:
+            for offset in NEIGHBOR_OFFSETS:
+                x = tile_x + offset[0] #add offset to tile pos
+                y = tile_y + offset[1]
+                tid, variant = self.cell(x, y)
+                if tid: #check the new position is in the tilemap
+                    yield x, y, tid, variant
+
     def tiles_around(self, pos):
-        tiles = []
-        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size)) #convert pixel pos into tile pos
-        for offset in NEIGHBOR_OFFSETS:
-            check_loc = str(tile_loc[0] + offset[0]) + ';' + str(tile_loc[1] + offset[1]) #add offset to tile pos
-            if check_loc in self.tilemap: #check the new position is in the tilemap
-                tiles.append(self.tilemap[check_loc])
-        return tiles
-    
+        return [{'type': self.type_names[tid], 'variant': variant, 'pos': [x, y]} for x, y, tid, variant in self.neighborhood(pos)]
+
     def physics_rects_around(self, pos):
         rects = [] #will generate rects for the physics tiles around (now drawing them though)
-        for tile in self.tiles_around(pos):
-            if tile['type'] in PHYSICS_TILES: #we can collide with that
-                rects.append(pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, self.tile_size, self.tile_size))
+        for x, y, tid, variant in self.neighborhood(pos):
+            if self.physics_ids[tid]: #we can collide with that
+                rects.append(pygame.Rect(x * self.tile_size, y * self.tile_size, self.tile_size, self.tile_size))
         return rects
-    
+
     def solid_check(self, pos):
         '''checks if the pos is a solid tile
         '''
-        tile_loc = str(int(pos[0] // self.tile_size)) + ';' + str(int(pos[1] // self.tile_size)) #pixels to tiles
-        if tile_loc in self.tilemap:
-            if self.tilemap[tile_loc]['type'] in PHYSICS_TILES:
-                return self.tilemap[tile_loc]
+        x = int(pos[0] // self.tile_size) #pixels to tiles
+        y = int(pos[1] // self.tile_size)
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is not None:
+            i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+            if self.physics_ids[chunk.types[i]]:
+                return {'type': self.type_names[chunk.types[i]], 'variant': chunk.variants[i], 'pos': [x, y]}
 
 
     def render(self, surf, offset=(0, 0)):
-        #RENDER for OFFGRID TILES (background) - not optimized
-        for tile in self.offgrid_tiles:
-            surf.blit(self.game.assets[tile['type']][tile['variant']], (tile['pos'][0] - offset[0], tile['pos'][1] - offset[1]))
-
-        #RENDER for TILES (adjusting for tile_size) - only considering tiles on screen
-        #get the leftmost and rightmost edges of the screen in tile_size
-        #add padding on the range to avoid having bit items on the edges disappear
-        for x in range(offset[0] // self.tile_size - 1, (offset[0] + surf.get_width()) // self.tile_size + 1):
-            for y in range(offset[1] // self.tile_size - 1, (offset[1] + surf.get_height()) // self.tile_size + 1):
-                loc = str(x) + ';' + str(y) #compute current location in string
-                if loc in self.tilemap:
-                    tile = self.tilemap[loc]
-                    surf.blit(self.game.assets[tile['type']][tile['variant']], (tile['pos'][0] * self.tile_size - offset[0], tile['pos'][1] * self.tile_size - offset[1]))
+        #RENDER for OFFGRID TILES (background) - only the buckets around the screen
+        #floored - blit truncates, so a tile cut by the left/top edge would be drawn 1px off and jump when it crosses
+        for tile in self.offgrid_in_rect((offset[0], offset[1], surf.get_width(), surf.get_height())):
+            surf.blit(self.game.assets[tile['type']][tile['variant']], (math.floor(tile['pos'][0] - offset[0]), math.floor(tile['pos'][1] - offset[1])))
+
+        #RENDER for TILES - blit the baked chunks overlapping the screen
+        #chunk surfaces are padded on the right/bottom so the range starts one chunk earlier when tiles spill over
+        chunk_px = CHUNK_SIZE * self.tile_size
+        pad = max(0, self.get_max_tile_size() - self.tile_size)
+        y_range = range((offset[1] - pad) // chunk_px, (offset[1] + surf.get_height()) // chunk_px + 1)
+        for chunk_x in range((offset[0] - pad) // chunk_px, (offset[0] + surf.get_width()) // chunk_px + 1):
+            for chunk_y in y_range:
+                key = (chunk_x, chunk_y)
+                if key in self.chunks:
+                    surf.blit(self.chunk_surf(key), (chunk_x * chunk_px - offset[0], chunk_y * chunk_px - offset[1]))
+
+    def draw_mask(self, mask, offset=(0, 0)):
+        '''adds the silhouette of what render() draws with the same offset to mask (sized like the surface)
+        uses the static masks, so no pixels are read
+        '''
+        chunk_px = CHUNK_SIZE * self.tile_size
+        reach = self.get_max_tile_size() #offgrid tiles and padded chunks can spill this far right/down
+        width, height = mask.get_size()
+        y_range = range((offset[1] - reach) // chunk_px, (offset[1] + height) // chunk_px + 1)
+        for chunk_x in range((offset[0] - reach) // chunk_px, (offset[0] + width) // chunk_px + 1):
+            for chunk_y in y_range:
+                key = (chunk_x, chunk_y)
+                if key in self.chunks or key in self.offgrid_buckets:
+                    mask.draw(self.static_mask(key), (chunk_x * chunk_px - offset[0], chunk_y * chunk_px - offset[1]))
+
+    def static_mask(self, key):
+        '''returns the Mask of the tiles drawn from a chunk, building it on first use after a load or an edit
+        '''
+        static_mask = self.static_masks.get(key)
+        if static_mask is None:
+            chunk_px = CHUNK_SIZE * self.tile_size
+            size = chunk_px + self.get_max_tile_size()
+            static_mask = pygame.Mask((size, size))
+            if key in self.chunks:
+                static_mask.draw(pygame.mask.from_surface(self.chunk_surf(key)), (0, 0))
+            for seq, tile in self.offgrid_buckets.get(key, []):
+                pos = (math.floor(tile['pos'][0]) - key[0] * chunk_px, math.floor(tile['pos'][1]) - key[1] * chunk_px) #floored like render()
+                static_mask.draw(self.image_mask(tile['type'], tile['variant']), pos)
+            self.static_masks[key] = static_mask
+        return static_mask
+
+    def image_mask(self, tile_type, variant):
+        image_mask = self.image_masks.get((tile_type, variant))
+        if image_mask is None:
+            image_mask = self.image_masks[(tile_type, variant)] = pygame.mask.from_surface(self.game.assets[tile_type][variant])
+        return image_mask
+
+    def get_max_tile_size(self):
+        if self.max_tile_size is None:
+            self.max_tile_size = self.tile_size
+            for name in self.type_names[1:] + list(self.offgrid_types):
+                for img in self.game.assets.get(name, []):
+                    self.max_tile_size = max(self.max_tile_size, img.get_width(), img.get_height())
+        return self.max_tile_size
+
+    def reset_tile_size(self):
+        #a new tile type may be bigger - the chunk surfaces need a bigger pad
+        self.max_tile_size = None
+        self.chunk_surfs = {}
+        self.static_masks = {}
+
+    def chunk_surf(self, key):
+        '''returns the pre-composited surface for a chunk, baking it if it's not cached
+        '''
+        chunk_surf = self.chunk_surfs.pop(key, None) #re-inserted below to mark it as recently drawn
+        if chunk_surf is None:
+            chunk_surf = self.bake_chunk(key)
+            if len(self.chunk_surfs) >= RENDER_CACHE_SIZE:
+                del self.chunk_surfs[next(iter(self.chunk_surfs))]
+        self.chunk_surfs[key] = chunk_surf
+        return chunk_surf
+
+    def bake_chunk(self, key):
+        chunk = self.chunks[key]
+        size = CHUNK_SIZE * self.tile_size + max(0, self.get_max_tile_size() - self.tile_size)
+        chunk_surf = pygame.Surface((size, size))
+        chunk_surf.set_colorkey((0, 0, 0), pygame.RLEACCEL) #same colorkey as the tile images - empty cells stay transparent
+        images = [self.game.assets.get(name) for name in self.type_names] #id -> variants
+        #same order as drawing tile by tile - columns left to right, top to bottom within a column
+        for x in range(CHUNK_SIZE):
+            for y in range(CHUNK_SIZE):
+                i = (y << CHUNK_SHIFT) | x
+                tid = chunk.types[i]
+                if tid and images[tid]:
+                    chunk_surf.blit(images[tid][chunk.variants[i]], (x * self.tile_size, y * self.tile_size))
+        return chunk_surf
+
+    def autotile_mask(self, x, y, tid):
+        mask = 0
+        for shift, bit in AUTOTILE_SHIFTS:
+            if self.cell(x + shift[0], y + shift[1])[0] == tid:
+                mask |= bit
+        return mask
+
+    def autotile_variant(self, pos, tile_type):
+        '''variant the rules give to a tile_type tile at tile pos (whatever is there now), None if no rule applies
+        '''
+        tid = self.type_id(tile_type)
+        if self.autotile_ids[tid]:
+            return AUTOTILE_VARIANTS[self.autotile_mask(pos[0], pos[1], tid)]
+
+    def autotile_around(self, pos):
+        '''autotiles the cell at tile pos and its 4 neighbors - call after an edit, the cost doesn't depend on the map size
+        '''
+        for shift in [(0, 0)] + [shift for shift, bit in AUTOTILE_SHIFTS]:
+            x, y = pos[0] + shift[0], pos[1] + shift[1]
+            tid, variant = self.cell(x, y)
+            if self.autotile_ids[tid]:
+                new_variant = AUTOTILE_VARIANTS[self.autotile_mask(x, y, tid)]
+                if new_variant is not None and new_variant != variant:
+                    self.set_tile((x, y), self.type_names[tid], new_variant)
+
+    def autotile_cells(self, cells):
+        '''autotile_around for a bulk edit - every cell and neighbor is done once, each chunk invalidated once
+        '''
+        todo = set()
+        for x, y in cells:
+            todo.add((x, y))
+            for shift, bit in AUTOTILE_SHIFTS:
+                todo.add((x + shift[0], y + shift[1]))
+        dirty = set()
+        for x, y in todo:
+            tid, variant = self.cell(x, y)
+            if self.autotile_ids[tid]:
+                new_variant = AUTOTILE_VARIANTS[self.autotile_mask(x, y, tid)]
+                if new_variant is not None and new_variant != variant:
+                    key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+                    self.chunks[key].variants[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)] = new_variant
+                    dirty.add(key)
+        for key in dirty:
+            self.chunk_surfs.pop(key, None)
+            self.static_masks.pop(key, None)
 
     def autotile(self):
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            neighbors = set()
-            for shift in [(1, 0), (-1, 0), (0, -1), (0, 1)]:
-                check_loc = str(tile['pos'][0] + shift[0]) + ';' + str(tile['pos'][1] + shift[1])
-                if check_loc in self.tilemap:
-                    if self.tilemap[check_loc]['type'] == tile['type']:
-                        neighbors.add(shift)
-            neighbors = tuple(sorted(neighbors))
-            if (tile['type'] in AUTOTILE_TYPES) and (neighbors in AUTOTILE_MAP):
-                tile['variant'] = AUTOTILE_MAP[neighbors]
+        '''whole map pass - for maps made before autotiling was live
+        '''
+        for x, y, tid, variant in list(self.iter_cells()):
+            if self.autotile_ids[tid]:
+                new_variant = AUTOTILE_VARIANTS[self.autotile_mask(x, y, tid)]
+                if new_variant is not None:
+                    chunk = self.chunks[(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)]
+                    chunk.variants[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)] = new_variant
+        self.chunk_surfs = {}
+        self.static_masks = {}
+
+    def clear(self):
+        self.chunks = {}
+        self.solid_cache = None
+        self.solid_dirty = set()
+        self.offgrid_buckets = {}
+        self.offgrid_types = set()
+        self.offgrid_seq = 0
+        self.reset_tile_size()
+
+    def snapshot(self):
+        '''independent copy of the map data, to save it from another thread while editing goes on
+        the cells are copied chunk by chunk as bytes, no render cache and no game (saving doesn't need them)
+        '''
+        copy = Tilemap(None, self.tile_size)
+        copy.type_names = list(self.type_names)
+        copy.type_ids = dict(self.type_ids)
+        copy.physics_ids = bytearray(self.physics_ids)
+        copy.autotile_ids = bytearray(self.autotile_ids)
+        for key, chunk in self.chunks.items():
+            chunk_copy = copy.chunks[key] = TileChunk()
+            chunk_copy.types[:] = chunk.types
+            chunk_copy.variants[:] = chunk.variants
+            chunk_copy.count = chunk.count
+        copy.offgrid_buckets = {key: [(seq, dict(tile)) for seq, tile in bucket] for key, bucket in self.offgrid_buckets.items()}
+        copy.offgrid_types = set(self.offgrid_types)
+        copy.offgrid_seq = self.offgrid_seq
+        return copy
+
+    def map_data(self):
+        '''the map in the layout of the .json file (what load_data takes)
+        the file keeps the original "x;y" keyed format, the chunks only live in memory
+        '''
+        tilemap = {}
+        for x, y, tid, variant in self.iter_cells():
+            tilemap[str(x) + ';' + str(y)] = {'type': self.type_names[tid], 'variant': variant, 'pos': [x, y]}
+        return {'tilemap': tilemap, 'tile_size': self.tile_size, 'offgrid': self.offgrid_tiles}
 
     def save(self, path):
         f = open(path, 'w')
-        json.dump({'tilemap': self.tilemap, 'tile_size': self.tile_size, 'offgrid': self.offgrid_tiles}, f)
+        json.dump(self.map_data(), f)
         f.close()
 
     def load(self, path):
         f = open(path, 'r')
         map_data = json.load(f)
         f.close()
+        self.load_data(map_data)
 
-        self.tilemap = map_data['tilemap']
+    def load_data(self, map_data):
+        '''fills the map from already parsed map data (same layout as the file) - map_data is not modified
+        '''
+        self.clear()
         self.tile_size = map_data['tile_size']
-        self.offgrid_tiles = map_data['offgrid']
\ No newline at end of file
+        for tile in map_data['tilemap'].values():
+            self.set_tile(tile['pos'], tile['type'], tile['variant'])
+        for tile in map_data['offgrid']:
+            self.add_offgrid(dict(tile, pos=list(tile['pos']))) #own pos list, entities move the list they spawn with
\ No newline at end of file
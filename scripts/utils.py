@@ -3,27 +3,53 @@ import pygame
 
 BASE_IMG_PATH = 'data/images/'
 
+atlas = None #packed images (scripts/atlas.py) - when set, images are sliced from it instead of loaded one by one
+
 def load_image(path):
+    if atlas is not None and path in atlas.images:
+        return atlas.images[path]
     img = pygame.image.load(BASE_IMG_PATH + path).convert() #convert makes the image optimized in memory
     img.set_colorkey((0,0,0)) #all black in bkgds becomes transparent
     return img
 
 def load_images(path):
+    if atlas is not None and path in atlas.groups:
+        return [img for name, img in atlas.groups[path]]
     images = []
-    for img_name in os.listdir(BASE_IMG_PATH + path):
+    for img_name in sorted(os.listdir(BASE_IMG_PATH + path)): #sorted - names are the frame order
         images.append(load_image(path + '/' + img_name))
     return images
 
+def flip_image(img):
+    '''left/right mirrored copy of img (keeps the colorkey) - made at load time, never while rendering
+    '''
+    return pygame.transform.flip(img, True, False)
+
+def load_sound(path, silent=False):
+    if silent:
+        return SilentSound()
+    return pygame.mixer.Sound(path)
+
+class SilentSound:
+    '''stands in for a pygame.mixer.Sound when the game runs without audio
+    '''
+    def play(self, *args, **kwargs):
+        pass
+
+    def set_volume(self, volume):
+        pass
+
 class Animation:
-    def __init__(self, images, img_dur=5, loop=True):
+    def __init__(self, images, img_dur=5, loop=True, flipped=None):
         self.images = images
+        self.flipped = flipped if flipped is not None else [flip_image(img) for img in images] #facing left
         self.loop = loop
         self.img_duration = img_dur
         self.done = False
         self.frame = 0
 
     def copy(self): #will leverage the reference of the images list - every copy will share the same list
-        return Animation(self.images, self.img_duration, self.loop)
+        return Animation(self.images, self.img_duration, self.loop, self.flipped)
     
     def update(self): #loops around at the end
         if self.loop:
@@ -33,7 +59,7 @@ class Animation:
             if self.frame >= self.img_duration * len(self.images) - 1:
                 self.done = True
     
-    def img(self): #get the current image of the animation
-        return self.images[int(self.frame / self.img_duration)]
+    def img(self, flip=False): #get the current image of the animation
+        return (self.flipped if flip else self.images)[int(self.frame / self.img_duration)]
 
     